@@ -0,0 +1,103 @@
+"""
+Compare sending photos as downloaded against the downscaled media path.
+
+    python -m benchmarks.bench_media [screenshot.png ...] [--repeat 5]
+
+Without arguments a few synthetic screenshots and a camera-sized photo are generated.
+Each path runs in its own process so peak RSS isn't shared between them.
+"""
+import argparse
+import io
+import multiprocessing
+import random
+import time
+
+from PIL import Image, ImageDraw, ImageFont
+
+from utils.media import image_data_url, prepare_image, vision_size
+
+
+def synthetic_samples() -> dict[str, bytes]:
+    rng = random.Random(0)
+    samples = {}
+    for name, size, fmt in [("phone.png", (1170, 2532), "PNG"), ("phone.jpg", (1170, 2532), "JPEG"),
+                            ("desktop.png", (2880, 1800), "PNG"), ("camera.jpg", (4032, 3024), "JPEG")]:
+        img = Image.new("RGB", size, "white")
+        draw = ImageDraw.Draw(img)
+        font = ImageFont.load_default(size=28)
+        # Anti-aliased text lines, like a chat or an email signature.
+        for y in range(40, size[1] - 40, 44):
+            words = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 9)))
+                     for _ in range(size[0] // 90)]
+            draw.text((40, y), " ".join(words), fill=(rng.randint(0, 80),) * 3, font=font)
+        if name.startswith("camera"):
+            noise = Image.effect_noise(size, 40).convert("RGB")
+            img = Image.blend(img, noise, 0.3)
+        out = io.BytesIO()
+        img.save(out, format=fmt, quality=92)
+        samples[name] = out.getvalue()
+    return samples
+
+
+def vision_tokens(width: int, height: int) -> int:
+    """gpt-4o-mini image cost for detail=high: a base plus a charge per 512px tile."""
+    w, h = vision_size(width, height)
+    tiles = -(-w // 512) * -(-h // 512)
+    return 2833 + 5667 * tiles
+
+
+def peak_rss_mb() -> float:
+    # VmHWM starts over in the spawned process, unlike ru_maxrss which survives exec.
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def run(mode: str, samples: dict[str, bytes], repeat: int, results) -> None:
+    rows = []
+    for name, data in samples.items():
+        start = time.perf_counter()
+        for _ in range(repeat):
+            if mode == "original":
+                image, mime = data, "image/jpeg"
+            else:
+                image, mime = prepare_image(data)
+            url = image_data_url(image, mime)
+        elapsed = (time.perf_counter() - start) / repeat
+        with Image.open(io.BytesIO(image)) as img:
+            size = img.size
+        rows.append((name, elapsed, len(url), size, vision_tokens(*size)))
+    results.put((rows, peak_rss_mb()))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="*")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.paths:
+        samples = {}
+        for path in args.paths:
+            with open(path, "rb") as f:
+                samples[path] = f.read()
+    else:
+        samples = synthetic_samples()
+
+    ctx = multiprocessing.get_context("spawn")
+    for mode in ("original", "downscaled"):
+        results = ctx.Queue()
+        proc = ctx.Process(target=run, args=(mode, samples, args.repeat, results))
+        proc.start()
+        rows, peak_mb = results.get()
+        proc.join()
+        print(f"{mode}: peak_rss={peak_mb:.0f}MB")
+        for name, elapsed, payload, size, tokens in rows:
+            print(f"  {name:<14} prepare={elapsed * 1000:6.1f}ms payload={payload / 1024:7.0f}KB "
+                  f"sent={size[0]}x{size[1]} tokens~{tokens}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Compare the trigram NameMatcher against the original SequenceMatcher scan.
+
+    python -m benchmarks.bench_name_matcher [--sizes 1000 10000 100000] [--queries 200] [--edits 1]
+
+Each query is an indexed name with `--edits` random typos; recall is against the scan's matches.
+"""
+import argparse
+import random
+import string
+import time
+from difflib import SequenceMatcher
+
+from utils.name_matcher import NameMatcher
+
+FIRST = ["James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda", "William", "Elizabeth",
+         "David", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Charles", "Karen",
+         "Wei", "Aisha", "Mateo", "Priya", "Olga", "Kenji", "Fatima", "Lars", "Chidi", "Ines"]
+LAST = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez",
+        "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin",
+        "Nakamura", "Okafor", "Petrov", "Sharma", "Lindqvist", "Chen", "Haddad", "Kowalski", "Silva", "Novak"]
+
+
+def synthetic_names(n: int, rng: random.Random) -> list[str]:
+    names = []
+    for _ in range(n):
+        # A random syllable keeps names distinct enough to resemble a real contact list.
+        suffix = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 5)))
+        names.append(f"{rng.choice(FIRST)} {rng.choice(LAST)}{suffix}")
+    return names
+
+
+def typo(name: str, rng: random.Random) -> str:
+    chars = list(name)
+    i = rng.randrange(len(chars))
+    op = rng.choice(["drop", "swap", "replace"])
+    if op == "drop":
+        del chars[i]
+    elif op == "swap" and i + 1 < len(chars):
+        chars[i], chars[i + 1] = chars[i + 1], chars[i]
+    else:
+        chars[i] = rng.choice(string.ascii_lowercase)
+    return "".join(chars)
+
+
+def scan(names: list[str], query: str, threshold: float) -> list[tuple[str, float]]:
+    """The pre-index implementation of find_similar_names; keyed like the matcher, by list position."""
+    out = []
+    for i, existing in enumerate(names):
+        score = SequenceMatcher(None, query.lower(), existing.lower()).ratio()
+        if score >= threshold:
+            out.append((str(i), score))
+    out.sort(key=lambda m: m[1], reverse=True)
+    return out
+
+
+def mutate(name: str, rng: random.Random, edits: int) -> str:
+    for _ in range(edits):
+        name = typo(name, rng)
+    return name
+
+
+def run(size: int, queries: int, threshold: float, seed: int, edits: int = 1) -> dict:
+    rng = random.Random(seed)
+    names = synthetic_names(size, rng)
+    probes = [mutate(rng.choice(names), rng, edits) for _ in range(queries)]
+
+    t0 = time.perf_counter()
+    matcher = NameMatcher(threshold)
+    for i, name in enumerate(names):
+        matcher.add(str(i), name)
+    build_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    indexed = [matcher.search(q) for q in probes]
+    index_s = time.perf_counter() - t0
+
+    # The full scan is slow at 100k; sample it so the benchmark finishes in reasonable time.
+    scan_probes = probes[:max(1, min(queries, 2_000_000 // size))]
+    t0 = time.perf_counter()
+    scanned = [scan(names, q, threshold) for q in scan_probes]
+    scan_s = time.perf_counter() - t0
+
+    expected = sum(len(r) for r in scanned)
+    # By key, not name: at 100k the synthetic names repeat, and every copy has to be found.
+    found = sum(
+        len({k for k, _, _ in got} & {k for k, _ in want})
+        for got, want in zip(indexed, scanned)
+    )
+    index_ms = 1000 * index_s / len(probes)
+    scan_ms = 1000 * scan_s / len(scan_probes)
+    return {
+        "size": size,
+        "build_s": round(build_s, 3),
+        "scan_ms_per_query": round(scan_ms, 3),
+        "index_ms_per_query": round(index_ms, 3),
+        "speedup": round(scan_ms / index_ms, 1) if index_ms else None,
+        "recall": round(found / expected, 4) if expected else 1.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--edits", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'size':>8} {'build s':>8} {'scan ms':>9} {'index ms':>9} {'speedup':>8} {'recall':>7}")
+    for size in args.sizes:
+        r = run(size, args.queries, args.threshold, args.seed, args.edits)
+        print(f"{r['size']:>8} {r['build_s']:>8} {r['scan_ms_per_query']:>9} {r['index_ms_per_query']:>9} "
+              f"{r['speedup']:>8} {r['recall']:>7}")
+
+
+if __name__ == "__main__":
+    main()
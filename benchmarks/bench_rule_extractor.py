@@ -0,0 +1,98 @@
+"""
+How many messages the rule-based fast path serves without the LLM, and what the rules cost.
+
+    python -m benchmarks.bench_rule_extractor [--messages 2000] [--seed 0]
+
+The corpus mixes the structured shapes the rules target (signatures, "Name - Title @ Company"
+headlines, tag directives) with free-form notes and bare capitalized lines ("Met John Smith",
+"New York City") that must still go to the LLM, in roughly the proportions of the bot's traffic. Prints the share served locally, the share the LLM answers
+with rule fields merged in, and the time per message.
+"""
+import argparse
+import collections
+import random
+import time
+
+from benchmarks.bench_name_matcher import FIRST, LAST
+from utils import rule_extractor
+
+COMPANIES = ["Acme Ventures", "Globex Inc.", "Initech", "Umbrella Capital", "Stark Industries", "Wayne Enterprises"]
+ROLES = ["CEO", "Partner", "VP Engineering", "Head of Product", "Founder", "Principal", "Managing Director"]
+TAGS = ["vc", "Fintech", "investors", "Angel in Labs", "Deal", "Media", "climate"]
+
+
+def _person(rng: random.Random) -> dict:
+    first, last = rng.choice(FIRST), rng.choice(LAST)
+    return {"name": f"{first} {last}", "role": rng.choice(ROLES), "company": rng.choice(COMPANIES),
+            "email": f"{first.lower()}.{last.lower()}@example.com", "handle": f"{first.lower()}-{last.lower()}",
+            "phone": f"+1 (415) 555-{rng.randint(1000, 9999)}"}
+
+
+def signature(p: dict, rng: random.Random) -> str:
+    lines = [rng.choice(["Best regards,", "Thanks,", "Cheers"]), p["name"], p["role"], p["company"], p["email"]]
+    if rng.random() < 0.5:
+        lines.append(f"M: {p['phone']}")
+    if rng.random() < 0.5:
+        lines.append(f"linkedin.com/in/{p['handle']}")
+    return "\n".join(lines)
+
+
+def headline(p: dict, rng: random.Random) -> str:
+    sep = rng.choice([" – {role} @ {company}", ", {role} at {company}", " | {role} | {company}"])
+    text = p["name"] + sep.format(**p)
+    if rng.random() < 0.5:
+        text += f"\ntags: {', '.join(rng.sample(TAGS, 2))}"
+    return text
+
+
+def tag_update(p: dict, rng: random.Random) -> str:
+    return f"tag {p['name']} as {rng.choice(TAGS)}"
+
+
+def free_form(p: dict, rng: random.Random) -> str:
+    return rng.choice([
+        "Met {name} at the fintech dinner last night, {role} at {company}. Wants an intro to our BD team.",
+        "Coffee with {name} ({company}) - interested in the seed round, follow up in two weeks. {email}",
+        "{name} introduced by Sarah, runs product at {company}, based in Lisbon",
+    ]).format(**p)
+
+
+def bare_line(p: dict, rng: random.Random) -> str:
+    return rng.choice(["{name}", "Met {name}", "Thanks {name}", "Intro To {name}", "New York City",
+                       "Follow Up Tomorrow"]).format(**p)
+
+
+SHAPES = ((signature, 0.25), (headline, 0.2), (tag_update, 0.1), (free_form, 0.4), (bare_line, 0.05))
+
+
+def corpus(n: int, rng: random.Random) -> list[tuple[str, str]]:
+    makers, weights = zip(*SHAPES)
+    return [(maker.__name__, maker(_person(rng), rng)) for maker in rng.choices(makers, weights, k=n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    messages = corpus(args.messages, random.Random(args.seed))
+    outcomes: dict[str, collections.Counter] = collections.defaultdict(collections.Counter)
+    start = time.perf_counter()
+    for shape, text in messages:
+        result = rule_extractor.extract(text)
+        outcomes[shape]["local" if result.confident else "llm+rules" if result.fields else "llm"] += 1
+    elapsed = time.perf_counter() - start
+
+    total = collections.Counter()
+    for shape, counts in sorted(outcomes.items()):
+        total.update(counts)
+        n = sum(counts.values())
+        print(f"{shape:<11} n={n:<5} " + "  ".join(f"{k}={v / n:6.1%}" for k, v in sorted(counts.items())))
+    print(f"{'all':<11} n={len(messages):<5} " + "  ".join(f"{k}={v / len(messages):6.1%}" for k, v in sorted(total.items())))
+    print(f"rules: {elapsed / len(messages) * 1e6:.0f}us per message; "
+          f"{total['local']} of {len(messages)} completions skipped")
+
+
+if __name__ == "__main__":
+    main()
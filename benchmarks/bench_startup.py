@@ -0,0 +1,120 @@
+"""
+Cold-start import time of the entry points, and HTTP connection reuse of the shared clients.
+
+    python -m benchmarks.bench_startup [--runs 3] [--calls 64] [--concurrency 8]
+
+Import time is the cumulative `-X importtime` figure for each entry module, best of `--runs`
+fresh interpreters. Connection reuse points the OpenAI client at a local HTTP server and counts
+the TCP connections it accepts: every new connection is a TLS handshake against the real API.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ENTRY_POINTS = ("telegram_bot", "slack_bot", "bulk_import", "utils.ai_utils", "utils.notion_utils")
+COMPLETION = json.dumps({
+    "id": "bench", "object": "chat.completion", "created": 0, "model": "gpt-4o-mini",
+    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "{}"}}],
+}).encode()
+
+
+def import_time(module: str, runs: int) -> tuple[float, list[tuple[float, str]]]:
+    """Best cumulative import time of `module` in seconds, plus the heaviest top-level imports of that run."""
+    env = {**os.environ, "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "bench")}
+    best = None
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                              capture_output=True, text=True, env=env)
+        rows = []
+        for line in proc.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative, name = line[len("import time:"):].split("|")
+            rows.append((int(cumulative) / 1e6, name.rstrip()))
+        total = next((c for c, name in rows if name.strip() == module), None)
+        if total is not None and (best is None or total < best[0]):
+            top = sorted(((c, n.strip()) for c, n in rows if n.startswith("  ") and not n.startswith("    ")),
+                         reverse=True)[:5]
+            best = (total, top)
+    return best or (float("nan"), [])
+
+
+class _CountingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with _CountingHandler.lock:
+            _CountingHandler.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        time.sleep(0.02)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(COMPLETION)))
+        self.end_headers()
+        self.wfile.write(COMPLETION)
+
+    def log_message(self, format, *args):
+        pass
+
+
+async def _drive(clients_for_calls: list, calls: int, concurrency: int) -> None:
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with slots:
+            client = clients_for_calls[i % len(clients_for_calls)]
+            await client.chat.completions.create(model="gpt-4o-mini", messages=[{"role": "user", "content": "hi"}])
+    await asyncio.gather(*(one(i) for i in range(calls)))
+
+
+def connection_reuse(calls: int, concurrency: int) -> dict:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _CountingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    from openai import AsyncOpenAI
+    from utils.clients import ClientRegistry
+
+    results = {}
+    # Before: telegram_bot and ai_utils each built their own AsyncOpenAI, i.e. two pools.
+    _CountingHandler.connections = 0
+    asyncio.run(_drive([AsyncOpenAI(), AsyncOpenAI()], calls, concurrency))
+    results["separate_clients"] = _CountingHandler.connections
+    _CountingHandler.connections = 0
+    shared = ClientRegistry().get("async_openai")
+    asyncio.run(_drive([shared], calls, concurrency))
+    results["shared_client"] = _CountingHandler.connections
+    server.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--calls", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    for module in ENTRY_POINTS:
+        total, top = import_time(module, args.runs)
+        heaviest = ", ".join(f"{name} {seconds * 1000:.0f}ms" for seconds, name in top)
+        print(f"{module:<20} import={total * 1000:7.1f}ms  heaviest: {heaviest}")
+
+    reuse = connection_reuse(args.calls, args.concurrency)
+    print(f"{args.calls} completions at concurrency {args.concurrency}: "
+          f"{reuse['separate_clients']} connections with two clients, {reuse['shared_client']} with the shared one")
+
+
+if __name__ == "__main__":
+    main()
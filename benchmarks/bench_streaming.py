@@ -0,0 +1,73 @@
+"""
+Time to first result for multi-person messages, with and without streamed replies.
+
+    python -m benchmarks.bench_streaming [--people 1 5 20] [--openai-latency 0.3] [--per-person 0.15]
+
+Each message names N new people, one per line, and goes through `telegram_bot.handle_text`
+against local stand-ins. The completion takes `--openai-latency` plus `--per-person` seconds per
+person, as generation time grows with the reply. Writes are paced by the real write scheduler.
+Reports when the first reply appeared and when the last result was shown, for both modes.
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ.setdefault("CONTACT_INDEX_PATH", ":memory:")
+os.environ.setdefault("NOTION_DB_ID", "bench-db")
+os.environ.setdefault("PARSE_CACHE_PATH", ":memory:")
+os.environ.setdefault("METRICS_TRACE_LOG", "0")
+
+import telegram_bot  # noqa: E402
+from benchmarks.fakes import install, random_name  # noqa: E402
+
+
+class FakeMessage:
+    """A sent message that records when it was sent and each time it was edited."""
+
+    def __init__(self, text: str, timeline: list):
+        self.text = text
+        self.timeline = timeline
+
+    async def reply_text(self, text: str) -> "FakeMessage":
+        self.timeline.append((time.perf_counter(), text))
+        return FakeMessage(text, self.timeline)
+
+    async def edit_text(self, text: str) -> "FakeMessage":
+        self.timeline.append((time.perf_counter(), text))
+        return self
+
+
+async def one_message(people: int, rng: random.Random) -> tuple[float, float, int]:
+    timeline: list = []
+    text = "\n".join(random_name(rng) for _ in range(people))
+    update = SimpleNamespace(message=FakeMessage(text, timeline), effective_chat=SimpleNamespace(id=1),
+                             effective_user=SimpleNamespace(id=1), update_id=1)
+    start = time.perf_counter()
+    await telegram_bot.handle_text(update, SimpleNamespace(user_data={}))
+    return timeline[0][0] - start, timeline[-1][0] - start, len(timeline)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--people", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--openai-latency", type=float, default=0.3)
+    parser.add_argument("--per-person", type=float, default=0.15)
+    parser.add_argument("--notion-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    for people in args.people:
+        for streamed in (False, True):
+            install(openai_latency=args.openai_latency + args.per_person * people, notion_latency=args.notion_latency)
+            telegram_bot.STREAM_REPLIES = streamed
+            first, last, sends = asyncio.run(one_message(people, rng))
+            print(f"people={people:<3} {'streamed' if streamed else 'one reply':<9}  first result={first:6.2f}s  "
+                  f"last result={last:6.2f}s  messages sent/edited={sends}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+How well requested tags land on the database's existing options, and what resolving them costs.
+
+    python -m benchmarks.bench_tag_catalog [--tags 5000] [--seed 0]
+
+Each requested tag is a spelling of a `SCHEMA` option (case, plural, separators, "&" vs "and",
+one typo) or of a tag the catalog doesn't know yet. Compares the old blanket `capwords`, the old
+difflib cut-off against the option list, and `TagCatalog`. Reports the share landing on the
+intended name, how many distinct names the run would leave in the database, and time per tag.
+"""
+import argparse
+import difflib
+import random
+import string
+import time
+from types import SimpleNamespace
+
+from schema import SCHEMA
+from utils.schema_compiler import compiled_schema
+from utils.tag_catalog import TagCatalog
+
+OPTIONS = SCHEMA["Tags"]["options"]
+NEW_TAGS = ["AI Infra", "Climate", "Family Office", "Seed Stage", "Healthcare"]
+
+
+def variant(name: str, rng: random.Random) -> str:
+    kind = rng.randrange(6)
+    if kind == 0:
+        return name.lower()
+    if kind == 1:
+        return name.upper() if len(name) <= 4 else name + "s"
+    if kind == 2:
+        return name.replace("/", " / ").replace(" ", "-")
+    if kind == 3:
+        return name.replace("&", "and") if "&" in name else name.lower().replace(" ", "  ")
+    if kind == 4 and len(name) > 5:
+        i = rng.randrange(1, len(name) - 1)
+        return name[:i] + name[i + 1:]
+    return name
+
+
+def corpus(count: int, rng: random.Random) -> list[tuple[str, str]]:
+    """(requested spelling, intended name) pairs; a quarter are tags outside the schema."""
+    pairs = []
+    for _ in range(count):
+        name = rng.choice(NEW_TAGS) if rng.random() < 0.25 else rng.choice(OPTIONS)
+        pairs.append((variant(name, rng), name))
+    return pairs
+
+
+def difflib_cutoff(tag: str) -> str:
+    by_lower = {o.lower(): o for o in OPTIONS}
+    close = difflib.get_close_matches(tag.lower(), by_lower, n=1, cutoff=0.85)
+    return string.capwords(by_lower[close[0]] if close else tag)
+
+
+def run(label: str, resolve, pairs: list[tuple[str, str]]) -> None:
+    start = time.perf_counter()
+    resolved = [resolve(tag) for tag, _ in pairs]
+    elapsed = time.perf_counter() - start
+    hits = sum(got == want for got, (_, want) in zip(resolved, pairs))
+    print(f"{label:<14} intended={hits / len(pairs):6.1%}  distinct names={len(set(resolved)):4d} "
+          f"(want {len({want for _, want in pairs})})  {elapsed / len(pairs) * 1e6:7.1f}us/tag")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tags", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    pairs = corpus(args.tags, random.Random(args.seed))
+    retrieve = lambda database_id: {"properties": {"Tags": {"multi_select": {"options": [{"name": o} for o in OPTIONS]}}}}
+    catalog = TagCatalog(SimpleNamespace(databases=SimpleNamespace(retrieve=retrieve)), aliases={})
+    catalog.refresh("bench")
+
+    run("capwords", string.capwords, pairs)
+    run("difflib 0.85", difflib_cutoff, pairs)
+    run("tag catalog", lambda tag: catalog.resolve("bench", [tag])[0], pairs)
+    print(f"prompt prefix: ~{len(compiled_schema.prompt_prefix) // 4} tokens whatever the number of options; "
+          f"the list of {len(OPTIONS)} options alone was ~{len(', '.join(OPTIONS)) // 4}")
+
+
+if __name__ == "__main__":
+    main()
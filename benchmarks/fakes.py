@@ -0,0 +1,301 @@
+"""
+In-process stand-ins for the OpenAI and Notion SDK clients used by the bots.
+
+They implement only the calls this repo makes, with configurable latency, rate limits and
+page sizes, so the pipeline can be driven end to end without network access or API keys.
+`install` swaps them in for the module-level clients.
+"""
+import asyncio
+import collections
+import itertools
+import json
+import random
+import re
+import string
+import threading
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import httpx
+from notion_client.errors import APIErrorCode, APIResponseError
+
+from schema import SCHEMA
+
+
+def _completion(content: str, messages: list) -> SimpleNamespace:
+    # Roughly four characters per token, like English text through the real tokenizer.
+    prompt_tokens = sum(len(str(m.get("content"))) for m in messages) // 4
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=len(content) // 4),
+    )
+
+
+def person_from_text(text: str) -> dict:
+    """Echo the first line of a message back as the person's name, which is all the pipeline needs."""
+    return {"Name": text.strip().splitlines()[0].strip(), "Company/Org": "Acme", "Role/Title": None, "Tags": None}
+
+
+def people_from_text(text: str) -> list[dict]:
+    """One person per non-empty line, so a multi-line message reads as a list of people."""
+    return [person_from_text(line) for line in text.splitlines() if line.strip()] or [person_from_text("Pat Example")]
+
+
+def _chunks(content: str, messages: list, size: int = 16):
+    """The completion as streamed chunks of `size` characters, then a usage-only chunk, as with include_usage."""
+    for i in range(0, len(content), size):
+        delta = SimpleNamespace(content=content[i:i + size])
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+    yield SimpleNamespace(choices=[], usage=_completion(content, messages).usage)
+
+
+def reply_for(messages: list) -> str:
+    """The JSON a well-behaved model would return for a single or batched extraction prompt."""
+    prompt = messages[-1]["content"]
+    if not isinstance(prompt, str):
+        return json.dumps(person_from_text("Pat Example"))
+    if "\nMessages:\n" in prompt:
+        body = prompt.rsplit("Messages:", 1)[1]
+        parts = re.split(r"^\s*\[(\d+)\]\n", body, flags=re.MULTILINE)[1:]
+        results = [{"index": int(i), "records": people_from_text(text)} for i, text in zip(parts[::2], parts[1::2])]
+        return json.dumps({"results": results})
+    return json.dumps({"records": people_from_text(prompt.rsplit("Text:", 1)[-1])})
+
+
+class RequestPacer:
+    """
+    Server-side rate limit that queues instead of rejecting: each request is delayed to the
+    next free slot, which is what the OpenAI SDK's own retry-on-429 amounts to for callers.
+    """
+
+    def __init__(self, rate: float | None):
+        self.rate = rate
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def delay(self) -> float:
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + 1 / self.rate
+            return start - now
+
+
+class FakeOpenAI:
+    """
+    Sync `chat.completions.create` that sleeps for `latency` seconds and counts prompt characters.
+    With `stream=True` the reply arrives in chunks spread over the same `latency`.
+    """
+
+    def __init__(self, latency: float = 0.5, rate_limit: float | None = None):
+        self.latency = latency
+        self.pacer = RequestPacer(rate_limit)
+        self.calls = 0
+        self.prompt_chars = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+
+    def _chat(self, model: str, messages: list, **kwargs):
+        with self._lock:
+            self.calls += 1
+            self.prompt_chars += sum(len(m["content"]) for m in messages if isinstance(m["content"], str))
+        if kwargs.get("stream"):
+            return self._stream(reply_for(messages), messages)
+        time.sleep(self.pacer.delay() + self.latency)
+        return _completion(reply_for(messages), messages)
+
+    def _stream(self, content: str, messages: list):
+        # A tenth of the latency to the first token, the rest spread over the chunks.
+        chunks = list(_chunks(content, messages))
+        time.sleep(self.pacer.delay() + self.latency / 10)
+        for chunk in chunks:
+            time.sleep(self.latency * 0.9 / len(chunks))
+            yield chunk
+
+
+class FakeAsyncOpenAI:
+    """Async `chat.completions.create` / `audio.transcriptions.create` that sleep for `latency` seconds."""
+
+    def __init__(self, latency: float = 0.5, rate_limit: float | None = None):
+        self.latency = latency
+        self.pacer = RequestPacer(rate_limit)
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=self._transcribe))
+
+    async def _chat(self, model: str, messages: list, **kwargs):
+        self.calls += 1
+        if kwargs.get("stream"):
+            return self._stream(reply_for(messages), messages)
+        await asyncio.sleep(self.pacer.delay() + self.latency)
+        return _completion(reply_for(messages), messages)
+
+    async def _stream(self, content: str, messages: list):
+        chunks = list(_chunks(content, messages))
+        await asyncio.sleep(self.pacer.delay() + self.latency / 10)
+        for chunk in chunks:
+            await asyncio.sleep(self.latency * 0.9 / len(chunks))
+            yield chunk
+
+    async def _transcribe(self, model: str, file, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.pacer.delay() + self.latency)
+        return SimpleNamespace(text="Pat Example")
+
+
+class FakeNotion:
+    """
+    Thread-safe synchronous Notion client over an in-memory page dict; each call sleeps `latency`.
+
+    With `rate_limit` set, more than that many calls within any second are answered with a 429
+    and a Retry-After header, like the real API. Queries return at most `max_page_size` pages.
+    """
+
+    def __init__(self, latency: float = 0.3, rate_limit: float | None = None, max_page_size: int = 100):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.max_page_size = max_page_size
+        self.pages_by_id: dict[str, dict] = {}
+        self.calls: list[str] = []
+        self.rejected = 0
+        self._recent: collections.deque[float] = collections.deque()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        # The Tags options of the database schema; writes add new ones, as Notion does.
+        self.tag_options: list[str] = list(SCHEMA["Tags"]["options"])
+        self.databases = SimpleNamespace(query=self._query, retrieve=self._retrieve)
+        self.pages = SimpleNamespace(create=self._create, update=self._update)
+
+    def seed(self, count: int, rng: random.Random | None = None) -> list[str]:
+        """Fill the database with `count` random contacts, without counting calls; returns their names."""
+        rng = rng or random.Random(0)
+        names = [random_name(rng) for _ in range(count)]
+        with self._lock:
+            for name in names:
+                page_id = f"page-{next(self._ids)}"
+                self.pages_by_id[page_id] = {
+                    "id": page_id,
+                    "properties": render_properties({"Name": {"title": [{"text": {"content": name}}]}}),
+                    "last_edited_time": "2024-01-01T00:00:00.000Z",
+                }
+        return names
+
+    def _call(self, name: str) -> None:
+        with self._lock:
+            self.calls.append(name)
+            if self.rate_limit:
+                now = time.monotonic()
+                while self._recent and self._recent[0] <= now - 1:
+                    self._recent.popleft()
+                if len(self._recent) >= self.rate_limit:
+                    self.rejected += 1
+                    retry_after = max(0.0, self._recent[0] + 1 - now)
+                    raise _rate_limited(retry_after)
+                self._recent.append(now)
+        time.sleep(self.latency)
+
+    def _query(self, database_id: str, filter: dict | None = None, start_cursor: str | None = None,
+               page_size: int = 100, **kwargs) -> dict:
+        self._call("databases.query")
+        page_size = min(page_size, self.max_page_size)
+        with self._lock:
+            pages = [p for p in self.pages_by_id.values() if not p.get("archived")]
+        if filter and filter.get("timestamp") == "last_edited_time":
+            since = filter["last_edited_time"]["on_or_after"]
+            pages = [p for p in pages if p["last_edited_time"] >= since]
+        start = int(start_cursor or 0)
+        chunk = pages[start:start + page_size]
+        more = start + page_size < len(pages)
+        return {"results": chunk, "has_more": more, "next_cursor": str(start + page_size) if more else None}
+
+    def _retrieve(self, database_id: str) -> dict:
+        self._call("databases.retrieve")
+        with self._lock:
+            options = [{"name": name} for name in self.tag_options]
+        return {"id": database_id, "properties": {"Tags": {"type": "multi_select", "multi_select": {"options": options}}}}
+
+    def _add_tag_options(self, properties: dict) -> None:
+        for option in properties.get("Tags", {}).get("multi_select", []):
+            if option["name"] not in self.tag_options:
+                self.tag_options.append(option["name"])
+
+    def _create(self, parent: dict, properties: dict) -> dict:
+        self._call("pages.create")
+        with self._lock:
+            self._add_tag_options(properties)
+            page_id = f"page-{next(self._ids)}"
+            page = {"id": page_id, "properties": render_properties(properties), "last_edited_time": now_iso()}
+            self.pages_by_id[page_id] = page
+            return page
+
+    def _update(self, page_id: str, properties: dict | None = None, **kwargs) -> dict:
+        self._call("pages.update")
+        with self._lock:
+            page = self.pages_by_id[page_id]
+            self._add_tag_options(properties or {})
+            page["properties"].update(render_properties(properties or {}))
+            if "archived" in kwargs:
+                page["archived"] = kwargs["archived"]
+            page["last_edited_time"] = now_iso()
+            return page
+
+
+def _rate_limited(retry_after: float) -> APIResponseError:
+    response = httpx.Response(429, headers={"retry-after": f"{retry_after:.3f}"},
+                              request=httpx.Request("POST", "https://api.notion.com/v1/fake"))
+    return APIResponseError(response, "Rate limited", APIErrorCode.RateLimited)
+
+
+def random_name(rng: random.Random) -> str:
+    """Two random words: unrelated enough that distinct names never look like typos of each other."""
+    return " ".join("".join(rng.choices(string.ascii_lowercase, k=8)) for _ in range(2))
+
+
+def install(openai_latency: float = 0.5, notion_latency: float = 0.3, openai_rate_limit: float | None = None,
+            notion_rate_limit: float | None = None, max_page_size: int = 100,
+            notion_write_rate: float | None = None) -> SimpleNamespace:
+    """
+    Point every module-level client at fresh fakes; returns them as `.openai`, `.async_openai`
+    and `.notion`. The Notion fake is wrapped in `CountingClient` as the real client is, and the
+    contact index, write scheduler and tag catalog are rebuilt on top of it.
+    """
+    from utils import ai_utils, notion_utils
+    from utils.contact_index import ContactIndex
+    from utils.lookup_context import CountingClient
+    from utils.notion_writer import NOTION_WRITE_RATE, NotionWriteScheduler
+    from utils.tag_catalog import TagCatalog
+
+    fakes = SimpleNamespace(
+        openai=FakeOpenAI(openai_latency, openai_rate_limit),
+        async_openai=FakeAsyncOpenAI(openai_latency, openai_rate_limit),
+        notion=FakeNotion(notion_latency, notion_rate_limit, max_page_size),
+    )
+    ai_utils.openai_client = fakes.openai
+    ai_utils.async_openai_client = fakes.async_openai
+    notion_utils.notion = CountingClient(fakes.notion)
+    notion_utils.contact_index = ContactIndex(notion_utils.notion, ":memory:")
+    notion_utils.notion_writer = NotionWriteScheduler(notion_utils.notion, rate=notion_write_rate or NOTION_WRITE_RATE)
+    notion_utils.tag_catalog = TagCatalog(notion_utils.notion)
+    return fakes
+
+
+def now_iso() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:00.000Z")
+
+
+def render_properties(properties: dict) -> dict:
+    """Turn a write payload into the shape Notion returns when reading a page back."""
+    out = {}
+    for name, value in properties.items():
+        if "title" in value or "rich_text" in value:
+            kind = "title" if "title" in value else "rich_text"
+            out[name] = {"type": kind, kind: [
+                {"plain_text": chunk["text"]["content"], "text": chunk["text"]} for chunk in value[kind]
+            ]}
+        else:
+            kind = next(iter(value))
+            out[name] = {"type": kind, kind: value[kind]}
+    return out
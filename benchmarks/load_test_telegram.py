@@ -0,0 +1,76 @@
+"""
+Simulate N Telegram users messaging the bot at the same time, against local OpenAI/Notion stand-ins.
+
+    python -m benchmarks.load_test_telegram [--users 20] [--openai-latency 0.5] [--notion-latency 0.3]
+
+With a non-blocking pipeline the wall time stays close to one message's latency times
+ceil(users / PIPELINE_CONCURRENCY); a blocking one grows with the number of users.
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("OPENAI_API_KEY", "load-test")
+os.environ.setdefault("CONTACT_INDEX_PATH", ":memory:")
+os.environ.setdefault("NOTION_DB_ID", "load-test-db")
+os.environ.setdefault("PARSE_CACHE_PATH", ":memory:")
+
+import telegram_bot  # noqa: E402
+from utils import notion_utils  # noqa: E402
+from benchmarks.fakes import install, random_name  # noqa: E402
+
+
+class FakeMessage:
+    def __init__(self, text: str):
+        self.text = text
+        self.replies: list[str] = []
+
+    async def reply_text(self, text: str) -> None:
+        self.replies.append(text)
+
+
+async def simulate(users: int) -> list[float]:
+    rng = random.Random(0)
+    # Unrelated names, so every message takes the create path rather than a "did you mean" prompt.
+    names = [random_name(rng) for _ in range(users)]
+
+    async def one_user(i: int) -> float:
+        message = FakeMessage(names[i])
+        update = SimpleNamespace(message=message, effective_chat=SimpleNamespace(id=i),
+                                 effective_user=SimpleNamespace(id=i))
+        context = SimpleNamespace(user_data={})
+        t0 = time.perf_counter()
+        await telegram_bot.handle_text(update, context)
+        assert message.replies, "handler did not reply"
+        return time.perf_counter() - t0
+
+    return await asyncio.gather(*(one_user(i) for i in range(users)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--openai-latency", type=float, default=0.5)
+    parser.add_argument("--notion-latency", type=float, default=0.3)
+    parser.add_argument("--notion-rate", type=float, default=3.0, help="write scheduler requests/second")
+    args = parser.parse_args()
+
+    fakes = install(args.openai_latency, args.notion_latency, notion_write_rate=args.notion_rate)
+
+    t0 = time.perf_counter()
+    latencies = sorted(asyncio.run(simulate(args.users)))
+    wall = time.perf_counter() - t0
+
+    p50 = latencies[len(latencies) // 2]
+    print(f"users={args.users} concurrency={telegram_bot.PIPELINE_CONCURRENCY} "
+          f"notion_workers={notion_utils.NOTION_MAX_WORKERS}")
+    print(f"wall={wall:.2f}s p50={p50:.2f}s max={latencies[-1]:.2f}s "
+          f"throughput={args.users / wall:.1f} msg/s notion_calls={len(fakes.notion.calls)} "
+          f"openai_calls={fakes.openai.calls} prompt_chars={fakes.openai.prompt_chars}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+End-to-end benchmark suite against the local OpenAI and Notion stand-ins in `benchmarks.fakes`.
+
+    python -m benchmarks.suite [--scenarios parse confirm reply telegram slack slack_async]
+                               [--db-sizes 0 1000 10000] [--concurrency 1 8 32] [--messages 64]
+                               [--output bench.json] [--compare previous.json]
+
+Scenarios:
+  parse     `parse_with_ai` on distinct messages
+  confirm   `process_records_for_confirmation` on parsed records (creates and updates)
+  reply     near-miss names answered "yes" through `handle_confirmation_reply`
+  telegram  `telegram_bot.handle_text` end to end
+  slack     `slack_bot.handle_message` end to end
+  slack_async  `slack_bot.accept_event` end to end, concurrency bounded by the async app's dispatcher
+
+Every (scenario, db size, concurrency) cell runs in a fresh process, so caches, the contact
+index and peak RSS start from zero. Results are written as JSON; `--compare` prints the
+change in throughput and p99 against an earlier results file.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+SCENARIOS = ("parse", "confirm", "reply", "telegram", "slack", "slack_async")
+DATABASE_ID = "bench-db"
+
+
+def _setup_env() -> None:
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    os.environ.setdefault("NOTION_DB_ID", DATABASE_ID)
+    os.environ.setdefault("SLACK_BOT_TOKEN", "bench")
+    os.environ["CONTACT_INDEX_PATH"] = ":memory:"
+    os.environ["PARSE_CACHE_PATH"] = ":memory:"
+    os.environ["PENDING_STORE"] = "memory"
+    os.environ.setdefault("METRICS_TRACE_LOG", "0")
+
+
+def _peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _typo(name: str, rng: random.Random) -> str:
+    chars = list(name)
+    i = rng.randrange(len(chars))
+    chars[i] = "x" if chars[i] != "x" else "y"
+    return "".join(chars)
+
+
+def _messages(scenario: str, existing: list[str], count: int, update_share: float, rng: random.Random) -> list[str]:
+    from benchmarks.fakes import random_name
+    if scenario == "reply":
+        return [_typo(rng.choice(existing), rng) for _ in range(count)] if existing else []
+    return [rng.choice(existing) if existing and rng.random() < update_share else random_name(rng)
+            for _ in range(count)]
+
+
+def _run_threads(fn, items: list, concurrency: int) -> list[float]:
+    def timed(item):
+        t0 = time.perf_counter()
+        fn(item)
+        return time.perf_counter() - t0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(timed, items))
+
+
+def _run_async(fn, items: list, concurrency: int) -> list[float]:
+    async def main():
+        slots = asyncio.Semaphore(concurrency)
+
+        async def timed(item):
+            async with slots:
+                t0 = time.perf_counter()
+                await fn(item)
+                return time.perf_counter() - t0
+        return await asyncio.gather(*(timed(item) for item in items))
+    return asyncio.run(main())
+
+
+def run_cell(config: dict, results) -> None:
+    """Child process entry point: set up fakes, run one cell, report numbers through `results`."""
+    _setup_env()
+    from benchmarks import fakes as fake_clients
+    from utils import ai_utils, metrics, notion_utils
+    from utils import confirmation_flow
+
+    fakes = fake_clients.install(
+        openai_latency=config["openai_latency"], notion_latency=config["notion_latency"],
+        openai_rate_limit=config["openai_rate_limit"], notion_rate_limit=config["notion_rate_limit"],
+        max_page_size=config["page_size"], notion_write_rate=config["notion_write_rate"],
+    )
+    rng = random.Random(config["seed"])
+    existing = fakes.notion.seed(config["db_size"], rng)
+    # Load the contact index before timing, like a bot that has been up for a while.
+    limits = fakes.notion.latency, fakes.notion.rate_limit
+    fakes.notion.latency, fakes.notion.rate_limit = 0, None
+    notion_utils.contact_index.ensure_synced(DATABASE_ID)
+    fakes.notion.latency, fakes.notion.rate_limit = limits
+    texts = _messages(config["scenario"], existing, config["messages"], config["update_share"], rng)
+    fakes.notion.calls.clear()
+    fakes.openai.calls = fakes.async_openai.calls = 0
+    metrics.registry.reset()
+
+    scenario, concurrency = config["scenario"], config["concurrency"]
+    records = 0
+    t0 = time.perf_counter()
+    if scenario == "parse":
+        latencies = _run_threads(ai_utils.parse_with_ai, texts, concurrency)
+        records = len(texts)
+    elif scenario == "confirm":
+        parsed = [fake_clients.person_from_text(t) for t in texts]
+        latencies = _run_threads(
+            lambda r: confirmation_flow.process_records_for_confirmation(DATABASE_ID, [r]), parsed, concurrency)
+        records = len(parsed)
+    elif scenario == "reply":
+        pendings = []
+        for text in texts:
+            _, pending = confirmation_flow.process_records_for_confirmation(
+                DATABASE_ID, [fake_clients.person_from_text(text)])
+            pendings.append(pending)
+        fakes.notion.calls.clear()
+        metrics.registry.reset()
+        t0 = time.perf_counter()
+        latencies = _run_threads(
+            lambda p: confirmation_flow.handle_confirmation_reply(DATABASE_ID, "yes", p), pendings, concurrency)
+        records = sum(len(p) for p in pendings)
+    elif scenario == "telegram":
+        import telegram_bot
+
+        async def handle(item):
+            i, text = item
+            replies = []
+
+            async def reply_text(t):
+                replies.append(t)
+            update = SimpleNamespace(message=SimpleNamespace(text=text, reply_text=reply_text),
+                                     effective_chat=SimpleNamespace(id=i), effective_user=SimpleNamespace(id=i))
+            await telegram_bot.handle_text(update, SimpleNamespace(user_data={}))
+            assert replies, "handler did not reply"
+        latencies = _run_async(handle, list(enumerate(texts)), concurrency)
+        records = len(texts)
+    elif scenario == "slack":
+        import slack_bot
+
+        def handle(item):
+            i, text = item
+            replies = []
+            slack_bot.handle_message({"text": text, "channel": f"C{i}", "user": f"U{i}"}, replies.append)
+            assert replies, "handler did not reply"
+        latencies = _run_threads(handle, list(enumerate(texts)), concurrency)
+        records = len(texts)
+    elif scenario == "slack_async":
+        import slack_bot
+        from utils.dispatcher import KeyedDispatcher
+        slack_bot.dispatcher = KeyedDispatcher(concurrency, concurrency)
+
+        async def accept_all():
+            latencies = []
+            for i, text in enumerate(texts):
+                async def say(t, accepted=time.perf_counter()):
+                    latencies.append(time.perf_counter() - accepted)
+                await slack_bot.accept_event({"event_id": f"E{i}"}, {"text": text, "channel": f"C{i}", "user": f"U{i}"},
+                                             say, None)
+            await slack_bot.dispatcher.join()
+            return latencies
+        latencies = asyncio.run(accept_all())
+        assert len(latencies) == len(texts), "handler did not reply"
+        records = len(texts)
+    else:
+        raise ValueError(f"Unknown scenario {scenario!r}")
+    wall = time.perf_counter() - t0
+
+    latencies = sorted(latencies)
+    notion_calls = list(fakes.notion.calls)
+    openai_calls = fakes.openai.calls + fakes.async_openai.calls
+    results.put({
+        **config,
+        "records": records,
+        "wall_seconds": round(wall, 4),
+        "messages_per_second": round(len(latencies) / wall, 3) if wall else None,
+        "p50_seconds": round(_percentile(latencies, 0.50), 4),
+        "p99_seconds": round(_percentile(latencies, 0.99), 4),
+        "openai_calls_per_record": round(openai_calls / records, 3) if records else None,
+        "notion_reads_per_record": round(sum(c == "databases.query" for c in notion_calls) / records, 3) if records else None,
+        "notion_writes_per_record": round(sum(c.startswith("pages.") for c in notion_calls) / records, 3) if records else None,
+        "notion_rejected": fakes.notion.rejected,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "stages": {
+            h["labels"]["stage"]: {"count": h["count"], "seconds": round(h["sum"], 4)}
+            for h in metrics.registry.snapshot()["histograms"] if h["name"] == "crm_stage_seconds"
+        },
+    })
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def _wait_for_cell(proc, queue) -> dict:
+    import queue as queue_module
+    while True:
+        try:
+            return queue.get(timeout=1)
+        except queue_module.Empty:
+            if not proc.is_alive():
+                raise RuntimeError(f"benchmark process exited with code {proc.exitcode}")
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _cell_key(cell: dict) -> tuple:
+    return cell["scenario"], cell["db_size"], cell["concurrency"]
+
+
+def compare(previous_path: str, results: list[dict]) -> None:
+    with open(previous_path) as f:
+        previous = {_cell_key(c): c for c in json.load(f)["results"]}
+    print(f"\nvs {previous_path}:")
+    for cell in results:
+        old = previous.get(_cell_key(cell))
+        if old is None:
+            continue
+        d_tput = (cell["messages_per_second"] / old["messages_per_second"] - 1) * 100 if old["messages_per_second"] else 0
+        d_p99 = (cell["p99_seconds"] / old["p99_seconds"] - 1) * 100 if old["p99_seconds"] else 0
+        print(f"  {cell['scenario']:<9} db={cell['db_size']:<6} c={cell['concurrency']:<3} "
+              f"throughput {d_tput:+6.1f}%  p99 {d_p99:+6.1f}%")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--db-sizes", nargs="+", type=int, default=[0, 1000, 10000])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--messages", type=int, default=64)
+    parser.add_argument("--update-share", type=float, default=0.3, help="share of messages naming an existing contact")
+    parser.add_argument("--openai-latency", type=float, default=0.5)
+    parser.add_argument("--notion-latency", type=float, default=0.3)
+    parser.add_argument("--openai-rate-limit", type=float, default=None, help="requests/second, excess is queued")
+    parser.add_argument("--notion-rate-limit", type=float, default=None, help="requests/second, excess gets 429")
+    parser.add_argument("--notion-write-rate", type=float, default=None, help="write scheduler requests/second")
+    parser.add_argument("--page-size", type=int, default=100, help="max pages per Notion query response")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench.json")
+    parser.add_argument("--compare", help="earlier --output file to compare against")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for scenario in args.scenarios:
+        for db_size in args.db_sizes:
+            for concurrency in args.concurrency:
+                if scenario == "reply" and db_size == 0:
+                    continue  # nothing to be a near miss of
+                config = {
+                    "scenario": scenario, "db_size": db_size, "concurrency": concurrency,
+                    "messages": args.messages, "update_share": args.update_share,
+                    "openai_latency": args.openai_latency, "notion_latency": args.notion_latency,
+                    "openai_rate_limit": args.openai_rate_limit, "notion_rate_limit": args.notion_rate_limit,
+                    "notion_write_rate": args.notion_write_rate, "page_size": args.page_size, "seed": args.seed,
+                }
+                queue = ctx.Queue()
+                proc = ctx.Process(target=run_cell, args=(config, queue))
+                proc.start()
+                cell = _wait_for_cell(proc, queue)
+                proc.join()
+                results.append(cell)
+                print(f"{scenario:<9} db={db_size:<6} c={concurrency:<3} "
+                      f"{cell['messages_per_second']:7.2f} msg/s  p50={cell['p50_seconds']:.3f}s "
+                      f"p99={cell['p99_seconds']:.3f}s  openai/rec={cell['openai_calls_per_record']} "
+                      f"notion r/w per rec={cell['notion_reads_per_record']}/{cell['notion_writes_per_record']} "
+                      f"rss={cell['peak_rss_mb']}MB", flush=True)
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "revision": _git_revision(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "results": results,
+        }, f, indent=2)
+    print(f"wrote {args.output}")
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Bulk-import contacts from a CSV, vCard or LinkedIn connections export into the CRM.
+
+    python bulk_import.py contacts.csv [--format csv|vcard|linkedin] [--text-column Bio] [--dry-run]
+
+Rows whose columns map onto the schema are written as-is; only free text goes through the LLM.
+Every record then takes the usual path: similarity check, then create or update. Records that
+only resemble an existing contact are not written, but listed as suspected duplicates for review.
+Progress is checkpointed after every chunk, so re-running the same command resumes a crashed import.
+"""
+import argparse
+import csv
+import itertools
+import json
+import logging
+import os
+import sys
+from concurrent.futures import Future, ThreadPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from utils.batch_extractor import batch_extractor
+from utils.importers import READERS, detect_format
+from utils.lookup_context import LookupContext
+from utils.name_matcher import NameMatcher
+from utils.notion_utils import check_for_similar_names, submit_upsert, validate_customer_data
+
+NOTION_DB_ID = os.getenv("NOTION_DB_ID")
+
+logging.basicConfig(level=logging.INFO)
+
+
+def extract(chunk: list[tuple[dict, str]]) -> list[list[dict]]:
+    """
+    Records for each row of `chunk`. Free text from all rows goes out in batched completions;
+    structured fields win over anything the LLM extracts from a row's free text.
+    """
+    texts = [text for _, text in chunk if text]
+    parsed = iter(batch_extractor.extract_many(texts)) if texts else iter(())
+    out = []
+    for record, text in chunk:
+        if not text:
+            out.append([record] if record else [])
+            continue
+        extracted = next(parsed)
+        if not record:
+            out.append(extracted)
+        else:
+            out.append([(extracted[0] if extracted else {}) | {k: v for k, v in record.items() if v}])
+    return out
+
+
+class Checkpoint:
+    """Rows fully processed so far, persisted next to the input as JSON."""
+
+    def __init__(self, path: str, source: str):
+        self.path = path
+        self.source = os.path.abspath(source)
+        self.rows_done = 0
+        self.counts: dict[str, int] = {}
+
+    def load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            state = json.load(f)
+        if state.get("source") != self.source:
+            raise SystemExit(f"Checkpoint {self.path} belongs to {state.get('source')}; use --restart to discard it")
+        self.rows_done = state["rows_done"]
+        self.counts = state["counts"]
+        logging.info(f"Resuming {self.source} after {self.rows_done} rows")
+
+    def save(self) -> None:
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"source": self.source, "rows_done": self.rows_done, "counts": self.counts}, f)
+        os.replace(tmp, self.path)
+
+    def clear(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def run_import(database_id: str, rows, dry_run: bool, chunk_size: int,
+               checkpoint: Checkpoint | None, duplicates_out) -> dict[str, int]:
+    counts = dict(checkpoint.counts) if checkpoint else {}
+    start = checkpoint.rows_done if checkpoint else 0
+    rows = itertools.islice(rows, start, None)
+    # Names this import already created or queued, so repeated rows are recognized before Notion knows them.
+    seen = NameMatcher()
+    queued: list[Future | None] = []
+
+    def bump(outcome: str) -> None:
+        counts[outcome] = counts.get(outcome, 0) + 1
+
+    # Extraction of the next chunk overlaps the checks and writes of the current one.
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="import") as pool:
+        row_no = start
+        next_chunk = pool.submit(extract, list(itertools.islice(rows, chunk_size)))
+        while True:
+            extracted = next_chunk.result()
+            if not extracted:
+                break
+            next_chunk = pool.submit(extract, list(itertools.islice(rows, chunk_size)))
+            writes: list[Future] = []
+            for records in extracted:
+                row_no += 1
+                for data in records:
+                    is_valid, reason = validate_customer_data(data)
+                    if not is_valid:
+                        bump("skipped")
+                        continue
+                    name = str(data["Name"])
+                    earlier = seen.search(name)
+                    for key, _, _ in earlier:
+                        if queued[int(key)] is not None:
+                            queued[int(key)].result()
+                    lookup = LookupContext()
+                    status, payload = check_for_similar_names(database_id, data, lookup)
+                    if dry_run and earlier and status != "exact_match":
+                        # Nothing was written, so compare against the rows planned so far instead.
+                        status = "exact_match" if earlier[0][2] == 1.0 else "suggest"
+                        payload = [{"name": earlier[0][1]}]
+
+                    if status == "suggest" and payload:
+                        bump("suspected_duplicate")
+                        duplicates_out.writerow([row_no, name, payload[0].get("name")])
+                        continue
+                    bump("update" if status == "exact_match" else "create")
+                    seen.add(str(len(queued)), name)
+                    if dry_run:
+                        queued.append(None)
+                    else:
+                        write = submit_upsert(database_id, data, lookup=lookup)
+                        queued.append(write)
+                        writes.append(write)
+
+            for write in writes:
+                # submit_upsert reports a failed write as a per-record message instead of raising.
+                if write.result().startswith("Couldn't save"):
+                    bump("failed")
+            if checkpoint and not dry_run:
+                checkpoint.rows_done = row_no
+                checkpoint.counts = counts
+                checkpoint.save()
+            logging.info(f"Processed {row_no} rows: {counts}")
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=sorted(READERS), help="default: detected from the file")
+    parser.add_argument("--text-column", action="append", default=[],
+                        help="CSV column holding free text to extract with the LLM (repeatable)")
+    parser.add_argument("--dry-run", action="store_true", help="report creates/updates/duplicates without writing")
+    parser.add_argument("--chunk-size", type=int, default=50, help="rows per checkpoint")
+    parser.add_argument("--checkpoint", help="default: <path>.import-checkpoint.json")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("--duplicates", help="write suspected duplicates to this CSV (default: stderr)")
+    args = parser.parse_args()
+
+    if not NOTION_DB_ID:
+        raise SystemExit("Missing NOTION_DB_ID env var")
+    fmt = args.format or detect_format(args.path)
+    if fmt == "csv":
+        rows = READERS[fmt](args.path, set(args.text_column))
+    else:
+        rows = READERS[fmt](args.path)
+
+    checkpoint = None
+    if not args.dry_run:
+        checkpoint = Checkpoint(args.checkpoint or args.path + ".import-checkpoint.json", args.path)
+        if args.restart:
+            checkpoint.clear()
+        checkpoint.load()
+
+    out = open(args.duplicates, "w", newline="") if args.duplicates else sys.stderr
+    try:
+        writer = csv.writer(out)
+        writer.writerow(["row", "name", "similar_to"])
+        counts = run_import(NOTION_DB_ID, rows, args.dry_run, args.chunk_size, checkpoint, writer)
+    finally:
+        if out is not sys.stderr:
+            out.close()
+
+    if checkpoint:
+        checkpoint.clear()
+    print(json.dumps({"dry_run": args.dry_run, "format": fmt, **counts}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Find duplicate contacts across the whole CRM, and optionally merge them.
+
+    python dedupe.py [--out clusters.csv] [--threshold 0.85] [--full-sync]
+    python dedupe.py --apply [--merge-threshold 0.95]
+
+The database is paged through once, into the local contact index (an incremental sync if the
+index is already filled). Contacts are grouped by blocking keys: normalized email, LinkedIn
+handle, first or last name with the other's soundex, and company plus surname. Only contacts
+sharing a key are scored against each other, so the work grows with the number of contacts, not
+its square. Pairs at or above the threshold are joined into clusters and written to the CSV, one
+row per contact. Blocks too large to compare are listed by key in the stats.
+
+With --apply, clusters whose weakest link scores at least --merge-threshold are merged, unless a
+link rests on the name alone or two members have different emails or LinkedIn profiles. The
+most complete page keeps the combined fields, and the others are archived. All writes go through
+the rate-limited write scheduler.
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import Future
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from utils.dedupe import DEDUPE_MAX_BLOCK, DEDUPE_THRESHOLD, Cluster, Contact, find_clusters, merged_props
+from utils.notion_utils import contact_index, notion_writer
+from utils.schema_compiler import compiled_schema
+
+NOTION_DB_ID = os.getenv("NOTION_DB_ID")
+# Merging is irreversible short of restoring pages from the trash, so only clusters held together by
+# a shared email or LinkedIn profile (or near-identical name and company) merge; see `Cluster.auto_mergeable`.
+DEDUPE_MERGE_THRESHOLD = float(os.getenv("DEDUPE_MERGE_THRESHOLD", "0.95"))
+# Larger clusters are usually a chain of weak links; they are reported but never merged.
+DEDUPE_MAX_MERGE = int(os.getenv("DEDUPE_MAX_MERGE", "5"))
+
+logging.basicConfig(level=logging.INFO)
+
+
+def load_contacts(database_id: str, full_sync: bool) -> list[Contact]:
+    started = time.perf_counter()
+    if full_sync:
+        contact_index.full_sync(database_id)
+    else:
+        contact_index.incremental_sync(database_id)
+    logging.info(f"Synced contact index in {time.perf_counter() - started:.1f}s")
+    return [Contact.from_page(page) for page in contact_index.pages(database_id)]
+
+
+def write_clusters(clusters: list[Cluster], out) -> None:
+    writer = csv.writer(out)
+    writer.writerow(["cluster", "score", "reasons", "keep", "page_id", "name", "email", "linkedin", "company"])
+    for n, cluster in enumerate(clusters, 1):
+        keep = cluster.survivor()
+        for c in sorted(cluster.members, key=lambda c: c is not keep):
+            writer.writerow([n, f"{cluster.score:.3f}", "+".join(cluster.reasons), "yes" if c is keep else "",
+                             c.page_id, c.name, c.email or "", c.linkedin or "", c.company or ""])
+
+
+def apply_merges(database_id: str, clusters: list[Cluster], merge_threshold: float) -> dict[str, int]:
+    """Fold each eligible cluster into its survivor, then archive the rest; returns counts."""
+    counts = {"merged_clusters": 0, "archived_pages": 0, "skipped_clusters": 0, "failed_clusters": 0}
+    planned: list[tuple[Cluster, Contact, Future | None]] = []
+    for cluster in clusters:
+        if not cluster.auto_mergeable(merge_threshold) or len(cluster.members) > DEDUPE_MAX_MERGE:
+            counts["skipped_clusters"] += 1
+            continue
+        keep = cluster.survivor()
+        records = {c.page_id: compiled_schema.from_notion_props((contact_index.get(database_id, c.page_id) or {})
+                                                                .get("properties", {}))
+                   for c in cluster.members}
+        props = merged_props(records[keep.page_id], [records[c.page_id] for c in cluster.members if c is not keep])
+        planned.append((cluster, keep, notion_writer.submit_update(keep.page_id, props) if props else None))
+
+    archives: list[tuple[Cluster, list[Future]]] = []
+    for cluster, keep, update in planned:
+        try:
+            if update is not None:
+                contact_index.record_page(database_id, update.result())
+        except Exception as e:
+            logging.error(f"Couldn't update {keep.name} ({keep.page_id}); leaving its duplicates alone: {e}")
+            counts["failed_clusters"] += 1
+            continue
+        archives.append((cluster, [notion_writer.submit_update(c.page_id, {}, archived=True)
+                                   for c in cluster.members if c is not keep]))
+
+    for cluster, futures in archives:
+        results = notion_writer.write_all(futures)
+        for result in results:
+            if isinstance(result, Exception):
+                logging.error(f"Couldn't archive a duplicate of {cluster.survivor().name}: {result}")
+            else:
+                contact_index.record_page(database_id, result)
+                counts["archived_pages"] += 1
+        if any(isinstance(result, Exception) for result in results):
+            counts["failed_clusters"] += 1
+        else:
+            counts["merged_clusters"] += 1
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", help="write clusters to this CSV (default: stdout)")
+    parser.add_argument("--threshold", type=float, default=DEDUPE_THRESHOLD, help="score that links two contacts")
+    parser.add_argument("--max-block", type=int, default=DEDUPE_MAX_BLOCK, help="skip blocking keys shared by more contacts")
+    parser.add_argument("--full-sync", action="store_true", help="re-read every page instead of syncing incrementally")
+    parser.add_argument("--apply", action="store_true", help="merge clusters at or above --merge-threshold")
+    parser.add_argument("--merge-threshold", type=float, default=DEDUPE_MERGE_THRESHOLD)
+    args = parser.parse_args()
+
+    if not NOTION_DB_ID:
+        raise SystemExit("Missing NOTION_DB_ID env var")
+    contacts = load_contacts(NOTION_DB_ID, args.full_sync)
+    started = time.perf_counter()
+    clusters, stats = find_clusters(contacts, args.threshold, args.max_block)
+    stats["match_seconds"] = round(time.perf_counter() - started, 2)
+
+    out = open(args.out, "w", newline="") if args.out else sys.stdout
+    try:
+        write_clusters(clusters, out)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    if args.apply:
+        stats.update(apply_merges(NOTION_DB_ID, clusters, args.merge_threshold))
+    print(json.dumps({"applied": args.apply, **stats}, indent=2), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,28 @@
+import asyncio
 import os
 import logging
 import re
+import time
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
-from utils.ai_utils import parse_with_ai
+from utils.batch_extractor import batch_extractor
+from utils.ai_utils import stream_parse_with_ai, stream_parse_with_ai_async
 from utils.notion_utils import upsert_to_notion
 from utils.confirmation_flow import (
     process_records_for_confirmation,
+    process_records_for_confirmation_async,
+    stream_records_for_confirmation,
+    stream_records_for_confirmation_async,
     render_confirmation_text,
     handle_confirmation_reply,
+    handle_confirmation_reply_async,
+    pending_store,
 )
+from utils.dispatcher import KeyedDispatcher, RecentIds
+from utils.pending_store import conversation_key
+from utils.job_queue import USE_JOB_QUEUE, JobQueue
+from utils.status_message import STREAM_REPLIES, StatusThrottle
+from utils import metrics
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -18,13 +31,175 @@ load_dotenv()
 SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN")
 SLACK_APP_TOKEN = os.getenv("SLACK_APP_TOKEN")
 NOTION_DB_ID = os.getenv("NOTION_DB_ID")
-
-print(SLACK_BOT_TOKEN, SLACK_APP_TOKEN, NOTION_DB_ID)
+# "0" runs the synchronous Bolt app, which handles each message on Bolt's listener threads.
+SLACK_ASYNC = os.getenv("SLACK_ASYNC", "1") == "1"
+# Messages processed at once by the async app, overall and within one channel.
+SLACK_CONCURRENCY = int(os.getenv("SLACK_CONCURRENCY", "16"))
+SLACK_CHANNEL_CONCURRENCY = int(os.getenv("SLACK_CHANNEL_CONCURRENCY", "4"))
 
 logging.basicConfig(level=logging.INFO)
+# With the job queue on, the listener only records the message; `worker.py` does the rest.
+job_queue = JobQueue() if USE_JOB_QUEUE else None
+# Async app only: event ids already accepted, and the background runner for accepted messages.
+recent_events = RecentIds()
+dispatcher = KeyedDispatcher(SLACK_CONCURRENCY, SLACK_CHANNEL_CONCURRENCY)
+
+
+def incoming(message: dict) -> tuple[str, str, str] | None:
+    """(text, channel id, conversation key) of a message worth handling; None for bot and empty messages."""
+    logging.info(f"Received message: {message}")
+    # Ignore bot messages
+    if message.get("subtype") == "bot_message":
+        logging.info("Ignoring bot message")
+        return None
+    text = (message.get("text") or "").strip()
+    if not text:
+        logging.info("Empty text, ignoring")
+        return None
+    logging.info(f"Processing text: {text}")
+    channel_id = message.get("channel") or ""
+    return text, channel_id, conversation_key("slack", channel_id, message.get("user") or "")
+
+
+def job_payload(text: str, channel_id: str, message: dict) -> tuple[dict, str]:
+    """The queued job's payload and key."""
+    payload = {"text": text, "reply_to": {"channel": "slack", "channel_id": channel_id}}
+    # Keyed by the message timestamp, so an event Slack retries is queued once.
+    return payload, f"slack:{channel_id}:{message.get('ts')}"
+
+
+def stream_message(text: str, key: str, say, client) -> None:
+    """Extract `text` as a stream and keep one reply updated (via `chat.update`) as each record lands."""
+    status, posted = StatusThrottle(), None
+
+    def show(msgs: list[str], final: bool = False) -> None:
+        nonlocal posted
+        body = "\n".join(msgs)
+        if not (status.final(body) if final else status.due(body)):
+            return
+        if posted is None:
+            posted = say(body)
+        else:
+            client.chat_update(channel=posted["channel"], ts=posted["ts"], text=body)
+
+    msgs, pending = stream_records_for_confirmation(NOTION_DB_ID, stream_parse_with_ai(text), show)
+    show(msgs, final=True)
+    if pending:
+        pending_store.put(key, pending)
+        say(render_confirmation_text(pending))
+
+
+@metrics.traced("slack", "text")
+def handle_message(message: dict, say, client=None) -> None:
+    """Run one Slack message through the pipeline and answer with `say` (streamed when `client` can edit replies)."""
+    parsed = incoming(message)
+    if parsed is None:
+        return
+    text, channel_id, key = parsed
+    try:
+        if job_queue:
+            payload, job_key = job_payload(text, channel_id, message)
+            job_queue.enqueue("text", payload, key, job_key)
+            return
+
+        # If awaiting confirmation, handle reply first
+        pending = pending_store.pop(key)
+        if pending is not None:
+            msgs = handle_confirmation_reply(NOTION_DB_ID, text, pending)
+            say("\n".join(msgs))
+            return
+
+        if STREAM_REPLIES and client is not None:
+            stream_message(text, key, say, client)
+            return
+
+        with metrics.stage("extract"):
+            records = batch_extractor.extract(text)
+        msgs, pending = process_records_for_confirmation(NOTION_DB_ID, records)
+        if pending:
+            pending_store.put(key, pending)
+            say(render_confirmation_text(pending))
+        else:
+            say("\n".join(msgs))
+    except Exception as exc:
+        logging.exception("Slack handler error: %s", exc)
+        say("Sorry, I couldn't process that message.")
+
+
+async def stream_message_async(text: str, key: str, say, client) -> None:
+    """Async `stream_message`."""
+    status, posted = StatusThrottle(), None
+
+    async def show(msgs: list[str], final: bool = False) -> None:
+        nonlocal posted
+        body = "\n".join(msgs)
+        if not (status.final(body) if final else status.due(body)):
+            return
+        if posted is None:
+            posted = await say(body)
+        else:
+            await client.chat_update(channel=posted["channel"], ts=posted["ts"], text=body)
+
+    msgs, pending = await stream_records_for_confirmation_async(NOTION_DB_ID, stream_parse_with_ai_async(text), show)
+    await show(msgs, final=True)
+    if pending:
+        pending_store.put(key, pending)
+        await say(render_confirmation_text(pending))
+
+
+@metrics.traced("slack", "text")
+async def handle_message_async(message: dict, say, client=None, queued_at: float | None = None) -> None:
+    """`handle_message` for the async app; `queued_at` is when the listener accepted the event."""
+    if queued_at is not None:
+        metrics.observe_stage("queue", time.perf_counter() - queued_at)
+    parsed = incoming(message)
+    if parsed is None:
+        return
+    text, channel_id, key = parsed
+    try:
+        if job_queue:
+            payload, job_key = job_payload(text, channel_id, message)
+            await asyncio.to_thread(job_queue.enqueue, "text", payload, key, job_key)
+            return
+
+        pending = pending_store.pop(key)
+        if pending is not None:
+            msgs = await handle_confirmation_reply_async(NOTION_DB_ID, text, pending)
+            await say("\n".join(msgs))
+            return
+
+        if STREAM_REPLIES and client is not None:
+            await stream_message_async(text, key, say, client)
+            return
 
-# In-memory pending confirmations per (channel, user)
-PENDING_CONFIRMATIONS: dict[tuple[str, str], list] = {}
+        with metrics.stage("extract"):
+            records = await batch_extractor.extract_async(text)
+        msgs, pending = await process_records_for_confirmation_async(NOTION_DB_ID, records)
+        if pending:
+            pending_store.put(key, pending)
+            await say(render_confirmation_text(pending))
+        else:
+            await say("\n".join(msgs))
+    except Exception as exc:
+        logging.exception("Slack handler error: %s", exc)
+        await say("Sorry, I couldn't process that message.")
+
+
+async def accept_event(body: dict, message: dict, say, client) -> None:
+    """
+    The async app's listener. Drops redeliveries of an event it has already accepted, then
+    queues the message behind earlier ones from the same user in the same channel and
+    returns, so Bolt acks the event right away instead of after the whole pipeline.
+    """
+    channel_id = message.get("channel") or ""
+    event_id = body.get("event_id") or f"{channel_id}:{message.get('ts')}"
+    if recent_events.seen(event_id):
+        metrics.inc("crm_slack_events_total", outcome="duplicate")
+        return
+    metrics.inc("crm_slack_events_total", outcome="accepted")
+    queued_at = time.perf_counter()
+    dispatcher.submit((channel_id, message.get("user") or ""), channel_id,
+                      lambda: handle_message_async(message, say, client, queued_at))
 
 
 def create_app() -> App:
@@ -34,48 +209,40 @@ def create_app() -> App:
     app = App(token=SLACK_BOT_TOKEN)
 
     @app.message(".*")
-    def handle_message_events(message, say):
-        logging.info(f"Received message: {message}")
-        # Ignore bot messages
-        if message.get("subtype") == "bot_message":
-            logging.info("Ignoring bot message")
-            return
-        text = (message.get("text") or "").strip()
-        if not text:
-            logging.info("Empty text, ignoring")
-            return
-        logging.info(f"Processing text: {text}")
-        try:
-            channel_id = message.get("channel") or ""
-            user_id = message.get("user") or ""
-            key = (channel_id, user_id)
-
-            # If awaiting confirmation, handle reply first
-            if key in PENDING_CONFIRMATIONS:
-                pending = PENDING_CONFIRMATIONS.pop(key)
-                msgs = handle_confirmation_reply(NOTION_DB_ID, text, pending)
-                say("\n".join(msgs))
-                return
-
-            records = parse_with_ai(text)
-            msgs, pending = process_records_for_confirmation(NOTION_DB_ID, records)
-            if pending:
-                PENDING_CONFIRMATIONS[key] = pending
-                say(render_confirmation_text(pending))
-            else:
-                say("\n".join(msgs))
-        except Exception as exc:
-            logging.exception("Slack handler error: %s", exc)
-            say("Sorry, I couldn't process that message.")
+    def handle_message_events(message, say, client):
+        handle_message(message, say, client)
 
     return app
 
 
+def create_async_app():
+    """Create a Slack Bolt AsyncApp whose listener only accepts events; see `accept_event`."""
+    from slack_bolt.async_app import AsyncApp
+    if not SLACK_BOT_TOKEN:
+        raise RuntimeError("Missing SLACK_BOT_TOKEN env var")
+    app = AsyncApp(token=SLACK_BOT_TOKEN)
+
+    @app.message(".*")
+    async def handle_message_events(body, message, say, client):
+        await accept_event(body, message, say, client)
+
+    return app
+
+
+async def run_async() -> None:
+    from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+    handler = AsyncSocketModeHandler(create_async_app(), SLACK_APP_TOKEN)
+    await handler.start_async()
+
+
 def main() -> None:
     if not SLACK_APP_TOKEN:
         raise RuntimeError("Missing SLACK_APP_TOKEN env var (starts with xapp-) for Socket Mode")
-    app = create_app()
-    handler = SocketModeHandler(app, SLACK_APP_TOKEN)
+    metrics.serve()
+    if SLACK_ASYNC:
+        asyncio.run(run_async())
+        return
+    handler = SocketModeHandler(create_app(), SLACK_APP_TOKEN)
     handler.start()
 
 
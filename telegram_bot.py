@@ -1,14 +1,20 @@
-import os, tempfile, base64, logging
+import os, logging, asyncio
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
-from utils.ai_utils import parse_with_ai
-from utils.notion_utils import upsert_to_notion
+from utils.batch_extractor import batch_extractor
 from utils.confirmation_flow import (
-    process_records_for_confirmation,
+    process_records_for_confirmation_async,
+    stream_records_for_confirmation_async,
     render_confirmation_text,
-    handle_confirmation_reply,
+    handle_confirmation_reply_async,
+    pending_store,
 )
-from openai import OpenAI, RateLimitError
+from utils.pending_store import conversation_key
+from utils.job_queue import USE_JOB_QUEUE, JobQueue
+from utils import clients, metrics
+from utils.ai_utils import describe_image_async, stream_parse_with_ai_async, transcribe_audio_async
+from utils.status_message import STREAM_REPLIES, StatusThrottle
+from utils.media import MediaTooLarge, download_media, image_data_url, pick_photo_size, prepare_image
 from dotenv import load_dotenv
 import re
 
@@ -16,115 +22,153 @@ load_dotenv()
 
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 NOTION_DB_ID = os.getenv("NOTION_DB_ID")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# How many messages may be in the parse/match/upsert pipeline at once, across all chats.
+PIPELINE_CONCURRENCY = int(os.getenv("PIPELINE_CONCURRENCY", "8"))
 
 
 logging.basicConfig(level=logging.INFO)
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
+pipeline_slots = asyncio.Semaphore(PIPELINE_CONCURRENCY)
+# With the job queue on, handlers only record the message; `worker.py` does the rest.
+job_queue = JobQueue() if USE_JOB_QUEUE else None
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
         "Hi! Send me text, screenshots, or voice memos with customer info. I'll parse and sync with Notion"
     )
 
-async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    # Check if this is a confirmation response
-    if "pending_confirmations" in context.user_data:
-        await handle_confirmation(update, context)
-        return
-    
-    records = parse_with_ai(update.message.text)
-    msgs, pending_confirmations = process_records_for_confirmation(NOTION_DB_ID, records)
-    
+async def process_text(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
+    """Parse `text`, run the Notion pipeline and reply, holding one of the pipeline slots."""
+    with metrics.stage("queue"):
+        await pipeline_slots.acquire()
+    try:
+        if STREAM_REPLIES:
+            await stream_text(update, text)
+            return
+        with metrics.stage("extract"):
+            records = await batch_extractor.extract_async(text)
+        msgs, pending_confirmations = await process_records_for_confirmation_async(NOTION_DB_ID, records)
+    finally:
+        pipeline_slots.release()
+
     if pending_confirmations:
         # Store pending confirmations and ask user
-        context.user_data["pending_confirmations"] = pending_confirmations
+        pending_store.put(conversation(update), pending_confirmations)
         await update.message.reply_text(render_confirmation_text(pending_confirmations))
     else:
         await update.message.reply_text("\n".join(msgs))
 
-async def handle_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle user confirmation responses"""
-    pending_confirmations = context.user_data.get("pending_confirmations", [])
+async def stream_text(update: Update, text: str):
+    """Extract `text` as a stream and keep one reply updated with each record's result as it lands."""
+    status, message = StatusThrottle(), None
+
+    async def show(msgs: list[str], final: bool = False):
+        nonlocal message
+        body = "\n".join(msgs)
+        if not (status.final(body) if final else status.due(body)):
+            return
+        message = await (message.edit_text(body) if message else update.message.reply_text(body))
+
+    msgs, pending_confirmations = await stream_records_for_confirmation_async(
+        NOTION_DB_ID, stream_parse_with_ai_async(text), show
+    )
+    await show(msgs, final=True)
+    if pending_confirmations:
+        pending_store.put(conversation(update), pending_confirmations)
+        await update.message.reply_text(render_confirmation_text(pending_confirmations))
+
+def conversation(update: Update) -> str:
+    return conversation_key("telegram", update.effective_chat.id, update.effective_user.id)
+
+async def enqueue(update: Update, kind: str, payload: dict) -> None:
+    # Keyed by update id, so an update Telegram delivers twice is queued once.
+    payload = {**payload, "reply_to": {"channel": "telegram", "chat_id": update.effective_chat.id}}
+    await asyncio.to_thread(job_queue.enqueue, kind, payload, conversation(update), f"telegram:{update.update_id}")
+
+@metrics.traced("telegram", "text")
+async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if job_queue:
+        await enqueue(update, "text", {"text": update.message.text})
+        return
+    # Check if this is a confirmation response
+    pending_confirmations = pending_store.pop(conversation(update))
+    if pending_confirmations is not None:
+        await handle_confirmation(update, pending_confirmations)
+        return
+    
+    await process_text(update, context, update.message.text)
+
+async def handle_confirmation(update: Update, pending_confirmations: list[dict]):
+    """Handle user confirmation responses (already taken out of the pending store)"""
     if not pending_confirmations:
         await update.message.reply_text("No pending confirmations.")
         return
     
-    user_response = update.message.text
-    msgs = handle_confirmation_reply(NOTION_DB_ID, user_response, pending_confirmations)
+    user_response = update.message.text or ""
+    async with pipeline_slots:
+        metrics.inc("crm_confirmation_replies_total")
+        msgs = await handle_confirmation_reply_async(NOTION_DB_ID, user_response, pending_confirmations)
     
-    # Clear pending confirmations
-    del context.user_data["pending_confirmations"]
     await update.message.reply_text("\n".join(msgs))
 
+@metrics.traced("telegram", "voice")
 async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if job_queue:
+        await enqueue(update, "voice", {"file_id": update.message.voice.file_id})
+        return
     # If awaiting confirmation, route here as well
-    if "pending_confirmations" in context.user_data:
-        await handle_confirmation(update, context)
+    pending_confirmations = pending_store.pop(conversation(update))
+    if pending_confirmations is not None:
+        await handle_confirmation(update, pending_confirmations)
         return
     file = await update.message.voice.get_file()
-    with tempfile.NamedTemporaryFile(suffix=".ogg", delete=False) as tmp:
-        await file.download_to_drive(tmp.name)
-        try:
-            with open(tmp.name, "rb") as audio:
-                transcript = openai_client.audio.transcriptions.create(
-                    model="gpt-4o-mini-transcribe", file=audio
-                )
-        except RateLimitError:
-            await update.message.reply_text(
-                "I'm temporarily rate-limited by OpenAI for transcriptions. Please try again in a moment, or send the info as text."
-            )
-            return
-    records = parse_with_ai(transcript.text)
-    msgs, pending_confirmations = process_records_for_confirmation(NOTION_DB_ID, records)
-    if pending_confirmations:
-        context.user_data["pending_confirmations"] = pending_confirmations
-        await update.message.reply_text(render_confirmation_text(pending_confirmations))
-    else:
-        await update.message.reply_text("\n".join(msgs))
+    try:
+        with metrics.stage("download"):
+            audio = await download_media(file)
+    except MediaTooLarge:
+        await update.message.reply_text("That voice memo is too long for me, please split it up or send the info as text.")
+        return
+    try:
+        transcript = await transcribe_audio_async(audio)
+    except clients.openai_error("RateLimitError"):
+        await update.message.reply_text(
+            "I'm temporarily rate-limited by OpenAI for transcriptions. Please try again in a moment, or send the info as text."
+        )
+        return
+    await process_text(update, context, transcript)
 
+@metrics.traced("telegram", "photo")
 async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if job_queue:
+        await enqueue(update, "photo", {"file_id": pick_photo_size(update.message.photo).file_id})
+        return
     try:
         # If awaiting confirmation, route here as well
-        if "pending_confirmations" in context.user_data:
-            await handle_confirmation(update, context)
+        pending_confirmations = pending_store.pop(conversation(update))
+        if pending_confirmations is not None:
+            await handle_confirmation(update, pending_confirmations)
             return
-        photo = update.message.photo[-1]
+        photo = pick_photo_size(update.message.photo)
         file = await photo.get_file()
-        with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as tmp:
-            await file.download_to_drive(tmp.name)
-            with open(tmp.name, "rb") as f:
-                img_b64 = base64.b64encode(f.read()).decode("utf-8")
-
-        messages = [{
-            "role": "user",
-            "content": [
-                {"type": "text", "text": "Extract CRM fields in JSON based on schema. If multiple people are mentioned, return a JSON array of objects."},
-                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{img_b64}"}}
-            ]
-        }]
-
-        resp = openai_client.chat.completions.create(
-            model="gpt-4o-mini", messages=messages, temperature=0
-        )
-        raw = resp.choices[0].message.content.strip()
-        records = parse_with_ai(raw)
-        msgs, pending_confirmations = process_records_for_confirmation(NOTION_DB_ID, records)
-        if pending_confirmations:
-            context.user_data["pending_confirmations"] = pending_confirmations
-            await update.message.reply_text(render_confirmation_text(pending_confirmations))
-        else:
-            await update.message.reply_text("\n".join(msgs))
+        with metrics.stage("download"):
+            image = await download_media(file)
+        # Decoding and recompressing is CPU work; keep it off the event loop.
+        with metrics.stage("resize"):
+            image, mime = await asyncio.to_thread(prepare_image, image)
+
+        raw = await describe_image_async(image_data_url(image, mime))
+        await process_text(update, context, raw)
     except Exception as e:
         logging.error(f"Photo error: {e}")
         await update.message.reply_text("Couldn't process that image.")
 
 def main():
-    app = Application.builder().token(TELEGRAM_TOKEN).build()
+    # Updates are handled concurrently; PIPELINE_CONCURRENCY bounds the expensive part.
+    app = Application.builder().token(TELEGRAM_TOKEN).concurrent_updates(True).build()
     app.add_handler(CommandHandler("start", start))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
     app.add_handler(MessageHandler(filters.VOICE, handle_voice))
     app.add_handler(MessageHandler(filters.PHOTO, handle_photo))
+    metrics.serve()
     app.run_polling()
 
 if __name__ == "__main__":
@@ -0,0 +1,63 @@
+"""Each record costs at most one Notion read and one write, whichever way its upsert goes."""
+import pytest
+
+from benchmarks import fakes
+from utils import notion_utils
+from utils.confirmation_flow import process_records_for_confirmation
+from utils.lookup_context import LookupContext
+
+DATABASE_ID = "db"
+
+
+@pytest.fixture
+def notion():
+    fake = fakes.install(openai_latency=0, notion_latency=0).notion
+    fake.seed(20)
+    # The catalog's schema read is shared by every record, not made for one; keep it out of the counts.
+    notion_utils.tag_catalog.refresh(DATABASE_ID)
+    return fake
+
+
+def upsert(data: dict, lookup: LookupContext) -> str:
+    notion_utils.check_for_similar_names(DATABASE_ID, data, lookup)
+    return notion_utils.upsert_to_notion(DATABASE_ID, data, lookup=lookup)
+
+
+def assert_within_budget(lookup: LookupContext) -> None:
+    assert lookup.reads <= 1 and lookup.writes <= 1, dict(lookup.calls)
+
+
+def test_create(notion):
+    lookup = LookupContext()
+    assert upsert({"Name": "Jane Newcomer", "Tags": ["VC"]}, lookup).startswith("Created")
+    assert lookup.writes == 1
+    assert_within_budget(lookup)
+
+
+def test_update(notion):
+    name = next(iter(notion.pages_by_id.values()))["properties"]["Name"]["title"][0]["plain_text"]
+    lookup = LookupContext()
+    assert upsert({"Name": name, "Company/Org": "Acme"}, lookup).startswith("Found existing entry")
+    assert lookup.writes == 1
+    assert_within_budget(lookup)
+
+
+def test_confirmed_suggestion(notion):
+    page_id = next(iter(notion.pages_by_id))
+    lookup = LookupContext.for_page(page_id)
+    notion_utils.upsert_to_notion(DATABASE_ID, {"Name": "Jane Doe", "Company/Org": "Acme"}, lookup=lookup)
+    assert lookup.reads == 0 and lookup.writes == 1, dict(lookup.calls)
+
+
+def test_skipped_write(notion):
+    upsert({"Name": "Jane Repeat", "Company/Org": "Acme"}, LookupContext())
+    lookup = LookupContext()
+    assert "nothing to update" in upsert({"Name": "Jane Repeat", "Company/Org": "Acme"}, lookup)
+    assert lookup.writes == 0
+    assert_within_budget(lookup)
+
+
+def test_record_without_name(notion):
+    # The strict response format sends "Name": null when a message names nobody, e.g. "tags: VC".
+    messages, pending = process_records_for_confirmation(DATABASE_ID, [{"Name": None, "Tags": ["VC"]}])
+    assert messages == ["Skipped (unknown): No valid name found"] and pending == []
@@ -1,68 +1,271 @@
-import json, re, logging
-from openai import OpenAI
-from schema import SCHEMA
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
-
-def build_ai_prompt(text: str) -> str:
-    fields = "\n".join([f"- {col} ({spec['type']})" for col, spec in SCHEMA.items()])
-    return f"""
-    You are a CRM assistant. Extract customer info from the text below.
-
-    Required fields:
-    {fields}
-
-    Special rules:
-    - If a field is not mentioned, return null.
-    - For "One-liner": Actively look for a brief description, summary, or key point about the person. 
-      This could be an event, why they're relevant, or a brief note about them.
-      Only include if there's meaningful content - don't make up generic descriptions.
-    - For emails (text or pictures): Only extract the SENDER as a customer, ignore recipients.
-      Focus on the person who sent the email, not who received it.
-    - Tags are STRICTLY opt-in. Only populate "Tags" if the text explicitly requests a tag
-      (e.g., lines like "Tag name as X", "tags: X, Y", or "please add tag Foo"). Do not infer tags.
-    - When tags are requested, first try to match them to these predefined options:
-      {", ".join(SCHEMA["Tags"]["options"])}
-    - If there's a good match (exact or very close), use the predefined option.
-    - If no good match exists, create a new tag with the exact text requested.
-    - Accept a single tag or multiple tags. Output Tags as an array of strings.
-
-    Respond ONLY with valid JSON.
-
-    Text: {text}
+import json, logging, hashlib, time
+from typing import AsyncIterator, Iterator
+from . import clients
+from .json_stream import JsonArrayStream
+from .parse_cache import ParseCache, cache_key
+from . import metrics
+from .schema_compiler import compiled_schema
+from . import rule_extractor
+
+# Shared, lazily built clients: the openai SDK is imported on the first completion.
+openai_client = clients.lazy("openai")
+async_openai_client = clients.lazy("async_openai")
+parse_cache = ParseCache()
+
+MODEL = "gpt-4o-mini"
+
+def build_messages(text: str) -> list[dict]:
+    """The static instructions go first, as the system message, so every request shares that prefix."""
+    return [
+        {"role": "system", "content": compiled_schema.prompt_prefix},
+        {"role": "user", "content": f"Text: {text}"},
+    ]
+
+def build_batch_messages(texts: list[str]) -> list[dict]:
+    """Same prefix as `build_messages`; the reply must say which message each record came from."""
+    numbered = "\n\n".join(f"[{i}]\n{text}" for i, text in enumerate(texts))
+    return [
+        {"role": "system", "content": compiled_schema.prompt_prefix},
+        {"role": "user", "content": (
+            f"You will receive {len(texts)} independent messages, each starting with its index in brackets.\n"
+            "Apply the rules to each message separately; never mix people across messages.\n"
+            "Return exactly one results entry per message, in order, with the message's index.\n\n"
+            f"Messages:\n{numbered}"
+        )},
+    ]
+
+def _completion_request(text: str) -> dict:
+    return {
+        "model": MODEL,
+        "messages": build_messages(text),
+        "temperature": 0,
+        "response_format": compiled_schema.response_format,
+    }
+
+def prompt_version() -> str:
+    """Fingerprint of everything besides the input that shapes a parse: schema, prompt and request options."""
+    template = json.dumps([compiled_schema.fingerprint, _completion_request("{text}")], sort_keys=True)
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()[:16]
+
+def _cache_key(text: str) -> str:
+    return cache_key(text, MODEL, prompt_version())
+
+def _parse_completion(raw: str | None) -> tuple[list[dict], bool]:
     """
+    Returns (records, ok). The response format makes the reply valid JSON; only a refusal or a
+    truncated reply fails, and then the raw output is kept in Notes and ok is False.
+    """
+    try:
+        records = json.loads(raw)["records"]
+        return [r for r in records if isinstance(r, dict)], True
+    except Exception as e:
+        logging.error(f"JSON parse error: {e}, raw response: {raw}")
+        return [compiled_schema.empty_record() | {"Notes": (raw or "").strip()}], False
+
+def extract_locally(text: str) -> list[dict] | None:
+    """Records for a message the rules fully account for (see `utils/rule_extractor.py`); None if it needs the LLM."""
+    local = rule_extractor.extract(text)
+    return _served_locally(local) if local.confident else None
+
+def _served_locally(local: rule_extractor.LocalExtraction) -> list[dict]:
+    metrics.inc("crm_extractions_total", source="local")
+    return local.records()
+
+def _with_rules(local: rule_extractor.LocalExtraction, records: list[dict]) -> list[dict]:
+    metrics.inc("crm_extractions_total", source="llm+rules" if local.fields else "llm")
+    return local.merge_into(records)
 
 def parse_with_ai(text: str) -> dict | list[dict]:
-    prompt = build_ai_prompt(text) + "\nIf multiple people are mentioned, return a JSON array of objects."
-    resp = openai_client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0
-    )
+    local = rule_extractor.extract(text)
+    if local.confident:
+        return _served_locally(local)
+    return _with_rules(local, _parse_with_llm(text))
 
-    raw = resp.choices[0].message.content.strip()
+def _parse_with_llm(text: str) -> list[dict]:
+    key = _cache_key(text)
+    cached = parse_cache.get(key)
+    if cached is not None:
+        return cached
+    with metrics.stage("completion"):
+        resp = openai_client.chat.completions.create(**_completion_request(text))
+    metrics.record_openai_usage(resp, "extract")
+    records, ok = _parse_completion(resp.choices[0].message.content)
+    if ok:
+        parse_cache.put(key, records)
+    return records
 
-    if raw.startswith("```"):
-        raw = re.sub(r"^```(?:json)?", "", raw, flags=re.MULTILINE).strip()
-        raw = re.sub(r"```$", "", raw).strip()
+class _StreamedExtraction:
+    """
+    What `stream_parse_with_ai` and its async twin share. `known` holds the records when the
+    rules or the parse cache already answer the message. Otherwise `feed` takes completion chunks
+    and returns each record as soon as its JSON is complete, merged with the rule fields, and
+    `finish` returns what is left once the stream ends and caches the whole reply.
+    """
 
-    try:
-        data = json.loads(raw)
-        # ensure consistent output: always list of dicts
-        if isinstance(data, dict):
-            return [data]
-        elif isinstance(data, list):
-            return data
+    def __init__(self, text: str):
+        self.text = text
+        self.local = rule_extractor.extract(text)
+        self.key = _cache_key(text)
+        self.known: list[dict] | None = None
+        if self.local.confident:
+            self.known = _served_locally(self.local)
         else:
-            raise ValueError("Unexpected JSON format")
+            cached = parse_cache.get(self.key)
+            if cached is not None:
+                self.known = _with_rules(self.local, cached)
+        self.started = time.perf_counter()
+        self._parser = JsonArrayStream()
+        self._raw: list[str] = []
+        self._usage = None
+        self._held: dict | None = None
+        self._emitted = 0
+
+    def request(self) -> dict:
+        return {**_completion_request(self.text), "stream": True, "stream_options": {"include_usage": True}}
+
+    def feed(self, chunk) -> list[dict]:
+        if getattr(chunk, "usage", None) is not None:
+            self._usage = chunk
+        content = "".join(choice.delta.content or "" for choice in chunk.choices or [] if choice.delta)
+        if not content:
+            return []
+        self._raw.append(content)
+        ready = []
+        for record in self._parser.feed(content):
+            if not self._emitted and self._held is None and self.local.fields:
+                # The rule fields go to the only record if none has their name; wait to see if another follows.
+                self._held = record
+                continue
+            if self._held is not None:
+                ready.append(self.local.merge_record(self._held, alone=False))
+                self._held = None
+            ready.append(self.local.merge_record(record, alone=False))
+        return self._emit(ready)
+
+    def finish(self) -> list[dict]:
+        metrics.observe_stage("completion", time.perf_counter() - self.started)
+        metrics.record_openai_usage(self._usage, "extract")
+        metrics.inc("crm_extractions_total", source="llm+rules" if self.local.fields else "llm")
+        records, ok = _parse_completion("".join(self._raw))
+        if ok:
+            parse_cache.put(self.key, records)
+        if self._held is not None:
+            return self._emit([self.local.merge_record(self._held, alone=True)])
+        if not ok and not self._emitted:
+            # Nothing usable came through: the raw reply goes to Notes, as in `parse_with_ai`.
+            return self._emit(self.local.merge_into(records))
+        return []
+
+    def _emit(self, records: list[dict]) -> list[dict]:
+        if records and not self._emitted:
+            metrics.observe_stage("first_record", time.perf_counter() - self.started)
+        self._emitted += len(records)
+        return records
+
+def stream_parse_with_ai(text: str) -> Iterator[dict]:
+    """`parse_with_ai` over a streamed completion: yields each record as soon as it is complete."""
+    extraction = _StreamedExtraction(text)
+    if extraction.known is not None:
+        yield from extraction.known
+        return
+    for chunk in openai_client.chat.completions.create(**extraction.request()):
+        yield from extraction.feed(chunk)
+    yield from extraction.finish()
+
+async def stream_parse_with_ai_async(text: str) -> AsyncIterator[dict]:
+    """Async `stream_parse_with_ai`."""
+    extraction = _StreamedExtraction(text)
+    if extraction.known is not None:
+        for record in extraction.known:
+            yield record
+        return
+    async for chunk in await async_openai_client.chat.completions.create(**extraction.request()):
+        for record in extraction.feed(chunk):
+            yield record
+    for record in extraction.finish():
+        yield record
 
+def _batch_completion_request(texts: list[str]) -> dict:
+    return {
+        "model": MODEL,
+        "messages": build_batch_messages(texts),
+        "temperature": 0,
+        "response_format": compiled_schema.batch_response_format,
+    }
+
+def _split_batch_completion(raw: str, count: int) -> list[list[dict] | None]:
+    """Records per message from a batched reply; None where the reply has no usable entry for it."""
+    per_message: list[list[dict] | None] = [None] * count
+    try:
+        results = json.loads(raw)["results"]
     except Exception as e:
-        logging.error(f"JSON parse error: {e}, raw response: {raw}")
-        return [{col: None for col in SCHEMA.keys()} | {"Notes": raw}]
+        logging.error(f"Batch JSON parse error: {e}, raw response: {raw}")
+        return per_message
+    for entry in results if isinstance(results, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        index, records = entry.get("index"), entry.get("records")
+        if isinstance(records, dict):
+            records = [records]
+        if isinstance(index, int) and 0 <= index < count and isinstance(records, list):
+            per_message[index] = [r for r in records if isinstance(r, dict)]
+    return per_message
+
+def parse_batch_with_ai(texts: list[str]) -> list[list[dict]]:
+    """
+    Extract several independent messages with one completion, sharing the prompt preamble.
+    Messages the rules fully account for and cached messages are skipped; any message the batched reply doesn't cover falls back to
+    its own `parse_with_ai` call. Returns one record list per input, in order.
+    """
+    results: list[list[dict] | None] = [None] * len(texts)
+    local = [rule_extractor.extract(text) for text in texts]
+    todo = []
+    for i, text in enumerate(texts):
+        if local[i].confident:
+            results[i] = _served_locally(local[i])
+            continue
+        results[i] = parse_cache.get(_cache_key(text))
+        if results[i] is None:
+            todo.append(i)
+
+    if len(todo) == 1:
+        results[todo[0]] = _parse_with_llm(texts[todo[0]])
+    elif todo:
+        with metrics.stage("batch_completion"):
+            resp = openai_client.chat.completions.create(**_batch_completion_request([texts[i] for i in todo]))
+        metrics.record_openai_usage(resp, "extract_batch")
+        metrics.inc("crm_batched_messages_total", len(todo))
+        split = _split_batch_completion(resp.choices[0].message.content, len(todo))
+        for i, records in zip(todo, split):
+            if records is None:
+                logging.warning(f"Batched extraction missed message {i}; retrying it on its own")
+                metrics.inc("crm_batch_fallbacks_total")
+                records = _parse_with_llm(texts[i])
+            else:
+                parse_cache.put(_cache_key(texts[i]), records)
+            results[i] = records
+    return [records if local[i].confident else _with_rules(local[i], records) for i, records in enumerate(results)]
+
+async def transcribe_audio_async(audio: bytes, filename: str = "voice.ogg") -> str:
+    with metrics.stage("transcribe"):
+        transcript = await async_openai_client.audio.transcriptions.create(
+            model="gpt-4o-mini-transcribe", file=(filename, audio)
+        )
+    metrics.record_openai_usage(transcript, "transcribe")
+    return transcript.text
 
+async def describe_image_async(image_url: str) -> str:
+    """Ask the vision model for the CRM fields in an image; the reply is text for the normal pipeline."""
+    messages = [{
+        "role": "user",
+        "content": [
+            {"type": "text", "text": "Extract CRM fields in JSON based on schema. If multiple people are mentioned, return a JSON array of objects."},
+            {"type": "image_url", "image_url": {"url": image_url}}
+        ]
+    }]
+    with metrics.stage("vision"):
+        resp = await async_openai_client.chat.completions.create(
+            model="gpt-4o-mini", messages=messages, temperature=0
+        )
+    metrics.record_openai_usage(resp, "vision")
+    return resp.choices[0].message.content.strip()
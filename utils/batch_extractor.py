@@ -0,0 +1,95 @@
+import asyncio
+import contextvars
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .ai_utils import extract_locally, parse_batch_with_ai
+
+EXTRACT_BATCH_SIZE = int(os.getenv("EXTRACT_BATCH_SIZE", "8"))
+# How long the first message of a batch waits for company; 0 sends every message on its own.
+EXTRACT_BATCH_MAX_WAIT_MS = float(os.getenv("EXTRACT_BATCH_MAX_WAIT_MS", "50"))
+EXTRACT_BATCH_WORKERS = int(os.getenv("EXTRACT_BATCH_WORKERS", "4"))
+
+
+class BatchExtractor:
+    """
+    Micro-batches `parse_with_ai` work from concurrent callers.
+
+    Messages that arrive within `max_wait` seconds of the first one (up to `batch_size`) are
+    sent as one indexed completion via `parse_batch_with_ai`, and each caller gets back just
+    its own records. A batch of one is an ordinary single call, so a quiet bot only pays the
+    wait. Batches run on a small pool, so a slow completion doesn't hold up the next window.
+    """
+
+    def __init__(self, batch_size: int = EXTRACT_BATCH_SIZE, max_wait: float = EXTRACT_BATCH_MAX_WAIT_MS / 1000,
+                 workers: int = EXTRACT_BATCH_WORKERS):
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait
+        self._queue: queue.Queue[tuple[str, Future, contextvars.Context]] = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="extract")
+        self._collector: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def submit(self, text: str) -> Future:
+        future: Future = Future()
+        # Messages the rules fully account for skip the batching window as well as the LLM.
+        records = extract_locally(text)
+        if records is not None:
+            future.set_result(records)
+            return future
+        self._queue.put((text, future, contextvars.copy_context()))
+        self._ensure_collector()
+        return future
+
+    def extract(self, text: str) -> list[dict]:
+        return self.submit(text).result()
+
+    async def extract_async(self, text: str) -> list[dict]:
+        return await asyncio.wrap_future(self.submit(text))
+
+    def extract_many(self, texts: list[str]) -> list[list[dict]]:
+        """For bulk jobs that already hold all their texts: batch them directly, without a window."""
+        chunks = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results: list[list[dict]] = []
+        for chunk_results in self._pool.map(parse_batch_with_ai, chunks):
+            results.extend(chunk_results)
+        return results
+
+    def _ensure_collector(self) -> None:
+        with self._lock:
+            if self._collector is None:
+                self._collector = threading.Thread(target=self._collect, name="extract-batcher", daemon=True)
+                self._collector.start()
+
+    def _collect(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._pool.submit(self._run, batch)
+
+    def _run(self, batch: list[tuple[str, Future, contextvars.Context]]) -> None:
+        try:
+            # Batch-level metrics (completion time, tokens) go to the first message's trace.
+            results = batch[0][2].run(parse_batch_with_ai, [text for text, _, _ in batch])
+        except Exception as e:
+            logging.error(f"Batched extraction failed: {e}")
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        for (_, future, _), records in zip(batch, results):
+            future.set_result(records)
+
+
+batch_extractor = BatchExtractor()
@@ -0,0 +1,107 @@
+import importlib.util
+import logging
+import os
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+NOTION_TOKEN = os.getenv("NOTION_TOKEN")
+# One keep-alive pool per upstream; these bound it. The SDK default expiry (5s) would
+# reconnect, and redo the TLS handshake, for nearly every message of a quiet bot.
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "90"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+NOTION_TIMEOUT = float(os.getenv("NOTION_TIMEOUT", "60"))
+# HTTP/2 multiplexes concurrent requests over one TLS connection; needs the optional `h2` package.
+HTTP2 = importlib.util.find_spec("h2") is not None
+
+
+def _pool_options(limits_type, timeout_type, timeout: float) -> dict:
+    # The openai SDK may ship its own httpx build, so the option types come from the caller.
+    return {
+        "limits": limits_type(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                              keepalive_expiry=HTTP_KEEPALIVE_EXPIRY),
+        "timeout": timeout_type(timeout, connect=10.0),
+        "http2": HTTP2,
+    }
+
+
+def _openai_pool_options() -> dict:
+    import openai
+    return _pool_options(type(openai.DEFAULT_CONNECTION_LIMITS), openai.Timeout, OPENAI_TIMEOUT)
+
+
+def _make_openai():
+    from openai import DefaultHttpxClient, OpenAI
+    return OpenAI(api_key=OPENAI_API_KEY, http_client=DefaultHttpxClient(**_openai_pool_options()))
+
+
+def _make_async_openai():
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+    return AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=DefaultAsyncHttpxClient(**_openai_pool_options()))
+
+
+def _make_notion():
+    import httpx
+    from notion_client import Client
+    pool = httpx.Client(**_pool_options(httpx.Limits, httpx.Timeout, NOTION_TIMEOUT))
+    return Client(auth=NOTION_TOKEN, client=pool, timeout_ms=int(NOTION_TIMEOUT * 1000))
+
+
+class ClientRegistry:
+    """
+    Process-wide API clients, built on first use.
+
+    Each client is created once, with its SDK imported only then, and owns one keep-alive
+    connection pool that every caller in the process shares. `set` replaces a client, e.g.
+    with a stand-in from `benchmarks.fakes`.
+    """
+
+    def __init__(self):
+        self._factories = {"openai": _make_openai, "async_openai": _make_async_openai, "notion": _make_notion}
+        self._clients: dict = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str):
+        client = self._clients.get(name)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(name)
+                if client is None:
+                    client = self._clients[name] = self._factories[name]()
+                    logging.debug(f"Created {name} client")
+        return client
+
+    def set(self, name: str, client) -> None:
+        with self._lock:
+            self._clients[name] = client
+
+    def lazy(self, name: str) -> "LazyClient":
+        return LazyClient(self, name)
+
+
+class LazyClient:
+    """Module-level stand-in that resolves to the registry's client on first attribute access."""
+
+    def __init__(self, registry: ClientRegistry, name: str):
+        self._registry = registry
+        self._name = name
+
+    def __getattr__(self, attr: str):
+        return getattr(self._registry.get(self._name), attr)
+
+
+registry = ClientRegistry()
+
+
+def lazy(name: str) -> LazyClient:
+    return registry.lazy(name)
+
+
+def openai_error(name: str) -> type:
+    """An `openai` exception class, for `except` clauses that shouldn't import the SDK up front."""
+    import openai
+    return getattr(openai, name)
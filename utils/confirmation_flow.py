@@ -1,35 +1,121 @@
+import asyncio
 import re
-from typing import List, Tuple, Dict, Any
-from .notion_utils import upsert_to_notion, check_for_similar_names
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import AsyncIterator, Awaitable, Callable, Iterable, List, Tuple, Dict, Any
+from .notion_utils import (
+    submit_upsert,
+    check_for_similar_names,
+    run_on_notion_executor,
+)
+from .lookup_context import LookupContext
+from .name_matcher import NameMatcher
+from .pending_store import make_pending_store
+from .batch_extractor import batch_extractor
+from . import metrics
 
+# Shared by the Slack and Telegram bots; see PENDING_STORE for the backend.
+pending_store = make_pending_store()
 
-def process_records_for_confirmation(database_id: str, records: List[dict]) -> Tuple[List[str], List[Dict[str, Any]]]:
+
+class RecordPipeline:
+    """
+    Similarity check and queued write for records handed over one at a time, in order; the
+    per-record part of `process_records_for_confirmation`, usable while records still arrive.
+    """
+
+    def __init__(self, database_id: str, idempotency_key: str | None = None):
+        self.database_id = database_id
+        self.idempotency_key = idempotency_key
+        self.count = 0
+        self.writes: List[Future] = []
+        self.pending: List[Dict[str, Any]] = []
+        # Names this batch has queued writes for. A record that matches one waits for that write
+        # to land first, so the check sees it exactly as if the records were processed one by one.
+        self.queued_names = NameMatcher()
+
+    def add(self, data: dict) -> None:
+        i = self.count
+        self.count += 1
+        for key, _, _ in self.queued_names.search(str(data.get("Name") or "")):
+            self.writes[int(key)].result()
+        lookup = LookupContext()
+        status, payload = check_for_similar_names(self.database_id, data, lookup)
+        if status == "suggest" and payload:
+            self.pending.append(_pending_entry(data, payload[0]))
+        else:
+            # exact_match / no_match (or an empty suggestion): write without waiting,
+            # so a burst of records is paced by the write scheduler, not by round trips.
+            self.queued_names.add(str(len(self.writes)), str(data.get("Name") or ""))
+            key = f"{self.idempotency_key}:{i}" if self.idempotency_key else None
+            self.writes.append(submit_upsert(self.database_id, data, lookup=lookup, idempotency_key=key))
+
+    def landed(self) -> List[str]:
+        """Result messages of the writes that have finished so far, in record order."""
+        return [w.result() for w in self.writes if w.done()]
+
+    def results(self) -> Tuple[List[str], List[Dict[str, Any]]]:
+        return [w.result() for w in self.writes], self.pending
+
+
+def process_records_for_confirmation(database_id: str, records: List[dict],
+                                     idempotency_key: str | None = None) -> Tuple[List[str], List[Dict[str, Any]]]:
     """Given parsed records, determine which can proceed and which need confirmation.
 
     Returns (final_messages, pending_confirmations)
-    pending_confirmations entries contain: { 'data': dict, 'suggested_name': str }
+    pending_confirmations entries contain: { 'data': dict, 'suggested_name': str, 'suggested_page_id': str }
+    Each record shares one LookupContext between the check and the upsert, so it costs
+    at most one Notion read (an index sync) and one write. Writes go through the rate-limited
+    write scheduler and are collected at the end, one message per record.
+    With `idempotency_key` (e.g. a job id), record i writes under "<key>:<i>", so running the
+    same records again updates the pages the first run created.
     """
-    msgs: List[str] = []
-    pending: List[Dict[str, Any]] = []
+    pipeline = RecordPipeline(database_id, idempotency_key)
+    for data in records:
+        pipeline.add(data)
+    return pipeline.results()
+
+
+def stream_records_for_confirmation(database_id: str, records: Iterable[dict],
+                                    on_progress: Callable[[List[str]], None],
+                                    idempotency_key: str | None = None) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """
+    `process_records_for_confirmation` for records that are still being extracted (e.g. from
+    `stream_parse_with_ai`): each is checked and queued as it arrives, and `on_progress` gets the
+    messages of the writes landed so far (in record order) whenever more have landed.
+    """
+    pipeline = RecordPipeline(database_id, idempotency_key)
+    shown = 0
+
+    def report() -> None:
+        nonlocal shown
+        msgs = pipeline.landed()
+        if len(msgs) > shown:
+            shown = len(msgs)
+            on_progress(msgs)
 
     for data in records:
-        status, payload = check_for_similar_names(database_id, data)
-        if status in ("exact_match", "no_match"):
-            msg = upsert_to_notion(database_id, data)
-            msgs.append(msg)
-        elif status == "suggest" and payload:
-            suggestion = payload[0]
-            suggested_name = suggestion.get("name")
-            pending.append({
-                "data": data,
-                "suggested_name": suggested_name
-            })
-        else:
-            # Fallback: create new
-            msg = upsert_to_notion(database_id, data)
-            msgs.append(msg)
+        pipeline.add(data)
+        report()
+    # Writes don't land in order, so wait for whichever is next rather than for each in turn.
+    not_done = {w for w in pipeline.writes if not w.done()}
+    while not_done:
+        _, not_done = wait(not_done, return_when=FIRST_COMPLETED)
+        report()
+    return pipeline.results()
+
 
-    return msgs, pending
+def _pending_entry(data: dict, suggestion: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "data": data,
+        "suggested_name": suggestion.get("name"),
+        "suggested_page_id": (suggestion.get("record") or {}).get("id"),
+    }
+
+
+def _confirmed_lookup(confirmation: Dict[str, Any]) -> LookupContext | None:
+    """Saying "yes" to a suggestion targets that exact page, so the upsert needs no lookup."""
+    page_id = confirmation.get("suggested_page_id")
+    return LookupContext.for_page(page_id) if page_id else None
 
 
 def render_confirmation_text(pending_confirmations: List[Dict[str, Any]]) -> str:
@@ -46,15 +132,8 @@ def render_confirmation_text(pending_confirmations: List[Dict[str, Any]]) -> str
     return "\n\n".join(base_lines) + tail
 
 
-def handle_confirmation_reply(database_id: str, user_response: str, pending_confirmations: List[Dict[str, Any]]) -> List[str]:
-    """Apply user's yes/no responses to pending confirmations and perform upserts.
-
-    Supports formats:
-      - "1 yes, 2 no"
-      - "yes, no" (in order)
-    """
-    msgs: List[str] = []
-
+def parse_decisions(user_response: str) -> Dict[int, str]:
+    """Map 0-based confirmation index -> yes/no decision from a free-form reply."""
     # Normalize and split by comma/newline
     raw_parts = [p.strip().lower() for p in re.split(r",|\n", user_response) if p.strip()]
     decisions: Dict[int, str] = {}
@@ -67,21 +146,95 @@ def handle_confirmation_reply(database_id: str, user_response: str, pending_conf
         else:
             if part in ("yes", "y", "no", "n"):
                 decisions[idx] = part
+    return decisions
+
+
+def handle_confirmation_reply(database_id: str, user_response: str, pending_confirmations: List[Dict[str, Any]],
+                              idempotency_key: str | None = None) -> List[str]:
+    """Apply user's yes/no responses to pending confirmations and perform upserts.
+
+    Supports formats:
+      - "1 yes, 2 no"
+      - "yes, no" (in order)
+    """
+    results: List[Future | str] = []
+    decisions = parse_decisions(user_response)
 
     for i, confirmation in enumerate(pending_confirmations):
         decision = decisions.get(i)
+        key = f"{idempotency_key}:{i}" if idempotency_key else None
         if decision in ("yes", "y"):
             suggested_name = confirmation.get("suggested_name")
             if suggested_name:
                 confirmation["data"]["Name"] = suggested_name
-            msg = upsert_to_notion(database_id, confirmation["data"])
-            msgs.append(msg)
+            results.append(submit_upsert(database_id, confirmation["data"], lookup=_confirmed_lookup(confirmation),
+                                         idempotency_key=key))
         elif decision in ("no", "n"):
-            msg = upsert_to_notion(database_id, confirmation["data"], force_create=True)
-            msgs.append(msg)
+            results.append(submit_upsert(database_id, confirmation["data"], force_create=True, idempotency_key=key))
         else:
-            msgs.append("No valid decision provided (expected yes/no).")
+            results.append("No valid decision provided (expected yes/no).")
 
-    return msgs
+    return [r.result() if isinstance(r, Future) else r for r in results]
 
 
+async def process_records_for_confirmation_async(database_id: str, records: List[dict],
+                                                idempotency_key: str | None = None) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """Async variant of `process_records_for_confirmation`; Notion work runs off the event loop."""
+    return await run_on_notion_executor(process_records_for_confirmation, database_id, records, idempotency_key)
+
+
+async def handle_confirmation_reply_async(database_id: str, user_response: str, pending_confirmations: List[Dict[str, Any]],
+                                          idempotency_key: str | None = None) -> List[str]:
+    """Async variant of `handle_confirmation_reply`; Notion work runs off the event loop."""
+    return await run_on_notion_executor(handle_confirmation_reply, database_id, user_response, pending_confirmations,
+                                        idempotency_key)
+
+
+async def stream_records_for_confirmation_async(database_id: str, records: AsyncIterator[dict],
+                                                on_progress: Callable[[List[str]], Awaitable[None]],
+                                                idempotency_key: str | None = None) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """Async variant of `stream_records_for_confirmation`; Notion work runs off the event loop."""
+    pipeline = RecordPipeline(database_id, idempotency_key)
+    shown = 0
+
+    async def report() -> None:
+        nonlocal shown
+        msgs = pipeline.landed()
+        if len(msgs) > shown:
+            shown = len(msgs)
+            await on_progress(msgs)
+
+    async for data in records:
+        await run_on_notion_executor(pipeline.add, data)
+        await report()
+    not_done = {asyncio.wrap_future(w) for w in pipeline.writes if not w.done()}
+    while not_done:
+        _, not_done = await asyncio.wait(not_done, return_when=asyncio.FIRST_COMPLETED)
+        await report()
+    return pipeline.results()
+
+
+async def respond_to_text_async(database_id: str, conversation: str, text: str,
+                                idempotency_key: str | None = None) -> str:
+    """
+    The whole pipeline for one message of `conversation`: apply it as the answer to a pending
+    "Did you mean ...?" prompt, or extract and upsert its records. Returns the reply to send.
+    If applying an answer fails, the prompt is put back so a retry sees it again.
+    """
+    pending = pending_store.pop(conversation)
+    if pending is not None:
+        metrics.inc("crm_confirmation_replies_total")
+        try:
+            msgs = await handle_confirmation_reply_async(database_id, text, pending, idempotency_key)
+        except Exception:
+            pending_store.put(conversation, pending)
+            raise
+        return "\n".join(msgs)
+
+    with metrics.stage("extract"):
+        records = await batch_extractor.extract_async(text)
+    msgs, pending = await process_records_for_confirmation_async(database_id, records, idempotency_key)
+    if pending:
+        pending_store.put(conversation, pending)
+        return render_confirmation_text(pending)
+    return "\n".join(msgs)
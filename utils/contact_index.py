@@ -0,0 +1,312 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterator
+from .name_matcher import NameMatcher
+from . import metrics
+
+CONTACT_INDEX_PATH = os.getenv("CONTACT_INDEX_PATH", "contact_index.sqlite3")
+# Seconds between incremental syncs against Notion; lookups in between are served locally.
+CONTACT_INDEX_SYNC_INTERVAL = float(os.getenv("CONTACT_INDEX_SYNC_INTERVAL", "60"))
+# Seconds between full resyncs. Incremental syncs never see pages deleted or archived in Notion;
+# a full resync drops them.
+CONTACT_INDEX_FULL_SYNC_INTERVAL = float(os.getenv("CONTACT_INDEX_FULL_SYNC_INTERVAL", "86400"))
+
+
+def name_key(name: str) -> str:
+    """Normalized form used for exact-name lookups (case and whitespace insensitive)."""
+    return " ".join(str(name).split()).lower()
+
+
+def page_name(page: dict) -> str:
+    """Return the plain-text `Name` title of a Notion page, or "" when it has none."""
+    title = page.get("properties", {}).get("Name", {}).get("title") or []
+    parts = []
+    for chunk in title:
+        text = chunk.get("plain_text")
+        if text is None:
+            text = chunk.get("text", {}).get("content", "")
+        parts.append(text)
+    return "".join(parts).strip()
+
+
+def page_gone(error: Exception) -> bool:
+    """Whether a failed write to a page means it was deleted or archived in Notion."""
+    code = getattr(error, "code", None)
+    return code == "object_not_found" or (code == "validation_error" and "archived" in str(error).lower())
+
+
+class ContactIndex:
+    """
+    Local SQLite mirror of the CRM database, keyed by Notion page id.
+
+    The first lookup for a database runs a paginated full sync; later lookups only pull
+    pages whose `last_edited_time` moved since the previous sync, at most once every
+    `sync_interval` seconds, plus a full resync every `full_sync_interval` seconds so pages
+    removed in Notion drop out. Pages we write ourselves are recorded immediately.
+    Fuzzy lookups use an in-memory trigram `NameMatcher` per database, built on first use.
+
+    Syncs fetch from Notion without holding the lock, so lookups keep being served from the
+    local copy meanwhile; only the first sync of a database makes them wait. A failed sync is
+    retried after `sync_interval`, not on every lookup.
+    """
+
+    def __init__(self, notion, path: str = CONTACT_INDEX_PATH, sync_interval: float = CONTACT_INDEX_SYNC_INTERVAL,
+                 full_sync_interval: float = CONTACT_INDEX_FULL_SYNC_INTERVAL):
+        self.notion = notion
+        self.sync_interval = sync_interval
+        self.full_sync_interval = full_sync_interval
+        self._lock = threading.RLock()
+        self._last_checked: dict[str, float] = {}
+        # database_id -> set while a sync of it is fetching from Notion
+        self._syncing: dict[str, threading.Event] = {}
+        # database_id -> our own writes during that sync (page, or None when forgotten), re-applied after it
+        self._written_during_sync: dict[str, dict[str, dict | None]] = {}
+        self._matchers: dict[str, NameMatcher] = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS contacts (
+                database_id TEXT NOT NULL,
+                page_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                name_key TEXT NOT NULL,
+                last_edited_time TEXT,
+                page_json TEXT NOT NULL,
+                PRIMARY KEY (database_id, page_id)
+            );
+            CREATE INDEX IF NOT EXISTS contacts_name_key ON contacts (database_id, name_key);
+            CREATE TABLE IF NOT EXISTS sync_state (
+                database_id TEXT PRIMARY KEY,
+                cursor TEXT
+            );
+            CREATE TABLE IF NOT EXISTS full_sync_state (
+                database_id TEXT PRIMARY KEY,
+                synced_at REAL NOT NULL
+            );
+            """
+        )
+        self._conn.commit()
+
+    # --- syncing -----------------------------------------------------------------
+
+    def ensure_synced(self, database_id: str, force: bool = False) -> None:
+        """Bring the index up to date if the sync interval elapsed. Errors are logged, not raised."""
+        with self._lock:
+            now = time.monotonic()
+            last = self._last_checked.get(database_id)
+            syncing = self._syncing.get(database_id)
+            if syncing is not None and self._cursor(database_id) is None:
+                # Another lookup is running the first sync: there is no local copy to serve yet.
+                first_sync = syncing
+            elif syncing is not None or not force and last is not None and now - last < self.sync_interval:
+                # Served from the local copy without asking Notion: the index's cache hit.
+                metrics.inc("crm_cache_lookups_total", cache="contact_index", result="hit")
+                return
+            else:
+                first_sync = None
+                # Claimed before fetching, so a failed sync also waits out the interval
+                # instead of being retried by every lookup while Notion is down.
+                self._last_checked[database_id] = now
+                self._begin_sync(database_id)
+                full = self._cursor(database_id) is None or self._full_sync_due(database_id)
+        if first_sync is not None:
+            first_sync.wait()
+            return
+        try:
+            if full:
+                metrics.inc("crm_cache_lookups_total", cache="contact_index", result="full_sync")
+                self.full_sync(database_id)
+            else:
+                metrics.inc("crm_cache_lookups_total", cache="contact_index", result="incremental_sync")
+                self.incremental_sync(database_id)
+        except Exception as e:
+            metrics.inc("crm_contact_index_sync_errors_total")
+            logging.error(f"Contact index sync failed for {database_id}: {e}")
+        finally:
+            self._end_sync(database_id)
+
+    def full_sync(self, database_id: str) -> int:
+        """Replace the local copy of `database_id` with every page currently in Notion."""
+        self._begin_sync(database_id)
+        try:
+            pages = self._query(database_id)
+            with self._lock, self._conn:
+                self._conn.execute("DELETE FROM contacts WHERE database_id = ?", (database_id,))
+                self._matchers.pop(database_id, None)
+                cursor = self._store_pages(database_id, pages)
+                self._set_cursor(database_id, cursor or "")
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO full_sync_state (database_id, synced_at) VALUES (?, ?)",
+                    (database_id, time.time()),
+                )
+                self._replay_writes(database_id)
+        finally:
+            self._end_sync(database_id)
+        logging.info(f"Contact index: full sync of {database_id} loaded {len(pages)} pages")
+        return len(pages)
+
+    def incremental_sync(self, database_id: str) -> int:
+        """Fetch only pages edited since the last sync (Notion rounds edit times to the minute)."""
+        with self._lock:
+            since = self._cursor(database_id)
+        if not since:
+            return self.full_sync(database_id)
+        self._begin_sync(database_id)
+        try:
+            pages = self._query(
+                database_id, filter={"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": since}}
+            )
+            with self._lock, self._conn:
+                cursor = self._store_pages(database_id, pages)
+                if cursor and cursor > since:
+                    self._set_cursor(database_id, cursor)
+                self._replay_writes(database_id)
+        finally:
+            self._end_sync(database_id)
+        return len(pages)
+
+    def record_page(self, database_id: str, page: dict) -> None:
+        """Record a page returned by one of our own `pages.create` / `pages.update` calls."""
+        if not page or not page.get("id"):
+            return
+        with self._lock, self._conn:
+            self._store_pages(database_id, [page])
+            if database_id in self._written_during_sync:
+                self._written_during_sync[database_id][page["id"]] = page
+
+    def forget(self, database_id: str, page_id: str) -> None:
+        """Drop a page a write found deleted or archived, ahead of the next full resync."""
+        with self._lock, self._conn:
+            self._delete_page(database_id, page_id)
+            if database_id in self._written_during_sync:
+                self._written_during_sync[database_id][page_id] = None
+
+    # --- lookups -----------------------------------------------------------------
+
+    def find_exact(self, database_id: str, name: str) -> list[dict]:
+        """Pages whose `Name` matches `name` ignoring case and extra whitespace."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT page_json FROM contacts WHERE database_id = ? AND name_key = ? ORDER BY last_edited_time DESC",
+                (database_id, name_key(name)),
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def similar(self, database_id: str, name: str, threshold: float) -> list[dict]:
+        """Fuzzy matches as `{"record", "name", "similarity"}` dicts, best first."""
+        with self._lock:
+            matches = self._matcher(database_id).search(name, threshold)
+        return [
+            {"record": self.get(database_id, page_id), "name": existing_name, "similarity": score}
+            for page_id, existing_name, score in matches
+        ]
+
+    def names(self, database_id: str) -> list[tuple[str, str]]:
+        """All (page_id, name) pairs for `database_id`."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT page_id, name FROM contacts WHERE database_id = ?", (database_id,)
+            ).fetchall()
+
+    def pages(self, database_id: str) -> Iterator[dict]:
+        """Every indexed page of `database_id`, read in batches so the whole database is never in memory at once."""
+        after = ""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT page_id, page_json FROM contacts WHERE database_id = ? AND page_id > ?"
+                    " ORDER BY page_id LIMIT 1000",
+                    (database_id, after),
+                ).fetchall()
+            if not rows:
+                return
+            for _, page_json in rows:
+                yield json.loads(page_json)
+            after = rows[-1][0]
+
+    def get(self, database_id: str, page_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT page_json FROM contacts WHERE database_id = ? AND page_id = ?", (database_id, page_id)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # --- internals ---------------------------------------------------------------
+
+    def _matcher(self, database_id: str) -> NameMatcher:
+        matcher = self._matchers.get(database_id)
+        if matcher is None:
+            matcher = NameMatcher()
+            for page_id, name in self.names(database_id):
+                matcher.add(page_id, name)
+            self._matchers[database_id] = matcher
+        return matcher
+
+    def _query(self, database_id: str, **kwargs) -> list[dict]:
+        """Every page of the database query; runs without the lock, it can take many requests."""
+        from notion_client.helpers import iterate_paginated_api
+        return list(iterate_paginated_api(self.notion.databases.query, database_id=database_id, page_size=100, **kwargs))
+
+    def _begin_sync(self, database_id: str) -> None:
+        with self._lock:
+            self._syncing.setdefault(database_id, threading.Event())
+            self._written_during_sync.setdefault(database_id, {})
+
+    def _replay_writes(self, database_id: str) -> None:
+        """Re-apply our own writes made while the sync was fetching; the fetched copies may predate them."""
+        for page_id, page in self._written_during_sync.get(database_id, {}).items():
+            if page is None:
+                self._delete_page(database_id, page_id)
+            else:
+                self._store_pages(database_id, [page])
+
+    def _end_sync(self, database_id: str) -> None:
+        with self._lock:
+            self._written_during_sync.pop(database_id, None)
+            syncing = self._syncing.pop(database_id, None)
+        if syncing is not None:
+            syncing.set()
+
+    def _delete_page(self, database_id: str, page_id: str) -> None:
+        self._conn.execute("DELETE FROM contacts WHERE database_id = ? AND page_id = ?", (database_id, page_id))
+        matcher = self._matchers.get(database_id)
+        if matcher is not None:
+            matcher.remove(page_id)
+
+    def _store_pages(self, database_id: str, pages: list[dict]) -> str | None:
+        newest = None
+        matcher = self._matchers.get(database_id)
+        for page in pages:
+            if page.get("archived") or page.get("in_trash"):
+                self._delete_page(database_id, page["id"])
+                continue
+            name = page_name(page)
+            if matcher is not None:
+                matcher.add(page["id"], name)
+            edited = page.get("last_edited_time")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO contacts (database_id, page_id, name, name_key, last_edited_time, page_json) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (database_id, page["id"], name, name_key(name), edited, json.dumps(page)),
+            )
+            if edited and (newest is None or edited > newest):
+                newest = edited
+        return newest
+
+    def _cursor(self, database_id: str) -> str | None:
+        row = self._conn.execute("SELECT cursor FROM sync_state WHERE database_id = ?", (database_id,)).fetchone()
+        return row[0] if row else None
+
+    def _full_sync_due(self, database_id: str) -> bool:
+        row = self._conn.execute("SELECT synced_at FROM full_sync_state WHERE database_id = ?", (database_id,)).fetchone()
+        return row is None or time.time() - row[0] >= self.full_sync_interval
+
+    def _set_cursor(self, database_id: str, cursor: str) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO sync_state (database_id, cursor) VALUES (?, ?)", (database_id, cursor)
+        )
@@ -0,0 +1,292 @@
+import itertools
+import os
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from urllib.parse import unquote
+
+from .name_matcher import normalize_name
+from .rule_extractor import LINKEDIN_RE
+from .schema_compiler import compiled_schema
+
+# Pairs scoring at least this are linked into one cluster.
+DEDUPE_THRESHOLD = float(os.getenv("DEDUPE_THRESHOLD", "0.85"))
+# Blocks larger than this (e.g. a very common name) are skipped rather than compared pairwise.
+DEDUPE_MAX_BLOCK = int(os.getenv("DEDUPE_MAX_BLOCK", "200"))
+
+# Shared team mailboxes: the same address on two pages says nothing about them being one person.
+ROLE_MAILBOXES = frozenset({"info", "sales", "hello", "contact", "admin", "support", "team", "office", "press", "hr",
+                            "jobs", "careers", "billing", "partners", "invest", "ir", "noreply", "no-reply", "mail"})
+COMPANY_SUFFIXES = frozenset({"inc", "llc", "ltd", "limited", "co", "corp", "corporation", "gmbh", "plc", "sa", "ag", "bv"})
+_SOUNDEX = {**dict.fromkeys("BFPV", "1"), **dict.fromkeys("CGJKQSXZ", "2"), **dict.fromkeys("DT", "3"), "L": "4",
+            **dict.fromkeys("MN", "5"), "R": "6"}
+
+
+def ascii_fold(text: str) -> str:
+    return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode()
+
+
+def soundex(word: str) -> str:
+    letters = "".join(c for c in ascii_fold(word).upper() if "A" <= c <= "Z")
+    if not letters:
+        return ""
+    code, last = letters[0], _SOUNDEX.get(letters[0], "")
+    for c in letters[1:]:
+        digit = _SOUNDEX.get(c, "")
+        if digit and digit != last:
+            code += digit
+        if c not in "HW":
+            last = digit
+    return (code + "000")[:4]
+
+
+def normalize_email(email: str | None) -> str | None:
+    """Lower-cased, without a "+tag"; Gmail addresses also without dots."""
+    if not email or "@" not in email:
+        return None
+    local, domain = email.strip().lower().rsplit("@", 1)
+    local = local.split("+", 1)[0]
+    if domain in ("gmail.com", "googlemail.com"):
+        local, domain = local.replace(".", ""), "gmail.com"
+    return f"{local}@{domain}"
+
+
+def personal_email(email: str | None) -> str | None:
+    """`normalize_email`, or None for a team mailbox such as info@ or sales@."""
+    email = normalize_email(email)
+    return None if email is None or email.split("@", 1)[0] in ROLE_MAILBOXES else email
+
+
+def linkedin_handle(url: str | None) -> str | None:
+    match = LINKEDIN_RE.search(url or "")
+    return unquote(match.group(1)).lower().rstrip("/") if match else None
+
+
+def normalize_company(company: str | None) -> str | None:
+    words = [w for w in re.findall(r"[a-z0-9]+", ascii_fold(company or "").lower()) if w not in COMPANY_SUFFIXES]
+    return " ".join(words) or None
+
+
+def name_tokens(name: str) -> list[str]:
+    """Name words without initials, e.g. "J. Robert Smith" -> ["robert", "smith"]."""
+    return [t for t in re.findall(r"[a-z]+", ascii_fold(normalize_name(name))) if len(t) > 1]
+
+
+def name_keys(first: str, last: str, common: set[str] = frozenset()) -> list[str]:
+    """
+    Each of the first and last name, as spelled and with each one letter dropped, joined to the
+    Soundex of the other. Either order shares a key ("smith|J500" for "John Smith" and "Smith,
+    John"), and so does one typo in either name: "Jon Smith" has "smith|J500", "John Smtih" has
+    "smih|J500" like "John Smith". Names in `common` (shared by more contacts than a block may
+    hold) aren't spelled out, since the other name is then the rarer one; a name made only of
+    common words keeps just its two exact keys.
+    """
+    keys = set()
+    for word, other in ((first, last), (last, first)):
+        code = soundex(other)
+        if word not in common:
+            keys.add(f"{word}|{code}")
+            keys.update(f"{word[:i]}{word[i + 1:]}|{code}" for i in range(len(word)))
+        elif first in common and last in common:
+            keys.add(f"{word}|{code}")
+    return sorted(keys)
+
+
+class Contact:
+    """The fields of one CRM page that duplicate detection looks at, normalized once."""
+
+    __slots__ = ("page_id", "name", "name_key", "sorted_name", "email", "linkedin", "company", "first_last",
+                 "last_code", "filled", "created")
+
+    def __init__(self, page_id: str, record: dict, created: str | None = None):
+        self.page_id = page_id
+        self.name = record.get("Name") or ""
+        self.name_key = normalize_name(self.name)
+        tokens = name_tokens(self.name)
+        self.sorted_name = " ".join(sorted(tokens))
+        self.email = personal_email(record.get("Email"))
+        self.linkedin = linkedin_handle(record.get("LinkedIn"))
+        self.company = normalize_company(record.get("Company/Org"))
+        self.first_last = (tokens[0], tokens[-1]) if len(tokens) >= 2 else None
+        self.last_code = soundex(tokens[-1]) if tokens else None
+        self.filled = sum(1 for v in record.values() if v)
+        self.created = created or ""
+
+    @classmethod
+    def from_page(cls, page: dict) -> "Contact":
+        return cls(page["id"], compiled_schema.from_notion_props(page.get("properties", {})), page.get("created_time"))
+
+    def blocking_keys(self, common_names: set[str] = frozenset()) -> list[str]:
+        """Contacts that share any of these keys are compared; everything else never is."""
+        keys = []
+        if self.email:
+            keys.append(f"email:{self.email}")
+        if self.linkedin:
+            keys.append(f"linkedin:{self.linkedin}")
+        if self.first_last:
+            keys.extend(f"name:{key}" for key in name_keys(*self.first_last, common_names))
+        if self.company and self.last_code:
+            # Catches nicknames and first-name typos ("Bob Smith" / "Robert Smith") within one company.
+            keys.append(f"company:{self.company}|{self.last_code}")
+        return keys
+
+
+def candidate_pairs(contacts: list[Contact],
+                    max_block: int = DEDUPE_MAX_BLOCK) -> tuple[set[tuple[int, int]], dict[str, int]]:
+    """Index pairs sharing a blocking key, plus the size of each block skipped for being over `max_block`."""
+    name_counts = Counter(name for contact in contacts if contact.first_last for name in set(contact.first_last))
+    common = {name for name, count in name_counts.items() if count > max_block}
+    blocks: dict[str, list[int]] = defaultdict(list)
+    for i, contact in enumerate(contacts):
+        for key in contact.blocking_keys(common):
+            blocks[key].append(i)
+    pairs: set[tuple[int, int]] = set()
+    skipped: dict[str, int] = {}
+    for key, members in blocks.items():
+        if len(members) > max_block:
+            skipped[key] = len(members)
+            continue
+        pairs.update(itertools.combinations(members, 2))
+    return pairs, skipped
+
+
+def name_similarity(a: Contact, b: Contact, floor: float = 0.0) -> float:
+    """
+    Best of the plain and word-sorted name ratios. Comparisons whose cheap upper bounds can't
+    reach `floor` are skipped, so a result below `floor` only means "too low to matter".
+    """
+    best = 0.0
+    variants = [(a.name_key, b.name_key)]
+    if a.name_key.split(" ", 1)[0] != b.name_key.split(" ", 1)[0]:
+        # Possibly the same words in another order ("Smith John").
+        variants.append((a.sorted_name, b.sorted_name))
+    for x, y in variants:
+        cutoff = max(floor, best)
+        # ratio() is at most 2 * min(len) / (len(x) + len(y)); checked before building a matcher.
+        if 2 * min(len(x), len(y)) < cutoff * (len(x) + len(y)):
+            continue
+        matcher = SequenceMatcher(None, x, y)
+        if matcher.real_quick_ratio() >= cutoff and matcher.quick_ratio() >= cutoff:
+            best = max(best, matcher.ratio())
+    return best
+
+
+def score_pair(a: Contact, b: Contact, threshold: float = 0.0) -> tuple[float, str]:
+    """
+    Likelihood in [0, 1] that two contacts are the same person, and the evidence it rests on.
+    Scores below `threshold` may be underestimated; they are only ever compared against it.
+    """
+    if a.email and a.email == b.email:
+        return 1.0, "email"
+    if a.linkedin and a.linkedin == b.linkedin:
+        return 1.0, "linkedin"
+    both_companies = bool(a.company and b.company)
+    # The lowest name score that can still reach `threshold` given a perfect company match.
+    floor = (threshold - 0.25) / 0.75 if both_companies else threshold
+    name = name_similarity(a, b, floor)
+    reason = "name"
+    score = name
+    if both_companies:
+        score = 0.75 * name + 0.25 * SequenceMatcher(None, a.company, b.company).ratio()
+        reason = "name+company"
+    if a.linkedin and b.linkedin:
+        # Two different profiles are almost certainly two people.
+        score -= 0.3
+    elif a.email and b.email:
+        score -= 0.05
+    return max(0.0, score), reason
+
+
+def conflicting(a: Contact, b: Contact) -> bool:
+    """Different emails or LinkedIn profiles: whatever else matches, not merged without a human looking."""
+    return bool(a.email and b.email and a.email != b.email) or bool(a.linkedin and b.linkedin and a.linkedin != b.linkedin)
+
+
+class UnionFind:
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+
+    def find(self, i: int) -> int:
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i: int, j: int) -> None:
+        ri, rj = self.find(i), self.find(j)
+        if ri != rj:
+            self.parent[max(ri, rj)] = min(ri, rj)
+
+
+class Cluster:
+    """Contacts linked by pairs at or above the threshold. `score` is the weakest link used."""
+
+    def __init__(self, members: list[Contact], edges: list[tuple[Contact, Contact, float, str]]):
+        self.members = members
+        self.edges = edges
+        self.score = min(score for _, _, score, _ in edges)
+        self.reasons = sorted({reason for _, _, _, reason in edges})
+
+    def auto_mergeable(self, threshold: float) -> bool:
+        """
+        Whether `--apply` may merge the cluster unattended: every link scores at least `threshold`
+        and rests on more than the name (a shared email or profile, or name and company), and no
+        two members carry different emails or LinkedIn profiles.
+        """
+        if self.score < threshold or "name" in self.reasons:
+            return False
+        return not any(conflicting(a, b) for a, b in itertools.combinations(self.members, 2))
+
+    def survivor(self) -> Contact:
+        """The page the others are merged into: the most complete, then the oldest."""
+        return sorted(self.members, key=lambda c: (-c.filled, c.created))[0]
+
+
+def find_clusters(contacts: list[Contact], threshold: float = DEDUPE_THRESHOLD,
+                  max_block: int = DEDUPE_MAX_BLOCK) -> tuple[list[Cluster], dict]:
+    """Blocking, pair scoring and union-find over the pairs that pass; returns clusters and run stats."""
+    pairs, skipped = candidate_pairs(contacts, max_block)
+    links = UnionFind(len(contacts))
+    edges = []
+    for i, j in pairs:
+        score, reason = score_pair(contacts[i], contacts[j], threshold)
+        if score >= threshold:
+            links.union(i, j)
+            edges.append((i, j, score, reason))
+
+    members: dict[int, list[int]] = defaultdict(list)
+    for i in range(len(contacts)):
+        members[links.find(i)].append(i)
+    cluster_edges: dict[int, list] = defaultdict(list)
+    for i, j, score, reason in edges:
+        cluster_edges[links.find(i)].append((contacts[i], contacts[j], score, reason))
+    clusters = [Cluster([contacts[i] for i in idx], cluster_edges[root])
+                for root, idx in members.items() if len(idx) > 1]
+    clusters.sort(key=lambda c: -c.score)
+    stats = {"contacts": len(contacts), "pairs_compared": len(pairs), "blocks_skipped": len(skipped),
+             "links": len(edges), "clusters": len(clusters),
+             # Largest first: contacts in these were only compared through their other keys.
+             "skipped_blocks": dict(sorted(skipped.items(), key=lambda kv: -kv[1]))}
+    return clusters, stats
+
+
+def merged_props(survivor: dict, others: list[dict]) -> dict:
+    """
+    Notion properties that fold `others` into `survivor` (records as read by `from_notion_props`):
+    empty fields are filled from the others, Tags are unioned and distinct Notes appended.
+    Only changed properties are returned.
+    """
+    merged = dict(survivor)
+    for record in others:
+        for col, val in record.items():
+            if not val:
+                continue
+            if col == "Tags":
+                merged[col] = list(dict.fromkeys([*(merged.get(col) or []), *val]))
+            elif col == "Notes" and merged.get(col) and val not in merged[col]:
+                merged[col] = f"{merged[col]}\n{val}"
+            elif not merged.get(col):
+                merged[col] = val
+    changed = {col: val for col, val in merged.items() if val != survivor.get(col)}
+    return compiled_schema.to_notion_props(changed)
@@ -0,0 +1,89 @@
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Hashable
+
+
+class RecentIds:
+    """The last `size` ids seen, for dropping redelivered events; `seen` records the id as it checks it."""
+
+    def __init__(self, size: int = 10_000):
+        self.size = size
+        self._ids: OrderedDict[str, None] = OrderedDict()
+
+    def seen(self, event_id: str) -> bool:
+        if event_id in self._ids:
+            self._ids.move_to_end(event_id)
+            return True
+        self._ids[event_id] = None
+        if len(self._ids) > self.size:
+            self._ids.popitem(last=False)
+        return False
+
+
+class KeyedDispatcher:
+    """
+    Runs submitted jobs as background tasks on the running event loop.
+
+    Jobs with the same key run one at a time, in submission order (e.g. one chat user's
+    messages, so a confirmation reply is never handled before the prompt it answers).
+    Different keys run concurrently: at most `per_group` at once within a group (e.g. a
+    channel) and at most `limit` at once overall. Failures are logged, never raised.
+    """
+
+    def __init__(self, limit: int, per_group: int):
+        self.limit = limit
+        self.per_group = per_group
+        self._slots: asyncio.Semaphore | None = None
+        self._groups: dict[Hashable, list] = {}
+        self._queues: dict[Hashable, deque] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    def submit(self, key: Hashable, group: Hashable, job: Callable[[], Awaitable[None]]) -> None:
+        queue = self._queues.get(key)
+        if queue is not None:
+            queue.append((group, job))
+            return
+        self._queues[key] = deque([(group, job)])
+        task = asyncio.create_task(self._drain(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    @property
+    def busy(self) -> int:
+        """Keys with jobs running or waiting."""
+        return len(self._queues)
+
+    async def join(self) -> None:
+        """Wait until every submitted job has finished."""
+        while self._tasks:
+            await asyncio.gather(*self._tasks)
+
+    async def _drain(self, key: Hashable) -> None:
+        queue = self._queues[key]
+        try:
+            while queue:
+                group, job = queue[0]
+                await self._run(group, job)
+                queue.popleft()
+        finally:
+            del self._queues[key]
+
+    async def _run(self, group: Hashable, job: Callable[[], Awaitable[None]]) -> None:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.limit)
+        # [semaphore, jobs holding or waiting for it]; dropped once the group is idle.
+        entry = self._groups.get(group)
+        if entry is None:
+            entry = self._groups[group] = [asyncio.Semaphore(self.per_group), 0]
+        entry[1] += 1
+        try:
+            # Group first, then global, always in that order.
+            async with entry[0], self._slots:
+                await job()
+        except Exception:
+            logging.exception(f"Background job for group {group!r} failed")
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._groups[group]
@@ -0,0 +1,53 @@
+import os
+import sqlite3
+import threading
+import time
+
+from .job_queue import JOB_QUEUE_PATH
+
+IDEMPOTENCY_PATH = os.getenv("IDEMPOTENCY_PATH", JOB_QUEUE_PATH)
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(7 * 24 * 3600)))
+
+
+class IdempotencyStore:
+    """
+    Remembers which Notion page each idempotency key wrote, so a retried job updates the page
+    its earlier attempt created instead of creating a duplicate.
+
+    The database is opened on first use; processes that never pass a key don't touch it.
+    """
+
+    def __init__(self, path: str = IDEMPOTENCY_PATH, ttl: float = IDEMPOTENCY_TTL_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS idempotent_writes ("
+                " key TEXT PRIMARY KEY, page_id TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+        return self._conn
+
+    def page_for(self, key: str) -> str | None:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT page_id FROM idempotent_writes WHERE key = ? AND created_at >= ?", (key, time.time() - self.ttl)
+            ).fetchone()
+        return row[0] if row else None
+
+    def remember(self, key: str, page_id: str) -> None:
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO idempotent_writes (key, page_id, created_at) VALUES (?, ?, ?)", (key, page_id, now)
+            )
+            db.execute("DELETE FROM idempotent_writes WHERE created_at < ?", (now - self.ttl,))
+
+
+idempotency_store = IdempotencyStore()
@@ -0,0 +1,175 @@
+import csv
+import re
+from typing import Iterator
+
+from schema import SCHEMA
+
+# Lower-cased header -> SCHEMA column, for exports that don't use our column names.
+CSV_ALIASES = {
+    "name": "Name",
+    "full name": "Name",
+    "company": "Company/Org",
+    "organization": "Company/Org",
+    "organisation": "Company/Org",
+    "org": "Company/Org",
+    "title": "Role/Title",
+    "job title": "Role/Title",
+    "position": "Role/Title",
+    "role": "Role/Title",
+    "email": "Email",
+    "email address": "Email",
+    "e-mail": "Email",
+    "location": "Location",
+    "city": "Location",
+    "linkedin": "LinkedIn",
+    "linkedin url": "LinkedIn",
+    "profile url": "LinkedIn",
+    "url": "LinkedIn",
+    "notes": "Notes",
+    "note": "Notes",
+    "tags": "Tags",
+    "introduced by": "Introduced By",
+    "met how/where": "Met How/Where",
+    "one-liner": "One-liner",
+}
+FIRST_NAME_HEADERS = {"first name", "firstname", "given name"}
+LAST_NAME_HEADERS = {"last name", "lastname", "surname", "family name"}
+
+
+def _column_for(header: str) -> str | None:
+    h = header.strip()
+    for col in SCHEMA:
+        if col.lower() == h.lower():
+            return col
+    return CSV_ALIASES.get(h.lower())
+
+
+def row_to_record(row: dict, text_columns: set[str] = frozenset()) -> tuple[dict, str]:
+    """
+    Split one exported row into (structured record, free text).
+
+    Headers that map onto SCHEMA become fields directly. Columns named in `text_columns`,
+    and every unmapped column when no name could be mapped, are joined into free text
+    for `parse_with_ai`.
+    """
+    record: dict = {}
+    first = last = ""
+    text_parts = []
+    unmapped = []
+    for header, value in row.items():
+        if header is None or value is None or not str(value).strip():
+            continue
+        value = str(value).strip()
+        key = header.strip().lower()
+        col = _column_for(header)
+        if header in text_columns:
+            text_parts.append(f"{header}: {value}")
+        elif key in FIRST_NAME_HEADERS:
+            first = value
+        elif key in LAST_NAME_HEADERS:
+            last = value
+        elif col == "Tags":
+            record["Tags"] = [t.strip() for t in re.split(r"[,;]", value) if t.strip()]
+        elif col:
+            record[col] = value
+        else:
+            unmapped.append(f"{header}: {value}")
+
+    if not record.get("Name") and (first or last):
+        record["Name"] = f"{first} {last}".strip()
+    if not record.get("Name"):
+        text_parts += unmapped
+    return record, "\n".join(text_parts)
+
+
+def read_csv(path: str, text_columns: set[str] = frozenset()) -> Iterator[tuple[dict, str]]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            yield row_to_record(row, text_columns)
+
+
+def read_linkedin(path: str) -> Iterator[tuple[dict, str]]:
+    """LinkedIn "Connections.csv": a few "Notes:" preamble lines, then First Name/Last Name/URL/... columns."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for line in f:
+            if line.startswith("First Name"):
+                header = next(csv.reader([line]))
+                break
+        else:
+            return
+        for row in csv.DictReader(f, fieldnames=header):
+            record, text = row_to_record({k: v for k, v in row.items() if k != "Connected On"})
+            if record:
+                record.setdefault("Met How/Where", "LinkedIn")
+            yield record, text
+
+
+def _vcard_lines(f) -> Iterator[str]:
+    """Unfold continuation lines (RFC 6350: a line starting with a space or tab continues the previous one)."""
+    current = None
+    for raw in f:
+        line = raw.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current is not None:
+        yield current
+
+
+def _vcard_unescape(value: str) -> str:
+    return value.replace("\\n", "\n").replace("\\N", "\n").replace("\\,", ",").replace("\\;", ";").replace("\\\\", "\\")
+
+
+def read_vcard(path: str) -> Iterator[tuple[dict, str]]:
+    with open(path, encoding="utf-8-sig") as f:
+        card: dict | None = None
+        for line in _vcard_lines(f):
+            if ":" not in line:
+                continue
+            head, value = line.split(":", 1)
+            prop = head.split(";", 1)[0].split(".")[-1].upper()
+            if prop == "BEGIN":
+                card = {}
+            elif prop == "END" and card is not None:
+                yield card, ""
+                card = None
+            elif card is None:
+                continue
+            elif prop == "FN":
+                card["Name"] = _vcard_unescape(value).strip()
+            elif prop == "N" and "Name" not in card:
+                last, first = (value.split(";") + ["", ""])[:2]
+                card["Name"] = f"{_vcard_unescape(first)} {_vcard_unescape(last)}".strip()
+            elif prop == "ORG":
+                card["Company/Org"] = _vcard_unescape(value.split(";")[0]).strip()
+            elif prop == "TITLE":
+                card["Role/Title"] = _vcard_unescape(value).strip()
+            elif prop == "EMAIL" and "Email" not in card:
+                card["Email"] = value.strip()
+            elif prop == "URL" and "linkedin.com" in value.lower():
+                card["LinkedIn"] = value.strip()
+            elif prop == "NOTE":
+                card["Notes"] = _vcard_unescape(value).strip()
+            elif prop == "ADR" and "Location" not in card:
+                parts = [_vcard_unescape(p).strip() for p in value.split(";")]
+                # ADR is po-box;ext;street;locality;region;code;country
+                location = ", ".join(parts[i] for i in (3, 4, 6) if i < len(parts) and parts[i])
+                if location:
+                    card["Location"] = location
+
+
+READERS = {"csv": read_csv, "linkedin": read_linkedin, "vcard": read_vcard}
+
+
+def detect_format(path: str) -> str:
+    lower = path.lower()
+    if lower.endswith((".vcf", ".vcard")):
+        return "vcard"
+    with open(path, encoding="utf-8-sig") as f:
+        head = f.read(4096)
+    if "First Name,Last Name,URL" in head:
+        return "linkedin"
+    return "csv"
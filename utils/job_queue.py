@@ -0,0 +1,117 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# "1" makes the bots enqueue messages for `worker.py` instead of processing them inline.
+USE_JOB_QUEUE = os.getenv("USE_JOB_QUEUE", "0") == "1"
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "jobs.sqlite3")
+# A claimed job that isn't finished within the lease is handed to another worker.
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_CAP_SECONDS = 300.0
+# Finished jobs are kept this long (default a week) before `purge` drops them. Keep it well past
+# how long a chat platform may redeliver a message, since a purged key can be queued again.
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+
+
+class JobQueue:
+    """
+    Durable SQLite job queue shared by the bots (producers) and any number of worker processes.
+
+    Delivery is at least once: a claim is a lease, and a job whose worker dies before
+    `complete` is claimed again once the lease runs out. Enqueueing is idempotent per `key`
+    (e.g. the chat platform's message id), so a redelivered message is queued once. Jobs of
+    one conversation run one at a time, in order, so a "yes" is never handled before the
+    question it answers.
+    """
+
+    def __init__(self, path: str = JOB_QUEUE_PATH, lease_seconds: float = JOB_LEASE_SECONDS,
+                 max_attempts: int = JOB_MAX_ATTEMPTS):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT UNIQUE, kind TEXT NOT NULL,"
+            " conversation TEXT NOT NULL, payload TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'queued',"
+            " attempts INTEGER NOT NULL DEFAULT 0, available_at REAL NOT NULL, leased_until REAL,"
+            " worker TEXT, error TEXT, reply TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, available_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_conversation ON jobs (conversation, status)")
+
+    def enqueue(self, kind: str, payload: dict, conversation: str, key: str | None = None) -> int:
+        """Queue a job; returns its id, or the id of the job already queued under `key`."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "INSERT INTO jobs (key, kind, conversation, payload, available_at, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (key) DO NOTHING RETURNING id",
+                (key, kind, conversation, json.dumps(payload), now, now, now),
+            ).fetchone()
+            if row is None:
+                row = self._conn.execute("SELECT id FROM jobs WHERE key = ?", (key,)).fetchone()
+        return row["id"]
+
+    def claim(self, worker: str) -> dict | None:
+        """Lease the oldest runnable job whose conversation has nothing else in flight."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, leased_until = ?, worker = ?,"
+                " updated_at = ? WHERE id = ("
+                "  SELECT j.id FROM jobs j"
+                "  WHERE ((j.status = 'queued' AND j.available_at <= ?) OR (j.status = 'running' AND j.leased_until < ?))"
+                "  AND NOT EXISTS (SELECT 1 FROM jobs r WHERE r.conversation = j.conversation AND r.id != j.id"
+                "   AND ((r.status = 'running' AND r.leased_until >= ?) OR (r.status = 'queued' AND r.id < j.id)))"
+                "  ORDER BY j.id LIMIT 1)"
+                " RETURNING id, kind, conversation, payload, attempts, reply, created_at",
+                (now + self.lease_seconds, worker, now, now, now, now),
+            ).fetchone()
+        if row is None:
+            return None
+        return {**dict(row), "payload": json.loads(row["payload"])}
+
+    def save_reply(self, job_id: int, reply: str) -> None:
+        """Keep a job's reply before sending it; a retry after a failed send resends it instead of rerunning the job."""
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET reply = ?, updated_at = ? WHERE id = ?", (reply, time.time(), job_id))
+
+    def complete(self, job_id: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'done', leased_until = NULL, error = NULL, updated_at = ? WHERE id = ?",
+                (time.time(), job_id),
+            )
+
+    def fail(self, job_id: int, error: str) -> bool:
+        """Record a failed attempt; the job is retried with backoff until `max_attempts`. Returns True if retried."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            retry = row is not None and row["attempts"] < self.max_attempts
+            delay = min(JOB_RETRY_CAP_SECONDS, 2 ** (row["attempts"] if row else 0))
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, available_at = ?, leased_until = NULL, error = ?, updated_at = ?"
+                " WHERE id = ?",
+                ("queued" if retry else "failed", now + delay, error, now, job_id),
+            )
+        return retry
+
+    def counts(self) -> dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def purge(self, older_than: float = JOB_RETENTION_SECONDS) -> int:
+        """Drop finished jobs older than `older_than` seconds; their keys can then be queued again."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?", (time.time() - older_than,)
+            )
+        return cursor.rowcount
@@ -0,0 +1,56 @@
+import json
+import logging
+
+
+class JsonArrayStream:
+    """
+    Incremental parser for a reply holding one array of objects, either bare (`[{...}, ...]`) or
+    as the value of a top-level key (`{"records": [{...}, ...]}`).
+
+    `feed` takes the reply's text as it arrives and returns every object of the array whose
+    closing brace it has now seen, so callers can act on each one before the reply is complete.
+    Only string state and bracket depth are tracked; each object is handed to `json.loads` whole.
+    """
+
+    def __init__(self):
+        self._stack: list[str] = []
+        self._in_string = False
+        self._escaped = False
+        # Characters of the object being read, and the depth its closing brace returns to.
+        self._current: list[str] | None = None
+        self._depth = 0
+
+    def feed(self, chunk: str) -> list[dict]:
+        done = []
+        for c in chunk:
+            if self._current is None and c == "{" and not self._in_string and self._stack[-1:] == ["["] \
+                    and len(self._stack) <= 2:
+                self._current, self._depth = [], len(self._stack)
+            if self._current is not None:
+                self._current.append(c)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif c == "\\":
+                    self._escaped = True
+                elif c == '"':
+                    self._in_string = False
+            elif c == '"':
+                self._in_string = True
+            elif c in "{[":
+                self._stack.append(c)
+            elif c in "}]" and self._stack:
+                self._stack.pop()
+                if self._current is not None and len(self._stack) == self._depth:
+                    done.extend(self._finish("".join(self._current)))
+                    self._current = None
+        return done
+
+    @staticmethod
+    def _finish(text: str) -> list[dict]:
+        try:
+            value = json.loads(text)
+        except ValueError as e:
+            logging.error(f"Streamed JSON object didn't parse: {e}: {text}")
+            return []
+        return [value] if isinstance(value, dict) else []
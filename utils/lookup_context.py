@@ -0,0 +1,81 @@
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from . import metrics
+
+READ_CALLS = ("databases.query", "databases.retrieve", "pages.retrieve")
+WRITE_CALLS = ("pages.create", "pages.update")
+
+_active: ContextVar["LookupContext | None"] = ContextVar("active_lookup", default=None)
+
+
+class LookupContext:
+    """
+    Request-scoped state for one record as it moves from the similarity check to the upsert.
+
+    `check_for_similar_names` resolves it once; `upsert_to_notion` then reuses the resolved
+    page id instead of looking the name up again. Every Notion call made while the context
+    is active is tallied in `calls`, so the per-record API budget can be asserted.
+    """
+
+    def __init__(self, page_id: str | None = None):
+        self.status: str | None = None
+        self.page_id = page_id
+        self.resolved = page_id is not None
+        self.calls: Counter = Counter()
+
+    @classmethod
+    def for_page(cls, page_id: str) -> "LookupContext":
+        """A context already resolved to an existing page (e.g. a confirmed suggestion)."""
+        lookup = cls(page_id)
+        lookup.status = "exact_match"
+        return lookup
+
+    def resolve(self, status: str, page_id: str | None) -> None:
+        self.status = status
+        self.page_id = page_id
+        self.resolved = True
+
+    @property
+    def reads(self) -> int:
+        return sum(n for call, n in self.calls.items() if call in READ_CALLS)
+
+    @property
+    def writes(self) -> int:
+        return sum(n for call, n in self.calls.items() if call in WRITE_CALLS)
+
+
+@contextmanager
+def tracking(lookup: LookupContext | None):
+    """Attribute Notion calls made inside the block to `lookup` (no-op for None)."""
+    if lookup is None:
+        yield
+        return
+    token = _active.set(lookup)
+    try:
+        yield
+    finally:
+        _active.reset(token)
+
+
+class CountingClient:
+    """Wraps a Notion client and counts each endpoint call (e.g. `pages.update`) on the active LookupContext."""
+
+    def __init__(self, target, path: str = ""):
+        self._target = target
+        self._path = path
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._target, name)
+        path = f"{self._path}.{name}" if self._path else name
+        if not callable(attr):
+            return CountingClient(attr, path)
+
+        def counted(*args, **kwargs):
+            lookup = _active.get()
+            if lookup is not None:
+                lookup.calls[path] += 1
+            metrics.inc("crm_notion_calls_total", endpoint=path)
+            return attr(*args, **kwargs)
+        return counted
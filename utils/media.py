@@ -0,0 +1,98 @@
+import base64
+import io
+import logging
+import os
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it images are sent as downloaded.
+    Image = None
+
+# Telegram bots can't download files over 20MB anyway; this guards memory, not the API.
+MEDIA_MAX_BYTES = int(os.getenv("MEDIA_MAX_BYTES", str(20 * 1024 * 1024)))
+# The vision model fits images into 2048x2048 and then scales the short side to 768px,
+# so anything sent beyond that is upload and decode time for nothing.
+VISION_MAX_SIDE = int(os.getenv("VISION_MAX_SIDE", "2048"))
+VISION_SHORT_SIDE = int(os.getenv("VISION_SHORT_SIDE", "768"))
+VISION_JPEG_QUALITY = int(os.getenv("VISION_JPEG_QUALITY", "85"))
+
+
+class MediaTooLarge(ValueError):
+    pass
+
+
+class BoundedBuffer(io.BytesIO):
+    """In-memory download target that refuses to grow past `limit` bytes."""
+
+    def __init__(self, limit: int = MEDIA_MAX_BYTES):
+        super().__init__()
+        self.limit = limit
+
+    def write(self, data) -> int:
+        if self.tell() + len(data) > self.limit:
+            raise MediaTooLarge(f"media is larger than {self.limit} bytes")
+        return super().write(data)
+
+
+async def download_media(file, limit: int = MEDIA_MAX_BYTES) -> bytes:
+    """Download a Telegram `File` into memory, refusing anything over `limit` bytes."""
+    if file.file_size and file.file_size > limit:
+        raise MediaTooLarge(f"media is {file.file_size} bytes, limit is {limit}")
+    with BoundedBuffer(limit) as buf:
+        await file.download_to_memory(buf)
+        return buf.getvalue()
+
+
+def pick_photo_size(sizes: list, short_side: int = VISION_SHORT_SIDE):
+    """Smallest of Telegram's pre-scaled `PhotoSize`s that still covers what the vision model uses."""
+    for size in sorted(sizes, key=lambda s: s.width * s.height):
+        if min(size.width, size.height) >= short_side:
+            return size
+    return max(sizes, key=lambda s: s.width * s.height)
+
+
+def vision_size(width: int, height: int, max_side: int = VISION_MAX_SIDE,
+                short_side: int = VISION_SHORT_SIDE) -> tuple[int, int]:
+    """The size the vision model would scale an image to; never upscales."""
+    scale = min(1.0, max_side / max(width, height))
+    scale *= min(1.0, short_side / (min(width, height) * scale))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def prepare_image(data: bytes, quality: int = VISION_JPEG_QUALITY) -> tuple[bytes, str]:
+    """
+    Downscale and recompress an image to what the vision model actually looks at.
+
+    Returns (bytes, mime type). Without Pillow, or for anything Pillow can't read, the
+    original bytes are returned unchanged.
+    """
+    if Image is None:
+        return data, "image/jpeg"
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            mime = Image.MIME.get(img.format, "image/jpeg")
+            target = vision_size(*img.size)
+            # For JPEGs this decodes at a reduced scale straight away, instead of the full bitmap.
+            img.draft("RGB", target)
+            if img.mode not in ("RGB", "RGBA", "L", "LA"):
+                # Palette and 1-bit images would be resized nearest-neighbour; they are small to convert anyway.
+                img = img.convert("RGB")
+            # Shrinks in place, so the decoded bitmap is the only large one ever alive.
+            img.thumbnail(target, Image.LANCZOS, reducing_gap=None)
+            # Rotating and converting the small image, not the decoded one, avoids two full-size copies.
+            small = ImageOps.exif_transpose(img)
+            if small.mode != "RGB":
+                small = small.convert("RGB")
+            out = io.BytesIO()
+            small.save(out, format="JPEG", quality=quality, optimize=True)
+    except Exception as e:
+        logging.warning(f"Couldn't downscale image, sending it as is: {e}")
+        return data, "image/jpeg"
+    if out.tell() >= len(data):
+        # Already small (e.g. a flat PNG screenshot); the model does the scaling for free.
+        return data, mime
+    return out.getvalue(), "image/jpeg"
+
+
+def image_data_url(data: bytes, mime: str = "image/jpeg") -> str:
+    return f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"
@@ -0,0 +1,239 @@
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Port for the Prometheus-style /metrics endpoint; unset keeps it off.
+METRICS_PORT = os.getenv("METRICS_PORT")
+# Log one JSON line per handled message with its stage timings.
+METRICS_TRACE_LOG = os.getenv("METRICS_TRACE_LOG", "1") == "1"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+trace_log = logging.getLogger("crm.trace")
+
+
+class Registry:
+    """Thread-safe counters and histograms keyed by (name, labels), rendered in Prometheus text format."""
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._counters: dict[tuple, float] = {}
+        self._histograms: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, amount: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                # Per-bucket counts, then sum and count.
+                hist = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    hist[0][i] += 1
+            hist[1] += value
+            hist[2] += 1
+
+    def snapshot(self) -> dict:
+        """Plain-dict copy of every series, e.g. for saving benchmark results."""
+        with self._lock:
+            return {
+                "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in self._counters.items()],
+                "histograms": [
+                    {"name": n, "labels": dict(l), "sum": h[1], "count": h[2],
+                     "buckets": dict(zip(map(str, self.buckets), h[0]))}
+                    for (n, l), h in self._histograms.items()
+                ],
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name in sorted({n for n, _ in self._counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (n, labels), value in sorted(self._counters.items()):
+                    if n == name:
+                        lines.append(f"{name}{_labels(labels)} {value:g}")
+            for name in sorted({n for n, _ in self._histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (n, labels), (counts, total, count) in sorted(self._histograms.items()):
+                    if n != name:
+                        continue
+                    for bound, c in zip(self.buckets, counts):
+                        lines.append(f"{name}_bucket{_labels(labels + (('le', f'{bound:g}'),))} {c}")
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+                    lines.append(f"{name}_sum{_labels(labels)} {total:g}")
+                    lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+registry = Registry()
+
+
+class Trace:
+    """One handled message: where it came from and how long each stage took."""
+
+    def __init__(self, channel: str, media: str):
+        self.trace_id = uuid.uuid4().hex[:12]
+        self.channel = channel
+        self.media = media
+        self.started = time.perf_counter()
+        self.stages: list[tuple[str, float]] = []
+        self.tokens = 0
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.stages.append((stage, seconds))
+
+
+_current: ContextVar[Trace | None] = ContextVar("current_trace", default=None)
+
+
+def current_trace() -> Trace | None:
+    return _current.get()
+
+
+def _trace_labels(trace: Trace | None) -> dict:
+    return {"channel": trace.channel, "media": trace.media} if trace else {"channel": "none", "media": "none"}
+
+
+@contextmanager
+def trace(channel: str, media: str):
+    """Scope one incoming message; stages and counters inside are tagged with its channel and media type."""
+    t = Trace(channel, media)
+    token = _current.set(t)
+    status = "ok"
+    try:
+        yield t
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        _current.reset(token)
+        elapsed = time.perf_counter() - t.started
+        registry.observe("crm_request_seconds", elapsed, channel=channel, media=media)
+        registry.inc("crm_requests_total", channel=channel, media=media, status=status)
+        if METRICS_TRACE_LOG:
+            stages: dict[str, float] = {}
+            for name, seconds in t.stages:
+                stages[name] = stages.get(name, 0) + round(seconds * 1000, 1)
+            trace_log.info(json.dumps({
+                "trace_id": t.trace_id, "channel": channel, "media": media, "status": status,
+                "total_ms": round(elapsed * 1000, 1), "stages_ms": stages, "tokens": t.tokens,
+            }))
+
+
+def traced(channel: str, media: str):
+    """Decorator form of `trace` for message handlers, sync or async."""
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with trace(channel, media):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with trace(channel, media):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def observe_stage(name: str, seconds: float, trace: Trace | None = None) -> None:
+    """Record a stage timed elsewhere (e.g. in a callback, where `trace` has to be passed explicitly)."""
+    trace = trace or _current.get()
+    registry.observe("crm_stage_seconds", seconds, stage=name, **_trace_labels(trace))
+    if trace is not None:
+        trace.add(name, seconds)
+
+
+@contextmanager
+def stage(name: str):
+    """Time the block as pipeline stage `name`; failures are counted per stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        inc("crm_stage_errors_total", stage=name)
+        raise
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+
+
+def inc(name: str, amount: float = 1, **labels) -> None:
+    """Increment a counter, tagged with the current trace's channel and media type."""
+    registry.inc(name, amount, **_trace_labels(_current.get()), **labels)
+
+
+def record_openai_usage(resp, operation: str) -> None:
+    """Count the tokens an OpenAI response reports (chat and transcription usage shapes both work)."""
+    usage = getattr(resp, "usage", None)
+    if usage is None:
+        return
+    prompt = getattr(usage, "prompt_tokens", None) or getattr(usage, "input_tokens", None) or 0
+    completion = getattr(usage, "completion_tokens", None) or getattr(usage, "output_tokens", None) or 0
+    if not isinstance(prompt, int) or not isinstance(completion, int):
+        return
+    inc("crm_openai_tokens_total", prompt, operation=operation, kind="prompt")
+    inc("crm_openai_tokens_total", completion, operation=operation, kind="completion")
+    # Prompt tokens the provider served from its prompt cache (a shared prefix of 1024+ tokens).
+    cached = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None)
+    if isinstance(cached, int) and cached:
+        inc("crm_openai_tokens_total", cached, operation=operation, kind="cached_prompt")
+    trace = _current.get()
+    if trace is not None:
+        with trace._lock:
+            trace.tokens += prompt + completion
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port: int | str | None = METRICS_PORT) -> ThreadingHTTPServer | None:
+    """Start the /metrics endpoint on a daemon thread; does nothing when no port is configured."""
+    if not port:
+        return None
+    server = ThreadingHTTPServer(("0.0.0.0", int(port)), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logging.info(f"Metrics endpoint on :{port}/metrics")
+    return server
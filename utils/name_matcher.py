@@ -0,0 +1,129 @@
+import math
+from difflib import SequenceMatcher
+
+DEFAULT_THRESHOLD = 0.8
+
+
+def normalize_name(name: str) -> str:
+    return " ".join(str(name).split()).lower()
+
+
+def trigrams(normalized: str) -> set[str]:
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameMatcher:
+    """
+    Fuzzy name lookup backed by a character-trigram inverted index, bucketed by name length.
+
+    A query only visits the length buckets that can reach the threshold, and in each only the
+    posting lists of its rarest trigrams (prefix filtering). Candidates sharing enough trigrams
+    go through the character-count bound, then the SequenceMatcher scorer. The cost is the size
+    of those posting lists, i.e. the number of names sharing most of the query's trigrams: it
+    stays flat on a varied contact list and grows with the list when many names share a first
+    and last name.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self._names: dict[str, str] = {}
+        self._normalized: dict[str, str] = {}
+        self._grams: dict[str, set[str]] = {}
+        # normalized length -> trigram -> keys
+        self._postings: dict[int, dict[str, set[str]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def add(self, key: str, name: str) -> None:
+        """Insert `key`, or re-index it if its name changed."""
+        normalized = normalize_name(name)
+        if self._normalized.get(key) == normalized:
+            self._names[key] = name
+            return
+        self.remove(key)
+        if not normalized:
+            return
+        grams = trigrams(normalized)
+        self._names[key] = name
+        self._normalized[key] = normalized
+        self._grams[key] = grams
+        bucket = self._postings.setdefault(len(normalized), {})
+        for gram in grams:
+            bucket.setdefault(gram, set()).add(key)
+
+    def remove(self, key: str) -> None:
+        grams = self._grams.pop(key, None)
+        self._names.pop(key, None)
+        normalized = self._normalized.pop(key, None)
+        bucket = self._postings.get(len(normalized or ""))
+        for gram in grams or ():
+            posting = bucket.get(gram)
+            if posting is not None:
+                posting.discard(key)
+                if not posting:
+                    del bucket[gram]
+        if bucket is not None and not bucket:
+            del self._postings[len(normalized)]
+
+    def shortlist(self, name: str, threshold: float | None = None) -> list[str]:
+        """
+        Keys that can plausibly reach `threshold`; a filter, not a score.
+
+        The trigram bound assumes the differences sit in at most (1 - t) (la + lb) / 2 places,
+        as many as substitutions alone could reach the threshold with, each breaking up to three
+        of the query's trigrams. Pairs that only reach it through more, scattered edits are
+        missed: the other name then shares too few of the query's trigrams (or none, for short
+        names). A single typo is always found; `bench_name_matcher --edits 3` measures the rest.
+        """
+        threshold = self.threshold if threshold is None else threshold
+        query = normalize_name(name)
+        if not query:
+            return []
+        grams = trigrams(query)
+        qlen = len(query)
+        # ratio = 2M / (la + lb) can never exceed 2 * min(la, lb) / (la + lb)
+        shortest = math.ceil(threshold * qlen / (2 - threshold))
+        longest = math.floor((2 - threshold) * qlen / threshold)
+
+        shortlisted = []
+        for clen in range(shortest, longest + 1):
+            bucket = self._postings.get(clen)
+            if not bucket:
+                continue
+            places = math.ceil((1 - threshold) * (qlen + clen) / 2)
+            min_overlap = max(1, len(grams) - 3 * places)
+            # A candidate sharing `min_overlap` grams must hit one of the rarest
+            # len(grams) - min_overlap + 1 of them, so only those postings are scanned.
+            by_rarity = sorted(grams, key=lambda g: len(bucket.get(g, ())))
+            candidates: set[str] = set()
+            for gram in by_rarity[:len(grams) - min_overlap + 1]:
+                candidates.update(bucket.get(gram, ()))
+            for key in candidates:
+                if len(grams & self._grams[key]) >= min_overlap:
+                    shortlisted.append(key)
+        return shortlisted
+
+    def search(self, name: str, threshold: float | None = None) -> list[tuple[str, str, float]]:
+        """Return (key, name, similarity) for every indexed name at or above `threshold`, best first."""
+        threshold = self.threshold if threshold is None else threshold
+        # The query stays seq1 so scores match the old full scan exactly (ratio() is not
+        # symmetric). quick_ratio() is symmetric, so its bound keeps the query as seq2, where
+        # SequenceMatcher caches the character counts, and rejects most of the shortlist cheaply.
+        query = normalize_name(name)
+        bound = SequenceMatcher()
+        bound.set_seq2(query)
+        scorer = SequenceMatcher()
+        scorer.set_seq1(query)
+        matches = []
+        for key in self.shortlist(name, threshold):
+            bound.set_seq1(self._normalized[key])
+            if bound.quick_ratio() < threshold:
+                continue
+            scorer.set_seq2(self._normalized[key])
+            score = scorer.ratio()
+            if score >= threshold:
+                matches.append((key, self._names[key], score))
+        matches.sort(key=lambda m: m[2], reverse=True)
+        return matches
@@ -1,63 +1,79 @@
-from notion_client import Client
-from schema import SCHEMA
 import os
 import string
-from dotenv import load_dotenv
-from difflib import SequenceMatcher
-
-load_dotenv()
-
-NOTION_TOKEN = os.getenv("NOTION_TOKEN")
-
-notion = Client(auth=NOTION_TOKEN)
+import logging
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from . import clients
+from .contact_index import ContactIndex, page_gone
+from .lookup_context import LookupContext, CountingClient, tracking
+from .notion_writer import NotionWriteScheduler
+from .idempotency import idempotency_store
+from . import metrics
+from .schema_compiler import compiled_schema
+from .tag_catalog import TagCatalog
+
+NAME_MATCH_THRESHOLD = float(os.getenv("NAME_MATCH_THRESHOLD", "0.8"))
+# Upper bound on Notion calls in flight from the async path; the sync SDK runs on these threads.
+NOTION_MAX_WORKERS = int(os.getenv("NOTION_MAX_WORKERS", "4"))
+
+notion = CountingClient(clients.lazy("notion"))
+contact_index = ContactIndex(notion)
+notion_writer = NotionWriteScheduler(notion)
+tag_catalog = TagCatalog(notion)
+notion_executor = ThreadPoolExecutor(max_workers=NOTION_MAX_WORKERS, thread_name_prefix="notion")
+# What a page will hold once its queued updates land, so a second update diffs against the first
+# rather than against the index's copy of the page from before either.
+_pending_records: dict[str, dict] = {}
+_pending_lock = threading.Lock()
+
+async def run_on_notion_executor(fn, *args):
+    """Run `fn` on the Notion executor in a copy of the caller's context (run_in_executor doesn't copy it)."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(notion_executor, functools.partial(ctx.run, fn, *args))
 
 def build_notion_props(data: dict) -> dict:
-    props = {}
-    for col, spec in SCHEMA.items():
-        val = data.get(col)
-        if not val:
-            continue
+    return compiled_schema.to_notion_props(data)
 
-        if spec["type"] == "title":
-            normalized = string.capwords(val)
-            props[col] = {"title": [{"text": {"content": normalized}}]}
-        elif spec["type"] == "email":
-            props[col] = {"email": val}
-        elif spec["type"] == "phone_number":
-            props[col] = {"phone_number": val}
-        elif spec["type"] == "rich_text":
-            if col == "Company/Org" or col == "Role/Title" or col == "Location" and isinstance(val, str):
-                # Preserve acronyms and common lowercase words while title-casing the rest
-                words = val.split()
-                normalized_words = []
-                lowercase_words = {"of", "and", "the", "a", "an", "in", "on", "at", "to", "for", "with", "by"}
-                
-                for i, word in enumerate(words):
-                    if word.isupper() and len(word) > 1:
-                        # Keep acronyms as-is
-                        normalized_words.append(word)
-                    elif word.lower() in lowercase_words and i > 0:
-                        # Keep common words lowercase (except first word)
-                        normalized_words.append(word.lower())
-                    else:
-                        # Title case regular words
-                        normalized_words.append(string.capwords(word))
-                normalized = " ".join(normalized_words)
-            else:
-                normalized = val
-            props[col] = {"rich_text": [{"text": {"content": normalized}}]}
-        elif spec["type"] == "select":
-            if val in spec["options"]:
-                props[col] = {"select": {"name": val}}
-        elif spec["type"] == "multi_select":
-            raw_tags = val if isinstance(val, list) else [val]
-            cleaned_tags = [string.capwords(str(t).strip()) for t in raw_tags if str(t).strip()]
-            if cleaned_tags:
-                props[col] = {"multi_select": [{"name": t} for t in cleaned_tags]}
-        elif spec["type"] == "date":
-            props[col] = {"date": {"start": val}}
+def diff_notion_props(existing: dict, data: dict) -> tuple[dict, dict]:
+    """
+    The properties an update with `data` has to send to a page holding `existing` (a record as
+    read by `from_notion_props`), and the record the page holds afterwards. Values the page
+    already has are left out; Tags are added to the existing ones and Notes appended, not replaced.
+    """
+    incoming = compiled_schema.from_notion_props(build_notion_props(data))
+    after = dict(existing)
+    changed = []
+    for col, val in incoming.items():
+        old = existing.get(col)
+        if not val or val == old:
             continue
-    return props
+        if col == "Tags":
+            known = {str(t).casefold() for t in old or []}
+            added = [t for t in val if t.casefold() not in known]
+            if not added:
+                continue
+            val = [*(old or []), *added]
+        elif col == "Notes" and old:
+            if val in old:
+                continue
+            val = f"{old}\n{val}"
+        after[col] = val
+        changed.append(col)
+    return build_notion_props({col: after[col] for col in changed}), after
+
+def _snapshot(database_id: str, page_id: str, page: dict | None = None) -> dict | None:
+    """The record `page_id` holds (or will, once queued updates land), from local state only."""
+    with _pending_lock:
+        pending = _pending_records.get(page_id)
+    if pending is not None:
+        return pending
+    page = page or contact_index.get(database_id, page_id)
+    return compiled_schema.from_notion_props(page.get("properties", {})) if page else None
 
 def validate_customer_data(data: dict) -> tuple[bool, str]:
     """
@@ -76,89 +92,139 @@ def validate_customer_data(data: dict) -> tuple[bool, str]:
     
     return True, ""
 
-def find_similar_names(database_id: str, name: str, threshold: float = 0.8) -> list[dict]:
+def find_similar_names(database_id: str, name: str, threshold: float = NAME_MATCH_THRESHOLD) -> list[dict]:
     """
     Find existing records with similar names using fuzzy matching.
-    Returns list of similar records with similarity scores.
+    Answers from the contact index's trigram matcher; returns list of similar records with similarity scores.
     """
     try:
-        # Get all existing records
-        all_records = notion.databases.query(database_id=database_id)
-        
-        similar_records = []
-        for record in all_records.get("results", []):
-            existing_name = ""
-            if "Name" in record.get("properties", {}):
-                name_prop = record["properties"]["Name"]
-                if name_prop.get("title") and len(name_prop["title"]) > 0:
-                    existing_name = name_prop["title"][0]["text"]["content"]
-            
-            if existing_name:
-                # Calculate similarity score
-                similarity = SequenceMatcher(None, name.lower(), existing_name.lower()).ratio()
-                if similarity >= threshold:
-                    similar_records.append({
-                        "record": record,
-                        "name": existing_name,
-                        "similarity": similarity
-                    })
-        
-        # Sort by similarity score (highest first)
-        similar_records.sort(key=lambda x: x["similarity"], reverse=True)
-        return similar_records
-        
+        contact_index.ensure_synced(database_id)
+        return contact_index.similar(database_id, name, threshold)
     except Exception as e:
         logging.error(f"Error finding similar names: {e}")
         return []
 
-def check_for_similar_names(database_id: str, data: dict) -> tuple[str, list[dict]]:
+def check_for_similar_names(database_id: str, data: dict, lookup: LookupContext | None = None) -> tuple[str, list[dict]]:
     """
     Check for similar names and return top-1 suggestion for yes/no confirmation.
     Returns:
       ("exact_match", results) OR ("suggest", [top_record]) OR ("no_match", [])
+    When `lookup` is given it is resolved, so a following `upsert_to_notion` can skip its own lookup.
     """
-    name = data.get("Name", "").strip()
+    name = str(data.get("Name") or "").strip()
     if not name:
         return "no_match", []
 
-    # First check exact match
-    filters = [{"property": "Name", "title": {"equals": string.capwords(name)}}]
-    exact_match = notion.databases.query(database_id=database_id, filter=filters[0])
-
-    if exact_match["results"]:
-        return "exact_match", exact_match["results"]
+    with tracking(lookup), metrics.stage("match"):
+        # First check exact match
+        contact_index.ensure_synced(database_id)
+        exact_match = contact_index.find_exact(database_id, name)
+        # Check for similar names and suggest only the top match (the index is already synced)
+        similar_records = [] if exact_match else contact_index.similar(database_id, name, NAME_MATCH_THRESHOLD)
+
+    if exact_match:
+        status, payload = "exact_match", exact_match
+    elif similar_records:
+        status, payload = "suggest", [similar_records[0]]
+    else:
+        status, payload = "no_match", []
 
-    # Check for similar names and suggest only the top match
-    similar_records = find_similar_names(database_id, name, threshold=0.8)
-    if similar_records:
-        return "suggest", [similar_records[0]]
+    metrics.inc("crm_match_results_total", result=status)
+    if lookup is not None:
+        lookup.resolve(status, exact_match[0]["id"] if exact_match else None)
+    return status, payload
 
-    return "no_match", []
+def submit_upsert(database_id: str, data: dict, force_create: bool = False, lookup: LookupContext | None = None,
+                  idempotency_key: str | None = None) -> Future:
+    """
+    Resolve the target page for `data` and queue its write on the Notion write scheduler.
+    Returns a Future for the user-facing result message; a failed write resolves to a
+    "Couldn't save" message rather than raising, so callers get one result per record.
+    A resolved `lookup` (from `check_for_similar_names` or `LookupContext.for_page`)
+    supplies the target page, so no further read is made. When `idempotency_key` already
+    wrote a page (an earlier attempt of the same job), that page is updated instead.
+    Updates send only what differs from the page's indexed copy, and nothing at all when
+    the record adds no new information. Tags are resolved onto the database's options first.
+    """
+    result: Future = Future()
 
-def upsert_to_notion(database_id: str, data: dict, force_create: bool = False) -> str:
     # Validate data first
     is_valid, reason = validate_customer_data(data)
     if not is_valid:
-        return f"Skipped {data.get('Name','(unknown)')}: {reason}"
-    
-    filters = []
-
-    if data.get("Name"):
-        filters.append({"property": "Name", "title": {"equals": string.capwords(data["Name"])}})
-
-    existing = {"results": []}
-    if filters:
-        existing = notion.databases.query(
-            database_id=database_id,
-            filter={"and": filters} if len(filters) > 1 else filters[0]
-        )
-
-    props = build_notion_props(data)
-
-    if existing["results"]:
-        page_id = existing["results"][0]["id"]
-        notion.pages.update(page_id=page_id, properties=props)
-        return f"Found existing entry for {string.capwords(data.get('Name','(unknown)'))} in CRM. Updated their record with new information."
-    else:
-        notion.pages.create(parent={"database_id": database_id}, properties=props)
-        return f"Created new entry for {data.get('Name','(unknown)')}."
+        result.set_result(f"Skipped {data.get('Name') or '(unknown)'}: {reason}")
+        return result
+    if data.get("Tags"):
+        # Outside `tracking`: the occasional catalog refresh isn't a read made for this record.
+        data = {**data, "Tags": tag_catalog.resolve(database_id, data["Tags"])}
+
+    trace, submitted = metrics.current_trace(), time.perf_counter()
+    with tracking(lookup):
+        written = idempotency_store.page_for(idempotency_key) if idempotency_key else None
+        existing = None
+        if written:
+            page_id = written
+        elif force_create:
+            page_id = None
+        elif lookup is not None and lookup.resolved:
+            page_id = lookup.page_id
+        else:
+            contact_index.ensure_synced(database_id)
+            existing = contact_index.find_exact(database_id, data["Name"])
+            page_id = existing[0]["id"] if existing else None
+
+        props = build_notion_props(data)
+        after = None
+
+        if page_id:
+            snapshot = _snapshot(database_id, page_id, existing[0] if existing else None)
+            if snapshot is None:
+                kind = "full"
+            else:
+                full = props
+                props, after = diff_notion_props(snapshot, data)
+                kind = "skipped" if not props else "partial" if len(props) < len(full) else "full"
+            metrics.inc("crm_notion_updates_total", result=kind)
+            if not props:
+                if idempotency_key:
+                    idempotency_store.remember(idempotency_key, page_id)
+                result.set_result(f"{string.capwords(data.get('Name') or '(unknown)')} is already in the CRM with "
+                                  f"this information; nothing to update.")
+                return result
+            if after is not None:
+                with _pending_lock:
+                    _pending_records[page_id] = after
+            write = notion_writer.submit_update(page_id, props)
+            msg = f"Found existing entry for {string.capwords(data.get('Name') or '(unknown)')} in CRM. Updated their record with new information."
+        else:
+            write = notion_writer.submit_create(database_id, props)
+            msg = f"Created new entry for {data.get('Name') or '(unknown)'}."
+
+    def on_written(done: Future) -> None:
+        # Queueing plus the API call; callbacks run on a writer thread, hence the explicit trace.
+        metrics.observe_stage("notion_write", time.perf_counter() - submitted, trace)
+        if after is not None:
+            with _pending_lock:
+                if _pending_records.get(page_id) is after:
+                    del _pending_records[page_id]
+        try:
+            page = done.result()
+            if idempotency_key and page.get("id"):
+                idempotency_store.remember(idempotency_key, page["id"])
+            contact_index.record_page(database_id, page)
+        except Exception as e:
+            logging.error(f"Notion write failed for {data.get('Name')}: {e}")
+            if page_id and page_gone(e):
+                contact_index.forget(database_id, page_id)
+            result.set_result(f"Couldn't save {data.get('Name') or '(unknown)'} to Notion, please try again later.")
+            return
+        if lookup is not None:
+            logging.debug(f"Notion calls for {data.get('Name')}: {dict(lookup.calls)}")
+        result.set_result(msg)
+
+    write.add_done_callback(on_written)
+    return result
+
+def upsert_to_notion(database_id: str, data: dict, force_create: bool = False, lookup: LookupContext | None = None,
+                     idempotency_key: str | None = None) -> str:
+    """Create or update the page for `data` and wait for the write; see `submit_upsert`."""
+    return submit_upsert(database_id, data, force_create, lookup, idempotency_key).result()
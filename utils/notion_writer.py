@@ -0,0 +1,217 @@
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+from . import metrics
+
+# Notion allows an average of 3 requests/second per integration, with short bursts.
+NOTION_WRITE_RATE = float(os.getenv("NOTION_WRITE_RATE", "3"))
+NOTION_WRITE_BURST = int(os.getenv("NOTION_WRITE_BURST", "3"))
+NOTION_WRITE_WORKERS = int(os.getenv("NOTION_WRITE_WORKERS", "3"))
+NOTION_WRITE_MAX_RETRIES = int(os.getenv("NOTION_WRITE_MAX_RETRIES", "5"))
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+
+RETRYABLE_STATUSES = {409, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Blocking token bucket shared by all writer threads."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now >= self._blocked_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(self._blocked_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Hold every caller back for `seconds` (used when Notion answers with Retry-After)."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._tokens = 0
+
+
+class _WriteOp:
+    def __init__(self, kind: str, kwargs: dict, page_id: str | None = None):
+        self.kind = kind
+        self.kwargs = kwargs
+        self.page_id = page_id
+        self.futures: list[Future] = [Future()]
+        # Run the write in the submitter's context, so per-record call counting and metric labels still apply.
+        self.context = contextvars.copy_context()
+
+
+class NotionWriteScheduler:
+    """
+    Single funnel for `pages.create` / `pages.update` calls.
+
+    Writes are paced by a token bucket tuned to Notion's limits and run on a few worker
+    threads. 429s pause the whole bucket for `Retry-After`; 429/5xx/timeouts are retried with
+    exponential backoff and full jitter. An update queued for a page that already has a
+    queued update is merged into it, so both callers share one API call. Updates to the same
+    page never run concurrently, so they land in submission order.
+    """
+
+    def __init__(self, notion, rate: float = NOTION_WRITE_RATE, burst: int = NOTION_WRITE_BURST,
+                 workers: int = NOTION_WRITE_WORKERS, max_retries: int = NOTION_WRITE_MAX_RETRIES):
+        self.notion = notion
+        self.bucket = TokenBucket(rate, burst)
+        self.workers = workers
+        self.max_retries = max_retries
+        self.stats = {"calls": 0, "coalesced": 0, "retries": 0, "rate_limited": 0, "failed": 0}
+        self._queue: list[_WriteOp] = []
+        self._queued_updates: dict[str, _WriteOp] = {}
+        self._in_flight: set[str] = set()
+        self._cond = threading.Condition()
+        self._threads: list[threading.Thread] = []
+
+    # --- public API --------------------------------------------------------------
+
+    def submit_create(self, database_id: str, properties: dict) -> Future:
+        op = _WriteOp("create", {"parent": {"database_id": database_id}, "properties": properties})
+        return self._enqueue(op)
+
+    def submit_update(self, page_id: str, properties: dict, **kwargs) -> Future:
+        with self._cond:
+            queued = self._queued_updates.get(page_id)
+            if queued is not None and not kwargs:
+                # Later values win, property by property, as if the updates ran in order.
+                queued.kwargs["properties"] = {**queued.kwargs.get("properties", {}), **properties}
+                future = Future()
+                queued.futures.append(future)
+                self.stats["coalesced"] += 1
+                metrics.inc("crm_notion_write_events_total", event="coalesced")
+                return future
+        op = _WriteOp("update", {"page_id": page_id, "properties": properties, **kwargs}, page_id=page_id)
+        return self._enqueue(op)
+
+    def create(self, database_id: str, properties: dict) -> dict:
+        return self.submit_create(database_id, properties).result()
+
+    def update(self, page_id: str, properties: dict, **kwargs) -> dict:
+        return self.submit_update(page_id, properties, **kwargs).result()
+
+    def write_all(self, futures: list[Future]) -> list[dict | Exception]:
+        """Wait for submitted writes; returns each page, or the exception that write ended with."""
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        return results
+
+    # --- internals ---------------------------------------------------------------
+
+    def _enqueue(self, op: _WriteOp) -> Future:
+        with self._cond:
+            self._start_workers()
+            self._queue.append(op)
+            if op.kind == "update":
+                if op.kwargs.keys() <= {"page_id", "properties"}:
+                    self._queued_updates.setdefault(op.page_id, op)
+                else:
+                    # Nothing may be merged past e.g. an archive of the same page.
+                    self._queued_updates.pop(op.page_id, None)
+            self._cond.notify()
+        return op.futures[0]
+
+    def _count(self, stat: str) -> None:
+        with self._cond:
+            self.stats[stat] += 1
+        metrics.inc("crm_notion_write_events_total", event=stat)
+
+    def _start_workers(self) -> None:
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._run, name=f"notion-writer-{len(self._threads)}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _next_op(self) -> _WriteOp:
+        with self._cond:
+            while True:
+                for i, op in enumerate(self._queue):
+                    if op.page_id is None or op.page_id not in self._in_flight:
+                        del self._queue[i]
+                        if op.page_id is not None:
+                            self._in_flight.add(op.page_id)
+                            if self._queued_updates.get(op.page_id) is op:
+                                del self._queued_updates[op.page_id]
+                        return op
+                self._cond.wait()
+
+    def _run(self) -> None:
+        while True:
+            op = self._next_op()
+            try:
+                result = op.context.run(self._execute, op)
+            except Exception as e:
+                self._count("failed")
+                logging.error(f"Notion {op.kind} failed after retries: {e}")
+                for future in op.futures:
+                    future.set_exception(e)
+            else:
+                for future in op.futures:
+                    future.set_result(result)
+            finally:
+                if op.page_id is not None:
+                    with self._cond:
+                        self._in_flight.discard(op.page_id)
+                        self._cond.notify_all()
+
+    def _execute(self, op: _WriteOp) -> dict:
+        call = self.notion.pages.create if op.kind == "create" else self.notion.pages.update
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            self._count("calls")
+            try:
+                return call(**op.kwargs)
+            except _notion_errors() as e:
+                status = getattr(e, "status", None)
+                retryable = status is None or status in RETRYABLE_STATUSES
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+                if status == 429:
+                    self._count("rate_limited")
+                    retry_after = _retry_after(e)
+                    if retry_after is not None:
+                        self.bucket.pause(retry_after)
+                        delay = retry_after
+                self._count("retries")
+                attempt += 1
+                logging.warning(f"Notion {op.kind} got {status or 'timeout'}; retry {attempt} in {delay:.1f}s")
+                time.sleep(delay)
+
+
+def _notion_errors() -> tuple[type, ...]:
+    # Imported when a call fails, so the SDK isn't loaded before the client is.
+    from notion_client.errors import HTTPResponseError, RequestTimeoutError
+    return HTTPResponseError, RequestTimeoutError
+
+
+def _retry_after(error: Exception) -> float | None:
+    headers = getattr(error, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
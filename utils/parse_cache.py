@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from . import metrics
+
+PARSE_CACHE_PATH = os.getenv("PARSE_CACHE_PATH", "parse_cache.sqlite3")
+PARSE_CACHE_TTL_SECONDS = float(os.getenv("PARSE_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+PARSE_CACHE_MEMORY_ENTRIES = int(os.getenv("PARSE_CACHE_MEMORY_ENTRIES", "1024"))
+PARSE_CACHE_MAX_BYTES = int(os.getenv("PARSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+def normalize_input(text: str) -> str:
+    """Whitespace-insensitive form of the text; case is kept because names and emails depend on it."""
+    return " ".join(str(text).split())
+
+
+def cache_key(text: str, model: str, version: str) -> str:
+    payload = json.dumps([normalize_input(text), model, version])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ParseCache:
+    """
+    Two-tier cache of `parse_with_ai` results.
+
+    The memory tier is a small LRU in front of an SQLite tier that survives restarts. The
+    SQLite tier is evicted least-recently-used once it exceeds `max_bytes`. Entries older
+    than `ttl` seconds are ignored and purged. Values are stored as JSON, so every hit
+    returns fresh objects that callers may mutate.
+    """
+
+    def __init__(self, path: str = PARSE_CACHE_PATH, ttl: float = PARSE_CACHE_TTL_SECONDS,
+                 memory_entries: int = PARSE_CACHE_MEMORY_ENTRIES, max_bytes: int = PARSE_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._memory: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS parse_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL, used_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS parse_cache_used ON parse_cache (used_at)")
+        self._conn.commit()
+
+    @property
+    def hits(self) -> int:
+        return self.stats["memory_hits"] + self.stats["disk_hits"]
+
+    @property
+    def misses(self) -> int:
+        return self.stats["misses"]
+
+    def get(self, key: str) -> list[dict] | None:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] + self.ttl >= now:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                metrics.inc("crm_cache_lookups_total", cache="parse", result="memory_hit")
+                return json.loads(entry[1])
+
+            row = self._conn.execute(
+                "SELECT value, created_at FROM parse_cache WHERE key = ? AND created_at >= ?", (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                metrics.inc("crm_cache_lookups_total", cache="parse", result="miss")
+                return None
+            with self._conn:
+                self._conn.execute("UPDATE parse_cache SET used_at = ? WHERE key = ?", (now, key))
+            self._remember(key, row[1], row[0])
+            self.stats["disk_hits"] += 1
+            metrics.inc("crm_cache_lookups_total", cache="parse", result="disk_hit")
+            return json.loads(row[0])
+
+    def put(self, key: str, records: list[dict]) -> None:
+        value = json.dumps(records)
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO parse_cache (key, value, size, created_at, used_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value), now, now),
+                )
+                self._conn.execute("DELETE FROM parse_cache WHERE created_at < ?", (now - self.ttl,))
+                self._evict()
+
+    def _remember(self, key: str, created_at: float, value: str) -> None:
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM parse_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used rows until the disk tier fits again.
+        for key, size in self._conn.execute("SELECT key, size FROM parse_cache ORDER BY used_at").fetchall():
+            self._conn.execute("DELETE FROM parse_cache WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
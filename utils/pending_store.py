@@ -0,0 +1,143 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+PENDING_STORE = os.getenv("PENDING_STORE", "memory")  # "memory" or "sqlite"
+PENDING_STORE_PATH = os.getenv("PENDING_STORE_PATH", "pending_confirmations.sqlite3")
+PENDING_TTL_SECONDS = float(os.getenv("PENDING_TTL_SECONDS", "3600"))
+PENDING_MAX_ENTRIES = int(os.getenv("PENDING_MAX_ENTRIES", "10000"))
+
+
+def conversation_key(channel: str, *ids) -> str:
+    """Store key for one conversation, e.g. conversation_key("slack", channel_id, user_id)."""
+    return ":".join([channel, *(str(i) for i in ids)])
+
+
+class PendingConfirmationStore(ABC):
+    """
+    Where "Did you mean ...?" prompts wait for the user's yes/no reply.
+
+    Values are the `pending_confirmations` lists built by `utils.confirmation_flow`. Entries
+    expire after `ttl` seconds; `pop` is atomic, so a reply is applied at most once even
+    when several bot processes share the store.
+    """
+
+    @abstractmethod
+    def put(self, key: str, pending: list[dict]) -> None:
+        ...
+
+    @abstractmethod
+    def get(self, key: str) -> list[dict] | None:
+        ...
+
+    @abstractmethod
+    def pop(self, key: str) -> list[dict] | None:
+        ...
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+
+class InMemoryPendingStore(PendingConfirmationStore):
+    """Per-process LRU with a TTL; the least recently prompted conversation is evicted first."""
+
+    def __init__(self, ttl: float = PENDING_TTL_SECONDS, max_entries: int = PENDING_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, list[dict]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, key: str, pending: list[dict]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, pending)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key: str) -> list[dict] | None:
+        with self._lock:
+            return self._live(key)
+
+    def pop(self, key: str) -> list[dict] | None:
+        with self._lock:
+            pending = self._live(key)
+            self._entries.pop(key, None)
+            return pending
+
+    def _live(self, key: str) -> list[dict] | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, pending = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        return pending
+
+
+class SqlitePendingStore(PendingConfirmationStore):
+    """SQLite-backed store that survives restarts and can be shared by several bot processes."""
+
+    def __init__(self, path: str = PENDING_STORE_PATH, ttl: float = PENDING_TTL_SECONDS,
+                 max_entries: int = PENDING_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pending_confirmations ("
+            " key TEXT PRIMARY KEY, payload TEXT NOT NULL, created_at REAL NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS pending_confirmations_expiry ON pending_confirmations (expires_at)"
+        )
+
+    def put(self, key: str, pending: list[dict]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM pending_confirmations WHERE expires_at < ?", (now,))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO pending_confirmations (key, payload, created_at, expires_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(pending), now, now + self.ttl),
+                )
+                self._conn.execute(
+                    "DELETE FROM pending_confirmations WHERE key IN ("
+                    " SELECT key FROM pending_confirmations ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get(self, key: str) -> list[dict] | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM pending_confirmations WHERE key = ? AND expires_at >= ?", (key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def pop(self, key: str) -> list[dict] | None:
+        with self._lock:
+            row = self._conn.execute(
+                "DELETE FROM pending_confirmations WHERE key = ? RETURNING payload, expires_at", (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0])
+
+
+def make_pending_store() -> PendingConfirmationStore:
+    if PENDING_STORE == "sqlite":
+        return SqlitePendingStore()
+    if PENDING_STORE == "memory":
+        return InMemoryPendingStore()
+    raise RuntimeError(f"Unknown PENDING_STORE {PENDING_STORE!r} (expected 'memory' or 'sqlite')")
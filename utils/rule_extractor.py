@@ -0,0 +1,212 @@
+import os
+import re
+
+from .schema_compiler import compiled_schema
+
+# Share of a message's characters the rules must account for before the LLM is skipped.
+RULE_EXTRACT_MIN_CONFIDENCE = float(os.getenv("RULE_EXTRACT_MIN_CONFIDENCE", "0.9"))
+
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)*\.[A-Za-z]{2,}")
+LINKEDIN_RE = re.compile(r"(?:https?://)?(?:[\w-]+\.)?linkedin\.com/in/([\w%-]+)/?(?:\?\S*)?", re.IGNORECASE)
+URL_RE = re.compile(r"(?:https?://|www\.)\S+", re.IGNORECASE)
+PHONE_RE = re.compile(r"(?<![\w+])\+?\d[\d\s().-]{7,}\d(?!\w)")
+# Field labels and separators left over once the values above are cut out of a line.
+LABEL_RE = re.compile(r"\b(?:e-?mail|mobile|phone|tel|cell|linkedin|web(?:site)?|[emtpw])\s*[:.]", re.IGNORECASE)
+SEPARATOR_CHARS = " \t|•·,;:/-–—"
+TAG_DIRECTIVE_RE = re.compile(r"^(?:please\s+)?(?:add\s+)?tags?\s*[:=]\s*(?P<tags>.+)$", re.IGNORECASE)
+TAG_AS_RE = re.compile(r"^(?:please\s+)?tag\s+(?P<name>.+?)\s+(?:as|with)\s+(?P<tags>.+?)\.?$", re.IGNORECASE)
+# "Jane Doe – Partner @ Acme", "Jane Doe, CTO at Acme", "Jane Doe | VP Sales | Acme"
+HEADLINE_RE = re.compile(r"^(?P<name>[^,|–—@]+?)\s*(?:\s[-–—]\s|,|\|)\s*(?P<title>[^|@]+?)\s*(?:@|\bat\b|\|)\s*(?P<company>.+)$")
+ROLE_AT_RE = re.compile(r"^(?P<title>[^|@]+?)\s*(?:@|\bat\b|\||,)\s*(?P<company>.+)$")
+PLEASANTRY_RE = re.compile(
+    r"^(?:--+|_+|(?:best|kind|warm)?\s*(?:regards|wishes)|best|cheers|thanks|thank you|sincerely|hi|hello|hey"
+    r"|sent from my \w+)[\s,.!]*(?:all|team|there)?[\s,.!]*$",
+    re.IGNORECASE,
+)
+NAME_WORD_RE = re.compile(r"^[^\W\d_][^\W\d_'.-]*(?:['.-][^\W\d_]*)*$")
+ROLE_WORDS = frozenset({
+    "ceo", "cto", "cfo", "coo", "cmo", "cio", "cpo", "vp", "svp", "evp", "gp", "lp", "md", "founder", "co-founder",
+    "cofounder", "partner", "principal", "associate", "analyst", "director", "manager", "head", "lead", "chief",
+    "officer", "president", "chair", "chairman", "engineer", "investor", "advisor", "adviser", "counsel",
+    "consultant", "owner", "scientist", "researcher", "professor", "recruiter", "banker", "attorney", "designer",
+})
+CONNECTING_WORDS = frozenset({"of", "and", "the", "a", "an", "in", "on", "at", "to", "for", "with", "by", "&"})
+# Capitalized first words that open a note or a greeting rather than a name ("Met John Smith", "Thanks Jane").
+NOT_NAME_WORDS = frozenset({
+    "met", "meet", "meeting", "spoke", "talked", "chatted", "called", "call", "emailed", "email", "ping", "pinged",
+    "intro", "introduce", "introducing", "introduced", "follow", "followup", "reach", "ask", "tell", "remind",
+    "send", "check", "see", "saw", "add", "update", "coffee", "lunch", "dinner", "drinks", "re", "fwd", "fw",
+    "thanks", "thank", "thx", "hi", "hello", "hey", "dear", "cheers", "regards", "best", "congrats", "welcome",
+})
+# Fields that corroborate a name line on its own; `Notes` only ever holds the phone number here.
+CORROBORATING_FIELDS = ("Email", "LinkedIn", "Notes", "Role/Title", "Tags")
+
+
+def looks_like_name(text: str) -> bool:
+    words = text.split()
+    return 2 <= len(words) <= 4 and words[0].strip(",.:!").lower() not in NOT_NAME_WORDS \
+        and all(w[0].isupper() and NAME_WORD_RE.match(w) for w in words)
+
+
+def looks_like_label(text: str) -> bool:
+    """A short, capitalized line such as a job title or company name, not a sentence."""
+    words = text.split()
+    # A trailing period is fine on abbreviations ("Acme Inc."), not on a sentence.
+    if not 1 <= len(words) <= 6 or (text.endswith((".", "!", "?")) and len(words[-1]) > 4):
+        return False
+    return all(w[0].isupper() or not w[0].isalpha() or w.lower() in CONNECTING_WORDS for w in words)
+
+
+def has_role_word(text: str) -> bool:
+    return any(w.strip(",.()&").lower() in ROLE_WORDS for w in re.split(r"[\s/]+", text))
+
+
+def split_tags(text: str) -> list[str]:
+    """Tags as typed; they are resolved onto the database's options when the record is written."""
+    return [t.strip(" .\"'") for t in re.split(r",|;|\band\b", text) if t.strip(" .\"'")]
+
+
+class LocalExtraction:
+    """
+    What the rules recovered from one message.
+
+    `confidence` is the share of the message's characters the rules accounted for (zero
+    without a name, or when the message seems to be about several people). `confident`
+    results are used as they are; otherwise `fields` are merged into the LLM's records.
+    A name alone is never confident: "New York City" reads like one too, so it takes an
+    email, a LinkedIn URL, a phone number, a role line or a tag directive as well.
+    """
+
+    def __init__(self, fields: dict, confidence: float, leftover: list[str]):
+        self.fields = fields
+        self.confidence = confidence
+        self.leftover = leftover
+
+    @property
+    def confident(self) -> bool:
+        return bool(self.fields.get("Name")) and self.confidence >= RULE_EXTRACT_MIN_CONFIDENCE \
+            and any(self.fields.get(col) for col in CORROBORATING_FIELDS)
+
+    def records(self) -> list[dict]:
+        """The message as `parse_with_ai` would return it; text the rules didn't place goes to Notes."""
+        record = compiled_schema.empty_record() | self.fields
+        notes = [n for n in (record.get("Notes"), *self.leftover) if n]
+        record["Notes"] = "\n".join(notes) or None
+        return [record]
+
+    def merge_into(self, records: list[dict]) -> list[dict]:
+        """
+        Fill the LLM's records with what the rules found. Matched emails, LinkedIn URLs and tag
+        directives are taken as given; names, titles and companies only fill empty fields.
+        """
+        if not self.fields:
+            return records
+        return [self.merge_record(record, alone=len(records) == 1) for record in records]
+
+    def merge_record(self, record: dict, alone: bool) -> dict:
+        """`merge_into` for one record: it gets the fields if it has the rules' name, or is the `alone` record."""
+        name = (self.fields.get("Name") or "").lower()
+        if not self.fields or not (alone or name and str(record.get("Name") or "").lower() == name):
+            return record
+        record = dict(record)
+        for col, val in self.fields.items():
+            if col in ("Email", "LinkedIn", "Tags") or not record.get(col):
+                record[col] = val
+            elif col == "Notes" and val not in str(record[col]):
+                record[col] = f"{record[col]}\n{val}"
+        return record
+
+
+def _take_contacts(line: str, found: dict[str, list[str]]) -> str:
+    """Cut emails, LinkedIn URLs, other URLs and phone numbers out of `line`; returns what's left."""
+    for kind, pattern in (("linkedin", LINKEDIN_RE), ("email", EMAIL_RE), ("url", URL_RE), ("phone", PHONE_RE)):
+        for match in pattern.finditer(line):
+            value = match.group(0)
+            if kind == "phone" and not 9 <= sum(c.isdigit() for c in value) <= 15:
+                continue
+            found[kind].append(match.group(1) if kind == "linkedin" else value.strip())
+            line = line.replace(value, " ", 1)
+    return LABEL_RE.sub(" ", line).strip(SEPARATOR_CHARS)
+
+
+def extract(text: str) -> LocalExtraction:
+    """Run the rules over one message."""
+    fields: dict = {}
+    found: dict[str, list[str]] = {"email": [], "linkedin": [], "url": [], "phone": []}
+    tags: list[str] = []
+    free: list[str] = []
+    total = consumed = 0
+
+    for raw in (text or "").splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        total += len(line)
+        if PLEASANTRY_RE.match(line):
+            consumed += len(line)
+            continue
+        directive = TAG_DIRECTIVE_RE.match(line)
+        tag_as = TAG_AS_RE.match(line)
+        if directive:
+            tags.extend(split_tags(directive.group("tags")))
+            consumed += len(line)
+            continue
+        if tag_as and looks_like_name(tag_as.group("name")):
+            fields.setdefault("Name", tag_as.group("name"))
+            tags.extend(split_tags(tag_as.group("tags")))
+            consumed += len(line)
+            continue
+        rest = _take_contacts(line, found)
+        consumed += len(line) - len(rest)
+        if rest:
+            free.append(rest)
+
+    leftover = []
+    labels = []
+    for i, line in enumerate(free):
+        headline = HEADLINE_RE.match(line)
+        role_at = ROLE_AT_RE.match(line)
+        if not fields.get("Name") and headline and looks_like_name(headline.group("name")) \
+                and looks_like_label(headline.group("company")):
+            fields["Name"] = headline.group("name")
+            fields["Role/Title"] = headline.group("title").strip(SEPARATOR_CHARS)
+            fields["Company/Org"] = headline.group("company").strip(SEPARATOR_CHARS)
+        elif not fields.get("Name") and i == 0 and looks_like_name(line) and not has_role_word(line):
+            fields["Name"] = line
+        elif fields.get("Name") and role_at and has_role_word(role_at.group("title")) \
+                and looks_like_label(role_at.group("company")) and not fields.get("Role/Title"):
+            fields["Role/Title"] = role_at.group("title").strip(SEPARATOR_CHARS)
+            fields["Company/Org"] = role_at.group("company").strip(SEPARATOR_CHARS)
+        elif fields.get("Name") and looks_like_label(line) and has_role_word(line) and not fields.get("Role/Title"):
+            fields["Role/Title"] = line
+        elif fields.get("Name") and looks_like_label(line):
+            # Decided below: a company next to a role line, otherwise maybe a place, an event or another person.
+            labels.append(line)
+            continue
+        else:
+            leftover.append(line)
+            continue
+        consumed += len(line)
+
+    if labels and fields.get("Role/Title") and not fields.get("Company/Org"):
+        fields["Company/Org"] = labels.pop(0)
+        consumed += len(fields["Company/Org"])
+    if any(looks_like_name(line) for line in labels):
+        # A second name-like line with no role to tie it to: most likely another person.
+        return LocalExtraction({}, 0.0, leftover + labels)
+    leftover.extend(labels)
+
+    if len(set(found["email"])) > 1 or len(set(found["linkedin"])) > 1:
+        # Several people (or a thread with recipients): which value belongs to whom is the LLM's call.
+        return LocalExtraction({}, 0.0, leftover)
+    if found["email"]:
+        fields["Email"] = found["email"][0]
+    if found["linkedin"]:
+        fields["LinkedIn"] = f"https://www.linkedin.com/in/{found['linkedin'][0]}"
+    if found["phone"]:
+        fields["Notes"] = f"Phone: {found['phone'][0]}"
+    if tags:
+        fields["Tags"] = list(dict.fromkeys(tags))
+
+    confidence = consumed / total if total and fields.get("Name") else 0.0
+    return LocalExtraction(fields, confidence, leftover)
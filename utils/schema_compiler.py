@@ -0,0 +1,194 @@
+import hashlib
+import json
+import string
+from typing import Callable
+
+from schema import SCHEMA
+
+# Title-cased on the way into Notion, keeping acronyms and short connecting words.
+TITLE_CASED_FIELDS = frozenset({"Company/Org", "Role/Title", "Location"})
+LOWERCASE_WORDS = frozenset({"of", "and", "the", "a", "an", "in", "on", "at", "to", "for", "with", "by"})
+# Notion rejects a text object over 2000 characters (counted in UTF-16, so an emoji is two) and a
+# rich_text array over 100 of them.
+NOTION_TEXT_LIMIT = 2000
+NOTION_MAX_CHUNKS = 100
+
+# JSON Schema type of each Notion property type, as the model should return it.
+_JSON_TYPES = {
+    "title": "string", "rich_text": "string", "email": "string", "phone_number": "string",
+    "date": "string", "select": "string", "multi_select": "array",
+}
+
+
+def title_case(val: str) -> str:
+    words = []
+    for i, word in enumerate(val.split()):
+        if word.isupper() and len(word) > 1:
+            words.append(word)
+        elif word.lower() in LOWERCASE_WORDS and i > 0:
+            words.append(word.lower())
+        else:
+            words.append(string.capwords(word))
+    return " ".join(words)
+
+
+def text_chunks(content: str, size: int = NOTION_TEXT_LIMIT) -> list[str]:
+    """`content` split into pieces Notion accepts; `_plain_text` joins them back."""
+    if len(content) * 2 <= size:
+        return [content]
+    chunks, start, units = [], 0, 0
+    for i, ch in enumerate(content):
+        width = 2 if ord(ch) > 0xFFFF else 1
+        if units + width > size:
+            chunks.append(content[start:i])
+            start, units = i, 0
+        units += width
+    chunks.append(content[start:])
+    return chunks
+
+
+def _rich_text(content: str) -> dict:
+    # Past the array limit only the end is kept: Notes grow by appending, so that's the newest text.
+    chunks = text_chunks(str(content))[-NOTION_MAX_CHUNKS:]
+    return {"rich_text": [{"text": {"content": chunk}} for chunk in chunks]}
+
+
+def _compile_mapper(col: str, spec: dict) -> Callable[[object], dict | None]:
+    """The function turning one field's value into its Notion property; None leaves the property out."""
+    kind = spec["type"]
+    if kind == "title":
+        return lambda val: {"title": [{"text": {"content": string.capwords(val)}}]}
+    if kind in ("email", "phone_number"):
+        return lambda val: {kind: val}
+    if kind == "rich_text" and col in TITLE_CASED_FIELDS:
+        return lambda val: _rich_text(title_case(val) if isinstance(val, str) else val)
+    if kind == "rich_text":
+        return _rich_text
+    if kind == "select":
+        options = frozenset(spec["options"])
+        return lambda val: {"select": {"name": val}} if val in options else None
+    if kind == "multi_select":
+        def multi_select(val):
+            # Names go in as given: `TagCatalog` has already resolved them onto the database's options.
+            tags = list(dict.fromkeys(str(t).strip() for t in (val if isinstance(val, list) else [val]) if str(t).strip()))
+            return {"multi_select": [{"name": t} for t in tags]} if tags else None
+        return multi_select
+    if kind == "date":
+        return lambda val: {"date": {"start": val}}
+    return lambda val: None
+
+
+def _plain_text(chunks: list) -> str:
+    return "".join(c.get("plain_text") if c.get("plain_text") is not None else c.get("text", {}).get("content", "")
+                   for c in chunks or []).strip()
+
+
+def _compile_reader(spec: dict) -> Callable[[dict], object]:
+    """The inverse of the field's mapper: a Notion property value back to the record's plain value."""
+    kind = spec["type"]
+    if kind in ("title", "rich_text"):
+        return lambda prop: _plain_text(prop.get(kind)) or None
+    if kind in ("email", "phone_number"):
+        return lambda prop: prop.get(kind)
+    if kind == "select":
+        return lambda prop: (prop.get("select") or {}).get("name")
+    if kind == "multi_select":
+        return lambda prop: [o["name"] for o in prop.get("multi_select") or []] or None
+    if kind == "date":
+        return lambda prop: (prop.get("date") or {}).get("start")
+    return lambda prop: None
+
+
+def _field_schema(spec: dict) -> dict:
+    kind = _JSON_TYPES.get(spec["type"], "string")
+    field = {"type": [kind, "null"]}
+    if kind == "array":
+        field["items"] = {"type": "string"}
+    elif spec["type"] == "select":
+        field["enum"] = [*spec["options"], None]
+    return field
+
+
+def _strict(name: str, schema: dict) -> dict:
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+def _object(properties: dict) -> dict:
+    return {"type": "object", "properties": properties, "required": list(properties), "additionalProperties": False}
+
+
+class CompiledSchema:
+    """
+    Everything derived from `SCHEMA`, computed once at import instead of per message.
+
+    - `prompt_prefix`: the static extraction instructions, sent as the system message so every
+      call starts with the same tokens and the provider can serve them from its prompt cache.
+    - `response_format` / `batch_response_format`: strict structured-output schemas, so replies
+      always parse and carry exactly the schema's fields.
+    - `to_notion_props`: a per-field mapper table, resolved from the property types up front;
+      `from_notion_props` reads a page's properties back into a record.
+    """
+
+    def __init__(self, schema: dict):
+        self.schema = schema
+        self.fields = tuple(schema)
+        self.mappers = tuple((col, _compile_mapper(col, spec)) for col, spec in schema.items())
+        self.readers = tuple((col, _compile_reader(spec)) for col, spec in schema.items())
+        self.record_schema = _object({col: _field_schema(spec) for col, spec in schema.items()})
+        records = {"type": "array", "items": self.record_schema}
+        self.response_format = _strict("crm_records", _object({"records": records}))
+        self.batch_response_format = _strict("crm_batch_records", _object({
+            "results": {"type": "array", "items": _object({"index": {"type": "integer"}, "records": records})},
+        }))
+        self.prompt_prefix = self._render_prompt_prefix()
+        self.fingerprint = hashlib.sha256(
+            json.dumps([schema, self.prompt_prefix, self.response_format, self.batch_response_format],
+                       sort_keys=True).encode("utf-8")
+        ).hexdigest()[:16]
+
+    def _render_prompt_prefix(self) -> str:
+        fields = "\n".join(f"- {col} ({spec['type']})" for col, spec in self.schema.items())
+        return f"""You are a CRM assistant. Extract customer info from the text you are given.
+
+Fields:
+{fields}
+
+Rules:
+- If a field is not mentioned, return null.
+- If multiple people are mentioned, return one record per person.
+- For "One-liner": Actively look for a brief description, summary, or key point about the person.
+  This could be an event, why they're relevant, or a brief note about them.
+  Only include if there's meaningful content - don't make up generic descriptions.
+- For emails (text or pictures): Only extract the SENDER as a customer, ignore recipients.
+  Focus on the person who sent the email, not who received it.
+- Tags are STRICTLY opt-in. Only populate "Tags" if the text explicitly requests a tag
+  (e.g., lines like "Tag name as X", "tags: X, Y", or "please add tag Foo"). Do not infer tags.
+- When tags are requested, output each one with the exact text requested; they are matched to the
+  CRM's existing tags afterwards.
+- Accept a single tag or multiple tags. Output Tags as an array of strings.
+"""
+
+    def empty_record(self) -> dict:
+        return dict.fromkeys(self.fields)
+
+    def to_notion_props(self, data: dict) -> dict:
+        props = {}
+        for col, mapper in self.mappers:
+            val = data.get(col)
+            if not val:
+                continue
+            prop = mapper(val)
+            if prop is not None:
+                props[col] = prop
+        return props
+
+    def from_notion_props(self, props: dict) -> dict:
+        record = self.empty_record()
+        for col, reader in self.readers:
+            prop = props.get(col)
+            if prop:
+                record[col] = reader(prop)
+        return record
+
+
+compiled_schema = CompiledSchema(SCHEMA)
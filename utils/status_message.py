@@ -0,0 +1,38 @@
+import os
+import time
+
+from . import metrics
+
+# "1" makes the bots stream extraction and post results as each record lands, instead of one reply at the end.
+STREAM_REPLIES = os.getenv("STREAM_REPLIES", "0") == "1"
+# Minimum seconds between edits of a status message; both chat APIs rate-limit edits.
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+
+
+class StatusThrottle:
+    """
+    Decides when a growing status message is (re)sent. The first text goes out at once, later
+    texts at most every `interval` seconds, and `final` lets through the last one if it is new.
+    The first send is timed as the `first_reply` stage of the current trace.
+    """
+
+    def __init__(self, interval: float = STREAM_EDIT_INTERVAL):
+        self.interval = interval
+        self.shown: str | None = None
+        self._last = 0.0
+
+    def due(self, text: str) -> bool:
+        if self.shown is not None and time.monotonic() - self._last < self.interval:
+            return False
+        return self.final(text)
+
+    def final(self, text: str) -> bool:
+        if not text or text == self.shown:
+            return False
+        if self.shown is None:
+            trace = metrics.current_trace()
+            if trace is not None:
+                metrics.observe_stage("first_reply", time.perf_counter() - trace.started)
+        self.shown = text
+        self._last = time.monotonic()
+        return True
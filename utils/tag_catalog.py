@@ -0,0 +1,142 @@
+import logging
+import os
+import re
+import threading
+import time
+
+from schema import SCHEMA
+from .dedupe import ascii_fold
+from .name_matcher import NameMatcher
+from .schema_compiler import title_case
+from . import metrics
+
+# Seconds between re-reads of the database's Tags options; resolutions in between are local.
+TAG_CATALOG_REFRESH_SECONDS = float(os.getenv("TAG_CATALOG_REFRESH_SECONDS", "300"))
+# Similarity a requested tag needs to an option to be mapped onto it ("Invester" -> "Investor").
+TAG_MATCH_THRESHOLD = float(os.getenv("TAG_MATCH_THRESHOLD", "0.85"))
+# Extra spellings of options, as "alias=Option;alias=Option" (e.g. "venture capital=VC;private equity=PE").
+TAG_ALIASES = os.getenv("TAG_ALIASES", "")
+
+TAGS_PROPERTY = "Tags"
+
+
+def tag_key(tag: str) -> str:
+    """
+    Case, accent, punctuation and plural insensitive form: "Founders / CEOs" and "founder-ceo" -> "founderceo".
+    Only words over three letters lose a trailing "s" ("bus" stays); `_Options` handles shorter plurals.
+    """
+    words = re.findall(r"[a-z0-9]+", ascii_fold(str(tag).replace("&", " and ")).casefold())
+    return "".join(w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w for w in words)
+
+
+def parse_aliases(text: str) -> dict[str, str]:
+    aliases = {}
+    for pair in text.split(";"):
+        alias, sep, option = pair.partition("=")
+        if sep and alias.strip() and option.strip():
+            aliases[alias.strip()] = option.strip()
+    return aliases
+
+
+class _Options:
+    """One database's tag options, indexed by normalized form (options and aliases) and by trigrams."""
+
+    def __init__(self, names: list[str], aliases: dict[str, str]):
+        self.names: list[str] = []
+        self.by_key: dict[str, str] = {}
+        self.matcher = NameMatcher(TAG_MATCH_THRESHOLD)
+        for name in names:
+            self.add(name)
+        # Aliases never shadow an option's own spelling.
+        for alias, name in aliases.items():
+            self._index(tag_key(alias), name)
+
+    def add(self, name: str) -> None:
+        if name not in self.names:
+            self.names.append(name)
+            self._index(tag_key(name), name)
+            if name.isupper():
+                # Acronym plurals ("VCs", "PEs"): `tag_key` leaves short words alone.
+                self._index(tag_key(name) + "s", name)
+
+    def _index(self, key: str, name: str) -> None:
+        if key and key not in self.by_key:
+            self.by_key[key] = name
+            self.matcher.add(key, key)
+
+    def resolve(self, tag: str) -> tuple[str | None, str]:
+        """(option name, how it was found) for one requested tag; unknown tags become new options."""
+        key = tag_key(tag)
+        if not key:
+            return None, "empty"
+        if key in self.by_key:
+            return self.by_key[key], "exact"
+        if key.endswith("s") and key[:-1] in self.by_key:
+            # A short plural of a known tag that isn't all caps, e.g. "Lps" for an option named "Lp".
+            return self.by_key[key[:-1]], "exact"
+        matches = self.matcher.search(key)
+        if matches:
+            # Ties go to the alphabetically first key, so the same input always lands on the same option.
+            best = min(matches, key=lambda m: (-m[2], m[0]))
+            return self.by_key[best[0]], "fuzzy"
+        name = title_case(" ".join(tag.split()))
+        self.add(name)
+        return name, "new"
+
+
+class TagCatalog:
+    """
+    The Tags options of each CRM database, read from its schema (`databases.retrieve`) and
+    re-read at most every `refresh_interval` seconds; `SCHEMA`'s options stand in until a read
+    succeeds. Requested tags are resolved locally and deterministically: an option or alias with
+    the same normalized form, else the most similar option, else a new title-cased tag that
+    later spellings of it resolve to as well.
+    """
+
+    def __init__(self, notion, refresh_interval: float = TAG_CATALOG_REFRESH_SECONDS,
+                 aliases: dict[str, str] | None = None):
+        self.notion = notion
+        self.refresh_interval = refresh_interval
+        self.aliases = parse_aliases(TAG_ALIASES) if aliases is None else aliases
+        self._lock = threading.Lock()
+        self._catalogs: dict[str, _Options] = {}
+        self._checked: dict[str, float] = {}
+
+    def refresh(self, database_id: str, force: bool = False) -> None:
+        """Re-read the options if the refresh interval elapsed. Errors are logged, not raised."""
+        with self._lock:
+            now = time.monotonic()
+            last = self._checked.get(database_id)
+            if not force and last is not None and now - last < self.refresh_interval:
+                metrics.inc("crm_cache_lookups_total", cache="tag_catalog", result="hit")
+                return
+            self._checked[database_id] = now
+            metrics.inc("crm_cache_lookups_total", cache="tag_catalog", result="refresh")
+            try:
+                database = self.notion.databases.retrieve(database_id=database_id)
+                options = database["properties"][TAGS_PROPERTY]["multi_select"]["options"]
+            except Exception as e:
+                metrics.inc("crm_tag_catalog_refresh_errors_total")
+                logging.error(f"Tag catalog refresh failed for {database_id}: {e}")
+                if database_id not in self._catalogs:
+                    self._catalogs[database_id] = _Options(SCHEMA[TAGS_PROPERTY].get("options", []), self.aliases)
+                return
+            self._catalogs[database_id] = _Options([o["name"] for o in options], self.aliases)
+
+    def options(self, database_id: str) -> list[str]:
+        self.refresh(database_id)
+        with self._lock:
+            return list(self._catalogs[database_id].names)
+
+    def resolve(self, database_id: str, tags: list | str) -> list[str]:
+        """Option names for the requested `tags`, in order and without duplicates."""
+        self.refresh(database_id)
+        resolved = []
+        with self._lock:
+            catalog = self._catalogs[database_id]
+            for tag in tags if isinstance(tags, list) else [tags]:
+                name, how = catalog.resolve(str(tag))
+                if name is not None:
+                    metrics.inc("crm_tag_resolutions_total", result=how)
+                    resolved.append(name)
+        return list(dict.fromkeys(resolved))
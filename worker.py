@@ -0,0 +1,156 @@
+"""
+Runs the chat messages the bots queued (USE_JOB_QUEUE=1) through the CRM pipeline and sends the replies.
+
+    python worker.py [--workers 4]
+
+Start as many worker processes as needed, on any host that shares JOB_QUEUE_PATH and the
+pending-confirmation store (PENDING_STORE=sqlite).
+"""
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import time
+from dotenv import load_dotenv
+
+from utils import metrics
+from utils.ai_utils import describe_image_async, transcribe_audio_async
+from utils.confirmation_flow import respond_to_text_async
+from utils.job_queue import JobQueue
+from utils.media import MediaTooLarge, download_media, image_data_url, prepare_image
+from utils.pending_store import PENDING_STORE
+
+load_dotenv()
+
+TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
+SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN")
+NOTION_DB_ID = os.getenv("NOTION_DB_ID")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# How long an idle worker sleeps before looking for work again.
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "0.5"))
+# How often each worker process drops finished jobs older than JOB_RETENTION_SECONDS.
+JOB_PURGE_INTERVAL = float(os.getenv("JOB_PURGE_INTERVAL", "3600"))
+
+logging.basicConfig(level=logging.INFO)
+
+
+class Replier:
+    """Sends replies back to the chat a job came from; platform clients are created on first use."""
+
+    def __init__(self):
+        self._telegram = None
+        self._slack = None
+
+    async def telegram(self):
+        if self._telegram is None:
+            from telegram import Bot
+            bot = Bot(TELEGRAM_TOKEN)
+            await bot.initialize()
+            self._telegram = bot
+        return self._telegram
+
+    def slack(self):
+        if self._slack is None:
+            from slack_sdk.web.async_client import AsyncWebClient
+            self._slack = AsyncWebClient(token=SLACK_BOT_TOKEN)
+        return self._slack
+
+    async def send(self, reply_to: dict, text: str) -> None:
+        if reply_to["channel"] == "telegram":
+            await (await self.telegram()).send_message(chat_id=reply_to["chat_id"], text=text)
+        elif reply_to["channel"] == "slack":
+            await self.slack().chat_postMessage(channel=reply_to["channel_id"], text=text)
+        else:
+            raise ValueError(f"Unknown reply channel {reply_to['channel']!r}")
+
+
+async def message_text(job: dict, replier: Replier) -> str:
+    """The text to run through the pipeline: the message itself, a transcript, or the vision model's reading."""
+    payload = job["payload"]
+    if job["kind"] == "text":
+        return payload["text"]
+    file = await (await replier.telegram()).get_file(payload["file_id"])
+    with metrics.stage("download"):
+        data = await download_media(file)
+    if job["kind"] == "voice":
+        return await transcribe_audio_async(data)
+    if job["kind"] == "photo":
+        with metrics.stage("resize"):
+            image, mime = await asyncio.to_thread(prepare_image, data)
+        return await describe_image_async(image_data_url(image, mime))
+    raise ValueError(f"Unknown job kind {job['kind']!r}")
+
+
+async def run_job(queue: JobQueue, job: dict, replier: Replier) -> None:
+    payload = job["payload"]
+    reply = job["reply"]
+    if reply is None:
+        try:
+            text = await message_text(job, replier)
+        except MediaTooLarge:
+            reply = "That file is too large for me, please split it up or send the info as text."
+        else:
+            # The job id keys the Notion writes, so a rerun updates what an earlier attempt created.
+            reply = await respond_to_text_async(NOTION_DB_ID, job["conversation"], text, idempotency_key=f"job:{job['id']}")
+        await asyncio.to_thread(queue.save_reply, job["id"], reply)
+    await replier.send(payload["reply_to"], reply)
+
+
+async def work(queue: JobQueue, name: str, replier: Replier) -> None:
+    while True:
+        job = await asyncio.to_thread(queue.claim, name)
+        if job is None:
+            await asyncio.sleep(JOB_POLL_SECONDS)
+            continue
+        reply_to = job["payload"]["reply_to"]
+        try:
+            with metrics.trace(reply_to["channel"], job["kind"]):
+                metrics.observe_stage("job_wait", time.time() - job["created_at"])
+                await run_job(queue, job, replier)
+        except Exception as e:
+            logging.exception(f"Job {job['id']} ({job['kind']}) failed on attempt {job['attempts']}: {e}")
+            retried = await asyncio.to_thread(queue.fail, job["id"], repr(e))
+            metrics.inc("crm_jobs_total", outcome="retried" if retried else "failed")
+            if not retried:
+                try:
+                    await replier.send(reply_to, "Sorry, I couldn't process that message.")
+                except Exception as send_error:
+                    logging.error(f"Couldn't report failed job {job['id']}: {send_error}")
+            continue
+        await asyncio.to_thread(queue.complete, job["id"])
+        metrics.inc("crm_jobs_total", outcome="done")
+
+
+async def purge_finished(queue: JobQueue) -> None:
+    """Keep the queue file from growing by one row per message forever."""
+    while True:
+        try:
+            purged = await asyncio.to_thread(queue.purge)
+            if purged:
+                logging.info(f"Purged {purged} finished jobs")
+        except Exception as e:
+            logging.error(f"Job purge failed: {e}")
+        await asyncio.sleep(JOB_PURGE_INTERVAL)
+
+
+async def run(workers: int) -> None:
+    queue = JobQueue()
+    replier = Replier()
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    await asyncio.gather(purge_finished(queue), *(work(queue, f"{prefix}:{i}", replier) for i in range(workers)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=JOB_WORKERS, help="jobs this process runs at once")
+    args = parser.parse_args()
+    if PENDING_STORE == "memory":
+        logging.warning("PENDING_STORE=memory: confirmation prompts are only visible to this process; "
+                        "use PENDING_STORE=sqlite when running more than one worker")
+    metrics.serve()
+    asyncio.run(run(args.workers))
+
+
+if __name__ == "__main__":
+    main()